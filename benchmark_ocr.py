@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark for ocr_simple_batch.py against the local mock OCR server.
+
+For each worker count, the benchmark copies the test images into a fresh folder, runs
+ocr_simple_batch.py on it (a real browser, the real pipeline) against mock_ocr_server.py,
+and measures:
+- images/sec over the whole run,
+- per-image latency p50/p95/p99 (from the batch journal's in-flight -> done timestamps),
+- peak RSS of the batch process and its browsers, total and per worker,
+- what the server saw (requests, 請求過多 responses, errors).
+Results are written to JSON so regressions can be compared offline.
+
+端到端吞吐量基准测试：针对本地模拟 OCR 服务器，按不同工作线程数运行 ocr_simple_batch.py，
+测量每秒图片数、延迟 p50/p95/p99 和内存占用（RSS），结果写入 JSON。
+
+Usage:
+  python benchmark_ocr.py --count 40 --workers 1,2,4,8 --latency-ms 800 --rate-limit 3
+  python benchmark_ocr.py --images "C:\\path\\to\\pics_test" --output bench.json -- --engine async
+  (arguments after "--" are passed to ocr_simple_batch.py)
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Import from same directory
+THIS_FILE = Path(__file__).resolve()
+SCRIPTS_DIR = THIS_FILE.parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from mock_ocr_server import MockOcrServer, add_mock_arguments, config_from_args  # type: ignore
+from ocr_journal import DONE, IN_FLIGHT, load_journal  # type: ignore
+from ocr_trace import percentile  # type: ignore
+
+try:
+    import psutil  # optional: RSS of the process tree on every platform
+except Exception:
+    psutil = None
+
+try:
+    from PIL import Image, ImageDraw
+except Exception:
+    Image = None
+    ImageDraw = None
+
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".webp"}
+
+
+def make_test_images(folder: Path, count: int, size=(1240, 1754)) -> List[Path]:
+    """Synthesize `count` distinct page-like PNGs (text-ish black bars on white)."""
+    if Image is None:
+        raise RuntimeError("Pillow is required to generate test images (or pass --images)")
+    folder.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        im = Image.new("L", size, 255)
+        draw = ImageDraw.Draw(im)
+        y = 120
+        line = 0
+        while y < size[1] - 120:
+            # Vary bar lengths per image so every file (and its hash) is different
+            x = 100
+            for w in range(8):
+                width = 40 + ((i * 31 + line * 17 + w * 13) % 90)
+                draw.rectangle([x, y, x + width, y + 28], fill=0)
+                x += width + 24
+                if x > size[0] - 150:
+                    break
+            y += 64
+            line += 1
+        path = folder / f"page_{i + 1:04d}.png"
+        im.save(path, format="PNG", optimize=True)
+        paths.append(path)
+    return paths
+
+
+def _proc_rss_linux(pid: int) -> int:
+    with open(f"/proc/{pid}/status", "r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def process_tree_rss(pid: int) -> Optional[int]:
+    """Total RSS in bytes of a process and all its descendants (browsers), or None if unsupported."""
+    if psutil is not None:
+        try:
+            proc = psutil.Process(pid)
+            total = proc.memory_info().rss
+            for child in proc.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            return total
+        except psutil.Error:
+            return 0
+    if not os.path.isdir("/proc"):
+        return None
+    # Linux without psutil: walk /proc for the parent->children map
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+    total = 0
+    stack = [pid]
+    while stack:
+        p = stack.pop()
+        try:
+            total += _proc_rss_linux(p)
+        except (OSError, ValueError):
+            pass
+        stack.extend(children.get(p, []))
+    return total
+
+
+def journal_latencies(journal_path: Path) -> Dict[str, object]:
+    """Per-image latency (in-flight -> done record) and the number of images done, from a batch journal."""
+    started: Dict[str, float] = {}
+    latencies: List[float] = []
+    if journal_path.exists():
+        with journal_path.open("r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                image, status, ts = rec.get("image"), rec.get("status"), rec.get("ts")
+                if status == IN_FLIGHT:
+                    started[image] = ts
+                elif status == DONE and image in started:
+                    latencies.append(ts - started.pop(image))
+    done = sum(1 for rec in load_journal(journal_path).values() if rec.get("status") == DONE)
+    return {"latencies": latencies, "done": done}
+
+
+def run_once(images: List[Path], workers: int, url: str, work_root: Path, timeout_ms: int,
+             run_timeout_s: float, batch_args: List[str], sample_interval_s: float = 0.25) -> Dict[str, object]:
+    """Run ocr_simple_batch.py once on a fresh copy of `images` and return its measurements."""
+    folder = work_root / f"workers_{workers}" / "bench"
+    if folder.parent.exists():
+        shutil.rmtree(folder.parent)
+    folder.mkdir(parents=True)
+    for src in images:
+        shutil.copy2(src, folder / src.name)
+    journal_path = folder.parent / "journal.jsonl"
+    cmd = [
+        sys.executable, str(SCRIPTS_DIR / "ocr_simple_batch.py"), str(folder),
+        "--workers", str(workers),
+        "--url", url,
+        "--timeout-ms", str(timeout_ms),
+        "--force", "--no-cache",
+        "--journal", str(journal_path),
+        "--selector-profile", str(folder.parent / "selector_profile.json"),
+    ] + batch_args
+
+    peak_rss: Optional[int] = None
+    start = time.monotonic()
+    with (folder.parent / "batch.log").open("w", encoding="utf-8") as log_file:
+        proc = subprocess.Popen(cmd, stdout=log_file, stderr=subprocess.STDOUT)
+        timed_out = False
+        while proc.poll() is None:
+            rss = process_tree_rss(proc.pid)
+            if rss is not None:
+                peak_rss = max(peak_rss or 0, rss)
+            if time.monotonic() - start > run_timeout_s:
+                proc.kill()
+                timed_out = True
+                break
+            time.sleep(sample_interval_s)
+        proc.wait()
+    elapsed = time.monotonic() - start
+
+    j = journal_latencies(journal_path)
+    lat = j["latencies"]
+    return {
+        "workers": workers,
+        "images": len(images),
+        "done": j["done"],
+        "failed": len(images) - j["done"],
+        "exit_code": proc.returncode,
+        "timed_out": timed_out,
+        "elapsed_s": round(elapsed, 3),
+        "images_per_s": round(j["done"] / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency_s": {
+            "p50": _round(percentile(lat, 50)),
+            "p95": _round(percentile(lat, 95)),
+            "p99": _round(percentile(lat, 99)),
+            "mean": _round(sum(lat) / len(lat) if lat else None),
+            "max": _round(max(lat) if lat else None),
+        },
+        "peak_rss_mb": _round(peak_rss / 1e6 if peak_rss is not None else None, 1),
+        "peak_rss_per_worker_mb": _round(peak_rss / 1e6 / workers if peak_rss is not None else None, 1),
+        "log": str(folder.parent / "batch.log"),
+    }
+
+
+def _round(value: Optional[float], digits: int = 3) -> Optional[float]:
+    return None if value is None else round(value, digits)
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else str(value)
+
+
+def main(argv: List[str] | None = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    batch_args: List[str] = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, batch_args = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark ocr_simple_batch.py against the local mock OCR server",
+        epilog='Arguments after "--" are passed to ocr_simple_batch.py (e.g. -- --engine async --adaptive)',
+    )
+    parser.add_argument("--images", type=Path, default=None,
+                        help="Folder of test images (default: generate --count synthetic pages)")
+    parser.add_argument("--count", type=int, default=24, help="Number of synthetic images (default: 24)")
+    parser.add_argument("--workers", type=str, default="1,2,4,8",
+                        help="Comma-separated worker counts to benchmark (default: 1,2,4,8)")
+    parser.add_argument("--url", type=str, default=None,
+                        help="Benchmark an already running OCR page instead of starting the mock server")
+    parser.add_argument("--timeout-ms", type=int, default=30000, help="Per-image OCR timeout (default: 30000)")
+    parser.add_argument("--run-timeout", type=float, default=1800, help="Kill a run after N seconds (default: 1800)")
+    parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"),
+                        help="JSON results file (default: benchmark_results.json)")
+    parser.add_argument("--keep", action="store_true", help="Keep the working folders (batch logs, journals)")
+    add_mock_arguments(parser)
+    args = parser.parse_args(argv)
+
+    worker_counts = [int(w) for w in args.workers.split(",") if w.strip()]
+    work_root = Path(tempfile.mkdtemp(prefix="ocr_bench_"))
+
+    if args.images:
+        images = sorted(p for p in args.images.iterdir() if p.is_file() and p.suffix.lower() in IMAGE_EXTS)
+        if not images:
+            print(f"No images found in {args.images}", file=sys.stderr)
+            return 2
+    else:
+        images = make_test_images(work_root / "source", args.count)
+
+    server = None
+    config = config_from_args(args)
+    if args.url:
+        url = args.url
+    else:
+        server = MockOcrServer(config).start()
+        url = server.url
+    print(f"Benchmarking {len(images)} image(s) against {url}")
+    print(f"  Worker counts / 工作线程数: {worker_counts}")
+    if psutil is None and not os.path.isdir("/proc"):
+        print("  Note: install psutil to measure RSS on this platform / 安装 psutil 以测量内存")
+
+    results = []
+    try:
+        for workers in worker_counts:
+            if server is not None:
+                server.reset_stats()
+            print(f"\n[bench] workers={workers} ...", flush=True)
+            result = run_once(images, workers, url, work_root, args.timeout_ms, args.run_timeout, batch_args)
+            if server is not None:
+                result["server"] = server.stats()
+            results.append(result)
+            lat = result["latency_s"]
+            print(f"  {result['done']}/{result['images']} done in {result['elapsed_s']}s "
+                  f"({result['images_per_s']} img/s), p50 {_fmt(lat['p50'])}s p95 {_fmt(lat['p95'])}s "
+                  f"p99 {_fmt(lat['p99'])}s, peak RSS {_fmt(result['peak_rss_mb'])} MB")
+    finally:
+        if server is not None:
+            server.stop()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "url": url if args.url else "mock",
+        "mock_config": None if args.url else asdict(config),
+        "images": len(images),
+        "batch_args": batch_args,
+        "results": results,
+    }
+    args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print(f"\n{'Workers':<10}{'img/s':<10}{'p50 (s)':<10}{'p95 (s)':<10}{'p99 (s)':<10}{'RSS/worker (MB)':<18}{'Failed':<8}")
+    for r in results:
+        lat = r["latency_s"]
+        print(f"{r['workers']:<10}{r['images_per_s']:<10}{_fmt(lat['p50']):<10}{_fmt(lat['p95']):<10}"
+              f"{_fmt(lat['p99']):<10}{_fmt(r['peak_rss_per_worker_mb']):<18}{r['failed']:<8}")
+    print(f"\nResults written to {args.output}")
+
+    if args.keep:
+        print(f"Working folders kept in {work_root}")
+    else:
+        shutil.rmtree(work_root, ignore_errors=True)
+    return 0 if all(r["failed"] == 0 for r in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,110 +2,253 @@
 """
 Diagnostic script to check OCR failure reasons from the combined output file.
 诊断脚本：检查合并输出文件中的 OCR 失败原因。
+
+The combined file is read section by section (ocr_output.iter_sections), so a file of
+several GB is diagnosed in one pass without loading it; OCR text is never kept. Every
+failure, not just the first few, is counted by error class (ocr_errors.classify).
+A records file written with --records (.jsonl) can be given instead of the combined file.
+
+--retry-list writes the failed and not-completed images, one key per line, for
+ocr_simple_batch.py --only, which re-OCRs just those images and keeps all other results:
+
+    python diagnose_ocr_failures.py vol/vol_all_ocr.txt --retry-list retry.txt
+    python ocr_simple_batch.py vol --only retry.txt
+
+逐段流式读取合并文件（内存占用与文件大小无关），按错误类型统计全部失败，
+并可输出重试列表，供 ocr_simple_batch.py --only 只重新识别失败的图片。
 """
-import re
+from __future__ import annotations
+
+import argparse
+import json
 import sys
+from collections import Counter
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# Import from same directory
+THIS_FILE = Path(__file__).resolve()
+SCRIPTS_DIR = THIS_FILE.parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from ocr_errors import classify  # type: ignore
+from ocr_journal import write_image_list  # type: ignore
+from ocr_output import CombinedHeader, iter_sections  # type: ignore
+
+NOT_COMPLETED = "not_completed"  # pseudo error class of images without a result
+# Failures that are a property of the page, not of the run: retrying them gives the same answer
+PERMANENT_CLASSES = {"blank_page", "no_tibetan"}
+LISTED_FAILURES = 10
+EXAMPLES_PER_CLASS = 3
+
+
+@dataclass
+class Finding:
+    """One image/page from a combined file or records file (OCR text not kept)."""
+    key: str                 # journal key, as used by ocr_simple_batch.py --only
+    label: str               # shown in the report
+    status: str              # ok / failed / blank / not_completed
+    error: Optional[str] = None
+    error_class: Optional[str] = None
 
-def analyze_combined_file(combined_file: Path):
-    """Analyze the combined OCR file to find failures."""
+
+@dataclass
+class Diagnosis:
+    counts: Counter = field(default_factory=Counter)               # status -> images
+    error_classes: Counter = field(default_factory=Counter)        # error class -> failures
+    examples: Dict[str, List[Tuple[str, str]]] = field(default_factory=dict)  # class -> [(label, error)]
+    failed: List[Tuple[str, str]] = field(default_factory=list)    # first LISTED_FAILURES
+    not_completed: List[str] = field(default_factory=list)         # first 5
+    retry: List[str] = field(default_factory=list)                 # keys for --retry-list
+    not_retried: Counter = field(default_factory=Counter)          # failures left off the retry list
+
+    def add(self, finding: Finding, retry_classes: Optional[Set[str]], collect_retry: bool) -> None:
+        self.counts[finding.status] += 1
+        if finding.status == "failed":
+            error = finding.error or ""
+            label = finding.error_class or classify(error)
+            self.error_classes[label] += 1
+            examples = self.examples.setdefault(label, [])
+            if len(examples) < EXAMPLES_PER_CLASS:
+                examples.append((finding.label, error))
+            if len(self.failed) < LISTED_FAILURES:
+                self.failed.append((finding.label, error))
+        elif finding.status == NOT_COMPLETED:
+            label = NOT_COMPLETED
+            if len(self.not_completed) < 5:
+                self.not_completed.append(finding.label)
+        else:
+            return
+        wanted = label in retry_classes if retry_classes is not None else label not in PERMANENT_CLASSES
+        if not wanted:
+            self.not_retried[label] += 1
+        elif collect_retry:
+            self.retry.append(finding.key)
+
+
+def iter_combined(path: Path, header: CombinedHeader) -> Iterator[Finding]:
+    for section in iter_sections(path, header):
+        yield Finding(section.key, section.source, section.status, section.error)
+
+
+def iter_records(path: Path) -> Iterator[Finding]:
+    """Findings from a --records JSONL file (one JSON object per line, parsed one at a time)."""
+    with path.open("r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # partially written line from a crash
+            key = rec.get("image")
+            if not key:
+                continue
+            label = rec.get("path") or key
+            if rec.get("page"):
+                label += f" (page {rec['page']})"
+            status = rec.get("status")
+            if status in ("failed", "blank"):
+                yield Finding(key, label, status, rec.get("error"), rec.get("error_class"))
+            elif rec.get("text") is None and rec.get("source") is None:
+                yield Finding(key, label, NOT_COMPLETED)
+            else:
+                yield Finding(key, label, "ok")
+
+
+def analyze_combined_file(combined_file: Path, retry_list: Optional[Path] = None,
+                          retry_classes: Optional[Set[str]] = None) -> int:
+    """Analyze the combined OCR file (or a records .jsonl file) to find failures."""
     if not combined_file.exists():
         print(f"Error: File not found: {combined_file}", file=sys.stderr)
-        return
-    
-    content = combined_file.read_text(encoding="utf-8", errors="ignore")
-    
-    # Find all "OCR not completed" entries
-    not_completed = re.findall(
-        r"Source / 来源: (.+?)\nFull Path / 完整路径: (.+?)\n-+\n\[OCR not completed",
-        content,
-        re.MULTILINE
-    )
-    
-    # Find all "OCR Failed" entries
-    failed = re.findall(
-        r"Source / 来源: (.+?)\nFull Path / 完整路径: (.+?)\n-+\n\[OCR Failed / OCR 失败\] (.+?)\n",
-        content,
-        re.MULTILINE | re.DOTALL
-    )
-    
-    # Extract summary stats
-    stats_match = re.search(
-        r"Total Images / 总图片数: (\d+)\nProcessed / 已处理: (\d+)\nSkipped / 已跳过: (\d+)\nFailed / 失败: (\d+)",
-        content
-    )
-    
+        return 2
+
+    header = CombinedHeader()
+    if combined_file.suffix.lower() == ".jsonl":
+        findings = iter_records(combined_file)
+    else:
+        findings = iter_combined(combined_file, header)
+    diagnosis = Diagnosis()
+    for finding in findings:
+        diagnosis.add(finding, retry_classes, retry_list is not None)
+
     print("=" * 80)
     print("OCR Failure Diagnosis / OCR 失败诊断")
     print("=" * 80)
-    
-    if stats_match:
-        total, processed, skipped, failed_count = stats_match.groups()
-        print(f"\nSummary / 摘要:")
-        print(f"  Total Images / 总图片数: {total}")
-        print(f"  Processed / 已处理: {processed}")
-        print(f"  Skipped / 已跳过: {skipped}")
-        print(f"  Failed / 失败: {failed_count}")
-    
-    if failed:
-        print(f"\n❌ Found {len(failed)} images with explicit error messages:")
-        print(f"   发现 {len(failed)} 张图片有明确的错误信息：")
-        error_types = {}
-        for source, path, error in failed[:10]:  # Show first 10
-            error_type = error.split(":")[0] if ":" in error else error[:50]
-            error_types[error_type] = error_types.get(error_type, 0) + 1
+
+    counts = diagnosis.counts
+    print(f"\nSummary / 摘要:")
+    if header.counts:
+        print(f"  Total Images / 总图片数: {header.counts.get('total', 0)}")
+        print(f"  Processed / 已处理: {header.counts.get('processed', 0)}")
+        print(f"  Skipped / 已跳过: {header.counts.get('skipped', 0)}")
+        print(f"  Failed / 失败: {header.counts.get('failed', 0)}")
+    print(f"  Sections read / 已读取: {sum(counts.values())} "
+          f"(ok {counts['ok']}, failed {counts['failed']}, blank {counts['blank']}, "
+          f"not completed {counts[NOT_COMPLETED]})")
+
+    failed_count = counts["failed"]
+    not_completed_count = counts[NOT_COMPLETED]
+    if failed_count:
+        print(f"\n❌ Found {failed_count} images with explicit error messages:")
+        print(f"   发现 {failed_count} 张图片有明确的错误信息：")
+        for source, error in diagnosis.failed:
             print(f"\n  - {source}")
-            print(f"    Error: {error[:100]}...")
-        
-        if len(failed) > 10:
-            print(f"\n  ... and {len(failed) - 10} more")
-        
-        print(f"\n  Error Type Summary / 错误类型摘要:")
-        for err_type, count in sorted(error_types.items(), key=lambda x: x[1], reverse=True):
+            print(f"    Error: {' '.join(error.split())[:100]}...")
+
+        if failed_count > len(diagnosis.failed):
+            print(f"\n  ... and {failed_count - len(diagnosis.failed)} more")
+
+        print(f"\n  Error Type Summary / 错误类型摘要 (all {failed_count} failures / 全部失败):")
+        for err_type, count in diagnosis.error_classes.most_common():
             print(f"    {err_type}: {count}")
-    
-    if not_completed:
-        print(f"\n⚠️  Found {len(not_completed)} images with 'OCR not completed' (no error saved):")
-        print(f"   发现 {len(not_completed)} 张图片显示 'OCR 未完成'（未保存错误信息）：")
+            for source, error in diagnosis.examples[err_type]:
+                print(f"      e.g. {source}: {error.splitlines()[0][:100] if error else ''}")
+
+    if not_completed_count:
+        print(f"\n⚠️  Found {not_completed_count} images with 'OCR not completed' (no error saved):")
+        print(f"   发现 {not_completed_count} 张图片显示 'OCR 未完成'（未保存错误信息）：")
         print(f"   This usually means:")
         print(f"   这通常意味着：")
         print(f"     1. OCR process was interrupted / OCR 进程被中断")
         print(f"     2. Exception occurred but wasn't caught / 发生异常但未被捕获")
         print(f"     3. File write failed silently / 文件写入静默失败")
         print(f"\n   First 5 examples / 前 5 个示例：")
-        for source, path in not_completed[:5]:
+        for source in diagnosis.not_completed:
             print(f"     - {source}")
-    
-    if not failed and not not_completed:
+
+    if not failed_count and not not_completed_count:
         print("\n✅ No failures found in the combined file!")
         print("   在合并文件中未发现失败！")
-    
+
+    if retry_list is not None:
+        written = write_image_list(retry_list, diagnosis.retry,
+                                   comment=f"Retry list from {combined_file.name} "
+                                           f"(for ocr_simple_batch.py --only)")
+        print(f"\n📝 Retry list / 重试列表: {written} image(s) -> {retry_list}")
+        for err_type, count in sorted(diagnosis.not_retried.items()):
+            print(f"   Not listed / 未列入: {count} x {err_type}"
+                  + (" (retrying gives the same result / 重试结果相同)" if err_type in PERMANENT_CLASSES else ""))
+
     print("\n" + "=" * 80)
     print("Recommendations / 建议：")
     print("=" * 80)
-    if failed or not_completed:
-        print("1. Try reducing parallel workers to avoid rate limiting:")
-        print("   尝试减少并行工作线程以避免速率限制：")
-        print("   python ocr_simple_batch.py <folder> --workers 2")
-        print()
-        print("2. Increase timeout for slow images:")
-        print("   为慢速图片增加超时时间：")
-        print("   python ocr_simple_batch.py <folder> --timeout-ms 30000")
-        print()
-        print("3. Use verbose mode to see detailed errors:")
+    if failed_count or not_completed_count:
+        classes = diagnosis.error_classes
+        step = 1
+        if classes["rate_limited"] or not classes:
+            print(f"{step}. Try reducing parallel workers to avoid rate limiting:")
+            print("   尝试减少并行工作线程以避免速率限制：")
+            print("   python ocr_simple_batch.py <folder> --workers 2   (or --adaptive)")
+            print()
+            step += 1
+        if classes["timeout"] or not classes:
+            print(f"{step}. Increase timeout for slow images:")
+            print("   为慢速图片增加超时时间：")
+            print("   python ocr_simple_batch.py <folder> --timeout-ms 30000")
+            print()
+            step += 1
+        print(f"{step}. Use verbose mode to see detailed errors:")
         print("   使用详细模式查看详细错误：")
         print("   python ocr_simple_batch.py <folder> --verbose")
         print()
-        print("4. Re-process failed images with --force:")
-        print("   使用 --force 重新处理失败的图片：")
-        print("   python ocr_simple_batch.py <folder> --force")
+        step += 1
+        print(f"{step}. Re-process only the failed images (all other results are kept):")
+        print("   只重新处理失败的图片（其他结果保留）：")
+        retry_name = retry_list if retry_list is not None else "retry.txt"
+        if retry_list is None:
+            print(f"   python diagnose_ocr_failures.py {combined_file} --retry-list {retry_name}")
+        print(f"   python ocr_simple_batch.py <folder> --only {retry_name}")
+    return 0
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python diagnose_ocr_failures.py <combined_ocr_file.txt>")
-        print("用法: python diagnose_ocr_failures.py <合并的OCR文件.txt>")
-        sys.exit(1)
-    
-    combined_file = Path(sys.argv[1])
-    analyze_combined_file(combined_file)
 
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Diagnose OCR failures in a combined OCR file (or a --records .jsonl file) "
+                    "and optionally write a retry list for ocr_simple_batch.py --only",
+    )
+    parser.add_argument("combined_file", type=Path,
+                        help="<folder>_all_ocr.txt (or its .partial) or a records .jsonl file")
+    parser.add_argument(
+        "--retry-list",
+        type=Path,
+        default=None,
+        metavar="FILE",
+        help="Write the failed and not-completed images (one per line) to FILE, "
+             "for ocr_simple_batch.py --only FILE",
+    )
+    parser.add_argument(
+        "--retry-class",
+        action="append",
+        default=None,
+        metavar="CLASS",
+        help="Only list failures of this error class (repeatable; e.g. rate_limited, timeout, not_completed). "
+             "Default: all except " + ", ".join(sorted(PERMANENT_CLASSES)),
+    )
+    args = parser.parse_args(argv)
+    retry_classes = set(args.retry_class) if args.retry_class else None
+    return analyze_combined_file(args.combined_file, args.retry_list, retry_classes)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
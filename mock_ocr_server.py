@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the dharmamitra OCR page, for benchmarks and offline testing.
+
+The page looks like the real one to the OCR heuristics: a file input, a ▶ start button,
+progress messages while the request runs ("處理中，請稍候…", "大型檔案…" for large files)
+and either Tibetan text or an error message (請求過多 / 錯誤 / 空白) when it finishes.
+Latency, error rates and rate limits are configurable, so throughput and back-off behaviour
+can be measured without touching the live site. The page posts the image as
+multipart/form-data to /api/ocr and renders the JSON reply, so the direct API backend
+(ocr_direct_api.py) can be captured and replayed against it as well.
+
+本地模拟 OCR 页面（用于基准测试和离线测试）：包含文件输入框、▶ 按钮、进度消息，
+返回藏文文本或错误信息（請求過多 等），延迟、错误率和速率限制均可配置。
+
+Usage:
+  python mock_ocr_server.py --port 8765 --latency-ms 800 --jitter-ms 300 --rate-limit 2
+  python ocr_simple_batch.py "C:\\path\\to\\images" --url http://127.0.0.1:8765/zh-hant?view=ocr
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import time
+from dataclasses import asdict, dataclass
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Dict, Optional
+
+TIBETAN_SYLLABLES = [
+    "བཀྲ", "ཤིས", "བདེ", "ལེགས", "སངས", "རྒྱས", "ཆོས", "དགེ", "འདུན", "བླ", "མ",
+    "རིན", "པོ", "ཆེ", "ཡེ", "ཤེས", "སྙིང", "རྗེ", "བྱང", "ཆུབ", "སེམས", "དཔའ",
+]
+RATE_LIMIT_MESSAGE = "請求過多，請稍後再試"
+ERROR_MESSAGE = "錯誤：無法識別圖片"
+BLANK_MESSAGE = "空白頁面，未找到文字"
+
+PAGE_HTML = """<!DOCTYPE html>
+<html lang="zh-Hant">
+<head>
+<meta charset="utf-8">
+<title>Mock OCR / 模擬 OCR</title>
+<link rel="stylesheet" href="/static/app.css">
+<script src="/analytics.js" async></script>
+</head>
+<body>
+<main>
+  <h1>藏文 OCR（模擬）</h1>
+  <input type="file" id="file" accept="image/*">
+  <button id="start" aria-label="Start" title="Start">▶</button>
+  <div id="status"></div>
+  <div id="result"></div>
+</main>
+<script>window.MOCK_OCR = {large_file_bytes: %(large_file_bytes)d};</script>
+<script src="/static/app.js"></script>
+</body>
+</html>
+"""
+
+APP_CSS = """main { font-family: sans-serif; max-width: 48em; margin: 2em auto; }
+#result { white-space: pre-wrap; margin-top: 1em; }
+"""
+
+APP_JS = """(() => {
+  const file = document.getElementById('file');
+  const status = document.getElementById('status');
+  const result = document.getElementById('result');
+  document.getElementById('start').addEventListener('click', async () => {
+    const f = file.files && file.files[0];
+    if (!f) { status.textContent = '請選擇圖片'; return; }
+    result.textContent = '';
+    status.textContent = f.size > window.MOCK_OCR.large_file_bytes
+      ? '大型檔案，可能需要較長時間，請稍候…' : '處理中，請稍候…';
+    try {
+      const form = new FormData();
+      form.append('lang', 'bo');
+      form.append('file', f, f.name);
+      const resp = await fetch('/api/ocr', {method: 'POST', body: form,
+        headers: {'X-Client': 'mock-ocr-web'}});
+      const data = await resp.json();
+      status.textContent = '';
+      if (data.error) { status.textContent = data.error; return; }
+      const out = document.createElement('div');
+      out.className = 'ocr-output';
+      for (const line of data.text.split('\\n')) {
+        const p = document.createElement('p');
+        p.textContent = line;
+        out.appendChild(p);
+      }
+      result.appendChild(out);
+    } catch (e) {
+      status.textContent = '錯誤：' + e;
+    }
+  });
+})();
+"""
+
+ANALYTICS_JS = "window.__mockAnalytics = (window.__mockAnalytics || 0) + 1;\n"
+
+
+@dataclass
+class MockConfig:
+    """Behaviour of the mock server. Rates are probabilities per request (0-1)."""
+    latency_ms: float = 800.0      # mean OCR latency
+    jitter_ms: float = 200.0       # +/- uniform jitter on top of latency_ms
+    per_mb_ms: float = 0.0         # extra latency per MB uploaded
+    error_rate: float = 0.0        # share of requests answered with an OCR error
+    blank_rate: float = 0.0        # share of requests answered with a blank-page message
+    rate_limit: float = 0.0        # sustained requests/second before 請求過多 (0 = unlimited)
+    burst: int = 1                 # token-bucket burst for rate_limit
+    max_inflight: int = 0          # concurrent OCR requests before 請求過多 (0 = unlimited)
+    lines: int = 6                 # lines of Tibetan text per result
+    large_file_kb: int = 2048      # uploads above this show the "large file" progress message
+    seed: Optional[int] = None
+
+
+def tibetan_text_for(data: bytes, lines: int) -> str:
+    """Deterministic pseudo-Tibetan text derived from the image bytes."""
+    rng = random.Random(hashlib.sha256(data).digest())
+    out = []
+    for _ in range(max(1, lines)):
+        words = [rng.choice(TIBETAN_SYLLABLES) for _ in range(rng.randint(6, 14))]
+        out.append("་".join(words) + "།")
+    return "\n".join(out)
+
+
+def multipart_file(content_type: str, body: bytes) -> Optional[bytes]:
+    """Bytes of the "file" part of a multipart/form-data body (None if absent)."""
+    msg = BytesParser(policy=HTTP).parsebytes(b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+    if not msg.is_multipart():
+        return None
+    for part in msg.iter_parts():
+        if part.get_param("name", header="content-disposition") == "file":
+            return part.get_payload(decode=True) or b""
+    return None
+
+
+class MockOcrServer:
+    """
+    Threaded HTTP server serving the mock OCR page, plus request counters.
+
+    Usage:
+        server = MockOcrServer(MockConfig(latency_ms=300, rate_limit=2)).start()
+        url = server.url            # http://127.0.0.1:<port>/zh-hant?view=ocr
+        ...
+        print(server.stats())
+        server.stop()
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.config = config or MockConfig()
+        self._rng = random.Random(self.config.seed)
+        self._lock = Lock()
+        self._tokens = float(max(1, self.config.burst))
+        self._last_refill = time.monotonic()
+        self._inflight = 0
+        self._counts: Dict[str, int] = {"pages": 0, "requests": 0, "ok": 0, "errors": 0,
+                                        "blank": 0, "rate_limited": 0, "bytes": 0, "peak_inflight": 0,
+                                        "static": 0, "analytics": 0}
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/zh-hant?view=ocr"
+
+    def start(self) -> "MockOcrServer":
+        self._thread = Thread(target=self._httpd.serve_forever, name="mock-ocr-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for key in self._counts:
+                self._counts[key] = 0
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[key] += n
+
+    def _admit(self) -> bool:
+        """Rate-limit check: token bucket (rate_limit/burst) and in-flight cap."""
+        cfg = self.config
+        with self._lock:
+            if cfg.rate_limit > 0:
+                now = time.monotonic()
+                self._tokens = min(float(max(1, cfg.burst)),
+                                   self._tokens + (now - self._last_refill) * cfg.rate_limit)
+                self._last_refill = now
+                if self._tokens < 1.0:
+                    return False
+            if cfg.max_inflight > 0 and self._inflight >= cfg.max_inflight:
+                return False
+            if cfg.rate_limit > 0:
+                self._tokens -= 1.0
+            self._inflight += 1
+            self._counts["peak_inflight"] = max(self._counts["peak_inflight"], self._inflight)
+            return True
+
+    def _run_ocr(self, data: bytes) -> Dict[str, str]:
+        """Simulate one OCR request; returns {"text": ...} or {"error": ...}."""
+        cfg = self.config
+        self._count("requests")
+        self._count("bytes", len(data))
+        if not self._admit():
+            self._count("rate_limited")
+            return {"error": RATE_LIMIT_MESSAGE}
+        try:
+            with self._lock:
+                jitter = self._rng.uniform(-cfg.jitter_ms, cfg.jitter_ms)
+                roll = self._rng.random()
+            delay_ms = cfg.latency_ms + jitter + cfg.per_mb_ms * len(data) / (1024 * 1024)
+            time.sleep(max(0.0, delay_ms) / 1000.0)
+            if roll < cfg.error_rate:
+                self._count("errors")
+                return {"error": ERROR_MESSAGE}
+            if roll < cfg.error_rate + cfg.blank_rate:
+                self._count("blank")
+                return {"error": BLANK_MESSAGE}
+            self._count("ok")
+            return {"text": tibetan_text_for(data, cfg.lines)}
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:  # keep benchmark output clean
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str, cache: str = "no-store") -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", cache)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                path = self.path.split("?", 1)[0]
+                # Static bundles are cacheable like a CDN's; the page and API are not
+                if path == "/static/app.js":
+                    server._count("static")
+                    self._send(200, APP_JS.encode("utf-8"), "application/javascript; charset=utf-8",
+                               cache="public, max-age=3600")
+                elif path == "/static/app.css":
+                    server._count("static")
+                    self._send(200, APP_CSS.encode("utf-8"), "text/css; charset=utf-8", cache="public, max-age=3600")
+                elif path == "/analytics.js":
+                    server._count("analytics")
+                    self._send(200, ANALYTICS_JS.encode("utf-8"), "application/javascript; charset=utf-8")
+                elif path == "/stats":
+                    self._send(200, json.dumps(server.stats()).encode("utf-8"), "application/json")
+                elif path == "/favicon.ico":
+                    self._send(404, b"", "text/plain")
+                else:
+                    server._count("pages")
+                    html = PAGE_HTML % {"large_file_bytes": server.config.large_file_kb * 1024}
+                    self._send(200, html.encode("utf-8"), "text/html; charset=utf-8")
+
+            def do_POST(self) -> None:
+                if self.path.split("?", 1)[0] != "/api/ocr":
+                    self._send(404, b"", "text/plain")
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                data = self.rfile.read(length) if length else b""
+                content_type = self.headers.get("Content-Type", "")
+                if content_type.startswith("multipart/form-data"):
+                    data = multipart_file(content_type, data)
+                    if data is None:
+                        body = json.dumps({"error": "missing file"}).encode("utf-8")
+                        self._send(400, body, "application/json; charset=utf-8")
+                        return
+                result = server._run_ocr(data)
+                status = 429 if result.get("error") == RATE_LIMIT_MESSAGE else 200
+                body = json.dumps(result, ensure_ascii=False).encode("utf-8")
+                self._send(status, body, "application/json; charset=utf-8")
+
+        return Handler
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the MockConfig options to a parser (shared with benchmark_ocr.py)."""
+    defaults = MockConfig()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms, help="Mean OCR latency (ms)")
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms, help="Uniform +/- jitter (ms)")
+    parser.add_argument("--per-mb-ms", type=float, default=defaults.per_mb_ms, help="Extra latency per MB uploaded (ms)")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Share of OCR errors (0-1)")
+    parser.add_argument("--blank-rate", type=float, default=defaults.blank_rate, help="Share of blank-page replies (0-1)")
+    parser.add_argument("--rate-limit", type=float, default=defaults.rate_limit,
+                        help="Requests/second before 請求過多 (0 = unlimited)")
+    parser.add_argument("--burst", type=int, default=defaults.burst, help="Burst size for --rate-limit")
+    parser.add_argument("--max-inflight", type=int, default=defaults.max_inflight,
+                        help="Concurrent requests before 請求過多 (0 = unlimited)")
+    parser.add_argument("--lines", type=int, default=defaults.lines, help="Lines of Tibetan text per result")
+    parser.add_argument("--large-file-kb", type=int, default=defaults.large_file_kb,
+                        help="Uploads above this size show the 'large file' progress message")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, per_mb_ms=args.per_mb_ms,
+        error_rate=args.error_rate, blank_rate=args.blank_rate, rate_limit=args.rate_limit,
+        burst=args.burst, max_inflight=args.max_inflight, lines=args.lines,
+        large_file_kb=args.large_file_kb, seed=args.seed,
+    )
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Local mock of the dharmamitra OCR page (for benchmarks/tests)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_mock_arguments(parser)
+    args = parser.parse_args(argv)
+
+    config = config_from_args(args)
+    server = MockOcrServer(config, host=args.host, port=args.port)
+    print(f"Mock OCR server: {server.url}")
+    print(f"  Config: {json.dumps(asdict(config))}")
+    print("  Press Ctrl+C to stop / 按 Ctrl+C 停止")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+        print(f"\nStats: {json.dumps(server.stats())}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
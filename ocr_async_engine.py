@@ -0,0 +1,573 @@
+#!/usr/bin/env python3
+"""
+Asyncio OCR engine: one Chromium browser, many pages, bounded concurrency.
+
+The thread-based path gives every worker its own sync Playwright driver and browser.
+This engine instead runs a single `playwright.async_api` driver and browser on a
+background event loop and multiplexes OCR jobs over pages, with an asyncio.Semaphore
+capping how many are in flight. Callers in ordinary threads use the blocking
+`AsyncOcrEngine.ocr()` facade; async callers can await `ocr_async()` directly.
+
+异步 OCR 引擎：一个浏览器、多个页面、有上限的并发。
+所有任务共享一个 Playwright 驱动和一个 Chromium 进程，内存占用远低于每线程一个浏览器。
+
+The page heuristics are straight ports of the sync functions in
+ocr_dharmamitra_playwright.py and share their selector lists.
+"""
+from __future__ import annotations
+
+import asyncio
+import sys
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeout
+
+# Import from same directory
+THIS_FILE = Path(__file__).resolve()
+SCRIPTS_DIR = THIS_FILE.parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+import ocr_dharmamitra_playwright as core  # type: ignore
+from ocr_dharmamitra_playwright import (  # type: ignore
+    BODY_TEXT_JS,
+    COMPLETION_WATCH_JS,
+    DESKTOP_CHROME_UA,
+    ERROR_PATTERN,
+    FILE_INPUT_SELECTORS,
+    FILECHOOSER_ROLE_SELECTORS,
+    FILECHOOSER_TEXT_SELECTORS,
+    LABEL_SELECTORS,
+    OCR_TRIGGER_SELECTORS,
+    PROGRESS_PATTERN,
+    RESET_WIDGET_JS,
+    START_TRIGGER_SELECTORS,
+    alternate_ocr_urls,
+    completion_watch_result,
+    extract_ocr_result,
+    learned_context,
+    log,
+    page_session,
+    record_discovery,
+)
+from ocr_errors import NavigationFailed, RateLimited, ResultTimeout, UploadFailed  # type: ignore
+from ocr_network import install_routes_async  # type: ignore
+from ocr_rate_control import HedgePolicy  # type: ignore
+from ocr_trace import ImageTrace, current_trace, span, use_trace  # type: ignore
+
+
+async def click_learned(page, role: str, timeout_ms: int = 1000) -> bool:
+    """Async port of ocr_dharmamitra_playwright.click_learned (uses the same SELECTOR_PROFILE)."""
+    learned = learned_context(page, role)
+    if learned is None:
+        return False
+    ctx, sel = learned
+    try:
+        if await ctx.query_selector(sel):
+            log(f"Clicking learned {role}: {sel}")
+            await ctx.click(sel, timeout=timeout_ms)
+            core.SELECTOR_PROFILE.record_hit(role)
+            return True
+    except Exception:
+        pass
+    return False
+
+
+async def find_file_input(ctx) -> Optional[str]:
+    for sel in FILE_INPUT_SELECTORS:
+        try:
+            if await ctx.query_selector(sel):
+                return sel
+        except Exception:
+            pass
+    return None
+
+
+async def set_files_in_any_context(page, image_path: Path) -> bool:
+    """Try setting files on main page and then on each iframe."""
+    learned = learned_context(page, "file_input")
+    if learned is not None:
+        ctx, sel = learned
+        try:
+            if await ctx.query_selector(sel):
+                await ctx.set_input_files(sel, str(image_path))
+                log(f"Set input files via learned selector: {sel}")
+                core.SELECTOR_PROFILE.record_hit("file_input")
+                return True
+        except Exception:
+            pass
+    for ctx in [page] + list(page.frames):
+        sel = await find_file_input(ctx)
+        if not sel:
+            continue
+        try:
+            await ctx.set_input_files(sel, str(image_path))
+            log(f"Set input files via selector: {sel}")
+            record_discovery(page, "file_input", ctx, sel)
+            return True
+        except Exception as e:
+            log(f"Failed set_input_files on {sel}: {e}")
+    record_discovery(page, "file_input")
+    return False
+
+
+async def try_click_filechooser(page) -> None:
+    """Attempt to trigger a file chooser by clicking common button texts."""
+    if await click_learned(page, "filechooser"):
+        return
+    async def click_in_context(ctx) -> bool:
+        for sel in FILECHOOSER_TEXT_SELECTORS + FILECHOOSER_ROLE_SELECTORS:
+            try:
+                if await ctx.query_selector(sel):
+                    log(f"Clicking candidate: {sel}")
+                    await ctx.click(sel, timeout=1000)
+                    record_discovery(page, "filechooser", ctx, sel)
+                    return True
+            except Exception:
+                continue
+        try:
+            log("Clicking the first <button> as fallback")
+            await ctx.click("button", timeout=1000)
+            record_discovery(page, "filechooser")
+            return True
+        except Exception:
+            return False
+    for ctx in [page] + list(page.frames):
+        if await click_in_context(ctx):
+            return
+    record_discovery(page, "filechooser")
+
+
+async def click_start_trigger(page, click_timeout_ms: int = 1500) -> bool:
+    """Try to click the 'start' control (triangle/Start) on the main page and iframes."""
+    if await click_learned(page, "start_trigger", timeout_ms=click_timeout_ms):
+        return True
+    for ctx in [page] + list(page.frames):
+        for sel in START_TRIGGER_SELECTORS:
+            try:
+                if await ctx.query_selector(sel):
+                    log(f"Clicking start trigger: {sel}")
+                    await ctx.click(sel, timeout=click_timeout_ms)
+                    record_discovery(page, "start_trigger", ctx, sel)
+                    return True
+            except Exception:
+                continue
+    record_discovery(page, "start_trigger")
+    return False
+
+
+async def navigate_with_retries(page, primary_url: str, timeout_ms: int, retries: int = 2) -> None:
+    tried = 0
+    last_err = None
+    for url in alternate_ocr_urls(primary_url):
+        if tried > retries:
+            break
+        try:
+            log(f"Navigating to OCR URL: {url}")
+            await page.goto(url, timeout=timeout_ms, wait_until="load")
+            current = page.url or ""
+            if current and "about:blank" not in current:
+                return
+        except Exception as e:
+            last_err = e
+        tried += 1
+    if last_err:
+        raise NavigationFailed(f"Navigation failed: {last_err}") from last_err
+    raise NavigationFailed("Navigation failed: ended up on about:blank or could not load OCR page.")
+
+
+async def robust_upload_image(page, image_path: Path, timeout_ms: int = 12000) -> str:
+    """Async port of ocr_dharmamitra_playwright.robust_upload_image; returns the winning strategy."""
+    # 1) Direct try
+    if await set_files_in_any_context(page, image_path):
+        return "file_input"
+    # 2) Click labels commonly associated with file inputs
+    for sel in LABEL_SELECTORS:
+        try:
+            els = await page.query_selector_all(sel)
+            for _ in els:
+                log(f"Clicking label candidate: {sel}")
+                await page.click(sel, timeout=1000)
+                if await set_files_in_any_context(page, image_path):
+                    return "label"
+        except Exception:
+            continue
+    # 3) File chooser event
+    try:
+        async with page.expect_file_chooser(timeout=timeout_ms) as fc_info:
+            await try_click_filechooser(page)
+        file_chooser = await fc_info.value
+        await file_chooser.set_files(str(image_path))
+        log("Uploaded via file chooser event.")
+        return "filechooser"
+    except PlaywrightTimeout:
+        log("File chooser timeout; attempting re-scan for inputs after trigger clicks.")
+        await try_click_filechooser(page)
+        if await set_files_in_any_context(page, image_path):
+            return "rescan"
+        raise UploadFailed('Could not upload image: no file input and file chooser did not appear.')
+
+
+async def wait_for_tibetan_text(page, timeout_ms: int = 15000, mode: str = "event", settle_ms: int = 250) -> str:
+    """Async port of ocr_dharmamitra_playwright.wait_for_tibetan_text (event mode with polling fallback)."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    if mode == "event":
+        try:
+            handle = await page.wait_for_function(
+                COMPLETION_WATCH_JS,
+                arg=[ERROR_PATTERN.pattern, PROGRESS_PATTERN.pattern, settle_ms],
+                timeout=timeout_ms,
+                polling=100,
+            )
+            return completion_watch_result(await handle.json_value())
+        except PlaywrightTimeout as e:
+            raise ResultTimeout("Timed out waiting for Tibetan OCR text to appear.") from e
+        except PlaywrightError as e:
+            log(f"Event-driven wait failed ({e}); falling back to polling.")
+        timeout_ms = max(0, timeout_ms - int((loop.time() - start) * 1000))
+
+    await page.wait_for_timeout(500)
+    elapsed = 0
+    step = 250
+    while elapsed < timeout_ms:
+        try:
+            body_text = await page.evaluate(BODY_TEXT_JS)
+        except Exception:
+            try:
+                body_text = await page.inner_text("body")
+            except Exception:
+                body_text = ""
+        result = extract_ocr_result(body_text)
+        if result is not None:
+            return result
+        await asyncio.sleep(step / 1000)
+        elapsed += step
+    raise ResultTimeout("Timed out waiting for Tibetan OCR text to appear.")
+
+
+async def ocr_page(
+    page,
+    image_path: Path,
+    url: str,
+    timeout_ms: int = 15000,
+    upload_timeout_ms: int = 12000,
+    extra_triggers: Optional[List[str]] = None,
+    wait_mode: str = "event",
+    reuse_page: bool = False,
+) -> str:
+    """Async port of ocr_dharmamitra_playwright.ocr_page (including reuse_page sessions)."""
+    stages = dict(timeout_ms=timeout_ms, upload_timeout_ms=upload_timeout_ms,
+                  extra_triggers=extra_triggers, wait_mode=wait_mode)
+    if not reuse_page:
+        with span("navigate"):
+            await navigate_with_retries(page, url, timeout_ms=timeout_ms)
+        return await _ocr_loaded_page(page, image_path, **stages)
+
+    sess = page_session(page)
+    if sess.url == url:
+        uploaded = False
+        try:
+            with span("reset"):
+                await page.evaluate(RESET_WIDGET_JS)
+            sess.resets += 1
+            await _upload_image(page, image_path, upload_timeout_ms)
+            uploaded = True
+        except (PlaywrightError, UploadFailed) as e:
+            log(f"In-place reset failed ({e}); re-navigating.")
+            sess.invalidate()
+        except Exception:
+            sess.invalidate()
+            raise
+        if uploaded:
+            # After the upload a ResultTimeout goes to the batch retry policy, not to a second try here
+            log("Reusing loaded OCR page (widget reset in place).")
+            try:
+                return await _trigger_and_wait(page, timeout_ms, extra_triggers, wait_mode)
+            except Exception:
+                sess.invalidate()
+                raise
+    try:
+        with span("navigate"):
+            await navigate_with_retries(page, url, timeout_ms=timeout_ms)
+        sess.navigations += 1
+        sess.url = url
+        return await _ocr_loaded_page(page, image_path, **stages)
+    except Exception:
+        sess.invalidate()
+        raise
+
+
+async def _ocr_loaded_page(
+    page,
+    image_path: Path,
+    timeout_ms: int,
+    upload_timeout_ms: int,
+    extra_triggers: Optional[List[str]],
+    wait_mode: str,
+) -> str:
+    await _upload_image(page, image_path, upload_timeout_ms)
+    return await _trigger_and_wait(page, timeout_ms, extra_triggers, wait_mode)
+
+
+async def _upload_image(page, image_path: Path, upload_timeout_ms: int) -> None:
+    with span("upload") as sp:
+        sp["strategy"] = await robust_upload_image(page, image_path, timeout_ms=upload_timeout_ms)
+
+
+async def _trigger_and_wait(page, timeout_ms: int, extra_triggers: Optional[List[str]], wait_mode: str) -> str:
+    with span("start_trigger"):
+        if await click_start_trigger(page):
+            log("Clicked start trigger (triangle/Start).")
+    with span("ocr_trigger"):
+        if not await click_learned(page, "ocr_trigger"):
+            clicked = None
+            for sel in list(extra_triggers or []) + OCR_TRIGGER_SELECTORS:
+                try:
+                    if await page.query_selector(sel):
+                        log(f"Clicking trigger: {sel}")
+                        await page.click(sel, timeout=1000)
+                        clicked = sel
+                        break
+                except Exception:
+                    continue
+            record_discovery(page, "ocr_trigger", page, clicked)
+    log("Waiting for Tibetan OCR text...")
+    with span("wait"):
+        return await wait_for_tibetan_text(page, timeout_ms=timeout_ms, mode=wait_mode)
+
+
+class _AsyncPooledPage:
+    def __init__(self, context, page) -> None:
+        self.context = context
+        self.page = page
+        self.uses = 0
+        self.crashed = False
+        page.on("crash", self._on_crash)
+
+    def _on_crash(self, _page) -> None:
+        self.crashed = True
+
+
+class AsyncOcrEngine:
+    """
+    One browser, up to `concurrency` pages doing OCR at once.
+
+    Usage from threads (the loop runs on a private background thread):
+        engine = AsyncOcrEngine(concurrency=16)
+        engine.start()
+        text = engine.ocr(image_path, url)   # safe to call from many threads
+        engine.close()
+
+    Pages are reused and recycled after max_uses images or on crash, like BrowserPool.
+    """
+
+    def __init__(self, headless: bool = True, concurrency: int = 4, max_uses: int = 50,
+                 wait_mode: str = "event", reuse_page: bool = False,
+                 hedge: Optional[HedgePolicy] = None) -> None:
+        self.headless = headless
+        self.hedge = hedge
+        self.wait_mode = wait_mode
+        self.reuse_page = reuse_page
+        self.concurrency = max(1, concurrency)
+        self.max_uses = max(1, max_uses)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._playwright = None
+        self._browser = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._browser_lock: Optional[asyncio.Lock] = None
+        self._idle: List[_AsyncPooledPage] = []
+        self.launches = 0
+        self.recycled = 0
+
+    def __enter__(self) -> "AsyncOcrEngine":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # --- async side -------------------------------------------------------
+
+    async def _ensure_browser(self) -> None:
+        async with self._browser_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return
+            if self._playwright is None:
+                with span("driver_start"):
+                    self._playwright = await async_playwright().start()
+            self._idle = []
+            with span("launch"):
+                self._browser = await self._playwright.chromium.launch(headless=self.headless)
+            self.launches += 1
+            log(f"Async engine: launched Chromium (launch #{self.launches}, concurrency {self.concurrency})")
+
+    async def _acquire(self) -> _AsyncPooledPage:
+        await self._ensure_browser()
+        if self._idle:
+            return self._idle.pop()
+        with span("new_page"):
+            context = await self._browser.new_context(ignore_https_errors=True, user_agent=DESKTOP_CHROME_UA)
+            if core.NETWORK_POLICY is not None:
+                await install_routes_async(context, core.NETWORK_POLICY)
+            return _AsyncPooledPage(context, await context.new_page())
+
+    async def _release(self, slot: _AsyncPooledPage) -> None:
+        slot.uses += 1
+        if slot.crashed or slot.uses >= self.max_uses or slot.page.is_closed():
+            self.recycled += 1
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
+        else:
+            self._idle.append(slot)
+
+    async def ocr_async(self, image_path: Path, url: str, timeout_ms: int = 15000,
+                        trace: Optional[ImageTrace] = None) -> str:
+        """
+        OCR one image on a pooled page; waits for a free slot if `concurrency` jobs are running.
+        `trace` attaches this job's timing spans to an image trace from another thread.
+        With a HedgePolicy, a slow attempt may be raced against a second one (see _hedged).
+        """
+        if trace is not None:
+            use_trace(trace)  # the task runs in its own context copy, so this stays local to it
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._browser_lock = asyncio.Lock()
+        if self.hedge is not None:
+            return await self._hedged(image_path, url, timeout_ms)
+        with span("slot_wait"):
+            await self._semaphore.acquire()
+        try:
+            return await self._attempt(image_path, url, timeout_ms)
+        finally:
+            self._semaphore.release()
+
+    async def _attempt(self, image_path: Path, url: str, timeout_ms: int) -> str:
+        slot = await self._acquire()
+        try:
+            return await ocr_page(slot.page, image_path, url, timeout_ms=timeout_ms,
+                                  upload_timeout_ms=min(12000, timeout_ms), wait_mode=self.wait_mode,
+                                  reuse_page=self.reuse_page)
+        except (PlaywrightError, NavigationFailed, UploadFailed, ResultTimeout, asyncio.CancelledError):
+            # Crashed or stuck, or cancelled mid-OCR because the other hedged attempt won: don't reuse the page
+            slot.crashed = True
+            raise
+        finally:
+            await self._release(slot)
+
+    async def _primary(self, image_path: Path, url: str, timeout_ms: int, started: asyncio.Event) -> str:
+        with span("slot_wait"):
+            await self._semaphore.acquire()
+        started.set()
+        try:
+            return await self._attempt(image_path, url, timeout_ms)
+        finally:
+            self._semaphore.release()
+
+    async def _hedged(self, image_path: Path, url: str, timeout_ms: int) -> str:
+        """
+        Start the attempt; if it has no text after the policy's latency percentile and the
+        hedge budget allows, start a second attempt on another page (outside the slot limit,
+        the budget caps it). The first to succeed wins and the other is cancelled.
+        """
+        hedge = self.hedge
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(self._primary(image_path, url, timeout_ms, started))
+        # The hedge clock starts once the attempt has a slot, not while it queues for one
+        slot_wait = asyncio.ensure_future(started.wait())
+        await asyncio.wait({primary, slot_wait}, return_when=asyncio.FIRST_COMPLETED)
+        slot_wait.cancel()
+        tasks = {primary: loop.time()}
+        delay = hedge.delay()
+        if delay is not None:
+            await asyncio.wait({primary}, timeout=delay)
+            if not primary.done() and hedge.try_start():
+                trace = current_trace()
+                if trace is not None:
+                    trace.attrs["hedge_after_ms"] = round(delay * 1000.0, 1)
+                tasks[asyncio.ensure_future(self._attempt(image_path, url, timeout_ms))] = loop.time()
+        try:
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    exc = task.exception()
+                    if exc is None:
+                        hedge.observe(loop.time() - tasks[task])
+                        if len(tasks) > 1:
+                            hedge.finish(won=task is not primary)
+                            trace = current_trace()
+                            if trace is not None:
+                                trace.attrs["hedge"] = "won" if task is not primary else "lost"
+                        return task.result()
+                    if isinstance(exc, RateLimited):
+                        hedge.note_rate_limit()
+                    if error is None or task is primary:
+                        error = exc
+            if len(tasks) > 1:
+                hedge.finish(won=False)
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def aclose(self) -> None:
+        for slot in self._idle:
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
+        self._idle = []
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+    # --- blocking facade for worker threads -------------------------------
+
+    def start(self) -> None:
+        """Start the background event loop (the browser itself launches on first use)."""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="ocr-async-engine", daemon=True)
+        self._thread.start()
+
+    def ocr(self, image_path: Path, url: str, timeout_ms: int = 15000) -> str:
+        """Blocking call: submit one OCR job to the engine loop and wait for its text."""
+        if self._loop is None:
+            self.start()
+        future = asyncio.run_coroutine_threadsafe(
+            self.ocr_async(image_path, url, timeout_ms, trace=current_trace()), self._loop)
+        return future.result()
+
+    def close(self) -> None:
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.aclose(), self._loop).result(timeout=30)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._loop.close()
+        self._loop = None
+        self._thread = None
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Pluggable OCR backends for ocr_simple_batch.py.
+
+Every backend turns one image into Tibetan text (or raises), behind the OcrBackend
+protocol. Backends register under a name and are picked with `--backend`:
+- playwright: the dharmamitra.org page driven by Chromium (sync pool or async engine)
+- direct:     replay of the site's captured upload request over HTTP (ocr_direct_api.py),
+              using the browser as fallback
+- tesseract:  local Tesseract with the `bod` (Tibetan) language data, no network at all
+
+RoutedBackend sends pages to a primary backend and escalates failures to a fallback,
+e.g. `--backend tesseract --fallback-backend playwright` keeps bulk pages local and only
+sends the hard ones (no or too little Tibetan text) to the site.
+
+可插拔 OCR 后端：通过 `--backend` 选择 playwright（网站 + 浏览器）、direct（直接 API）
+或 tesseract（本地 Tesseract，藏文 `bod` 语言包）；`--fallback-backend` 可将失败的页面
+转交给另一个后端，例如本地识别批量页面，仅将困难页面发送到网站。
+"""
+from __future__ import annotations
+
+import shutil
+import subprocess
+import sys
+from contextlib import ExitStack, contextmanager, nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock, local
+from typing import Callable, ContextManager, Dict, Iterator, List, Optional, Protocol
+
+# Import from same directory
+THIS_FILE = Path(__file__).resolve()
+SCRIPTS_DIR = THIS_FILE.parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from ocr_dharmamitra_playwright import (  # type: ignore
+    OCR_URL_DEFAULT,
+    TIBETAN_REGEX,
+    BrowserPool,
+    extract_ocr_result,
+    log,
+    ocr_image_text,
+)
+from ocr_direct_api import DEFAULT_API_PROFILE_PATH, DirectOcrClient, ProfileMismatch  # type: ignore
+from ocr_errors import NoTibetan, OcrError, RateLimited, ResultTimeout  # type: ignore
+from ocr_rate_control import HedgePolicy  # type: ignore
+from ocr_trace import current_trace, span  # type: ignore
+
+
+class BackendUnavailable(RuntimeError):
+    """The backend cannot run here (e.g. Tesseract or its `bod` language data is not installed)."""
+
+
+@dataclass
+class BackendConfig:
+    """Options shared by all backends; each backend reads the ones it needs."""
+    url: str = OCR_URL_DEFAULT
+    timeout_ms: int = 15000
+    wait_mode: str = "event"
+    reuse_page: bool = False
+    recycle_after: int = 50
+    engine: str = "sync"                 # playwright: "sync" (browser per worker) or "async"
+    concurrency: int = 1                 # playwright async engine: pages in flight
+    hedge: bool = False                  # playwright async engine: race slow attempts (HedgePolicy)
+    hedge_percentile: float = 95.0
+    hedge_budget: float = 0.05
+    hedge_min_delay_s: float = 2.0
+    api_profile: Path = DEFAULT_API_PROFILE_PATH
+    tesseract_cmd: str = "tesseract"
+    tesseract_lang: str = "bod"
+    tesseract_psm: int = 6
+    tesseract_min_chars: int = 20        # fewer Tibetan characters counts as a failed page
+
+
+class OcrBackend(Protocol):
+    """
+    One OCR engine. `ocr` returns the Tibetan text of one image or raises a typed
+    ocr_errors.OcrError subclass (RateLimited for 請求過多, BlankPage, NoTibetan, UploadFailed,
+    NavigationFailed, ResultTimeout, or OcrError for other errors the engine reports); the
+    batch retry policies are chosen by that type, so backends must not raise bare ValueErrors.
+
+    Lifecycle: start() once, then each worker thread runs inside `with backend.worker():`
+    (per-thread resources such as a warm browser) and calls ocr(); close() at the end.
+    """
+    name: str
+    cache_id: str    # results are cached per (image hash, cache_id)
+
+    def start(self) -> None: ...
+    def worker(self) -> ContextManager[None]: ...
+    def ocr(self, image_path: Path) -> str: ...
+    def summary(self) -> str: ...
+    def close(self) -> None: ...
+
+
+BACKENDS: Dict[str, Callable[[BackendConfig], OcrBackend]] = {}
+
+
+def register_backend(name: str) -> Callable:
+    """Class decorator: make a backend selectable as `--backend name`."""
+    def decorator(factory):
+        BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+def available_backends() -> List[str]:
+    return sorted(BACKENDS)
+
+
+def create_backend(name: str, config: BackendConfig) -> OcrBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend '{name}' (available: {', '.join(available_backends())})")
+    return BACKENDS[name](config)
+
+
+@register_backend("playwright")
+class PlaywrightBackend:
+    """The dharmamitra.org OCR page, via a warm BrowserPool per worker or the shared async engine."""
+
+    name = "playwright"
+
+    def __init__(self, config: BackendConfig) -> None:
+        self.config = config
+        self.cache_id = config.url
+        self.engine = None
+        self.hedge: Optional[HedgePolicy] = None
+        self._local = local()
+
+    def start(self) -> None:
+        # --engine async: one shared browser driven by an asyncio loop; worker threads only
+        # wait on its results, so concurrency sets the number of in-flight pages, not browsers.
+        if self.config.engine == "async":
+            from ocr_async_engine import AsyncOcrEngine  # type: ignore
+            if self.config.hedge:
+                self.hedge = HedgePolicy(percentile=self.config.hedge_percentile, budget=self.config.hedge_budget,
+                                    min_delay_s=self.config.hedge_min_delay_s)
+            self.engine = AsyncOcrEngine(headless=True, concurrency=self.config.concurrency,
+                                         max_uses=self.config.recycle_after, wait_mode=self.config.wait_mode,
+                                         reuse_page=self.config.reuse_page, hedge=self.hedge)
+            self.engine.start()
+
+    @contextmanager
+    def worker(self) -> Iterator[None]:
+        # Each sync worker owns one warm browser for its whole life (created and closed in its thread)
+        if self.engine is not None:
+            yield
+            return
+        with BrowserPool(headless=True, max_uses=self.config.recycle_after) as pool:
+            self._local.pool = pool
+            try:
+                yield
+            finally:
+                self._local.pool = None
+
+    def ocr(self, image_path: Path) -> str:
+        return self.ocr_with_capture(image_path, None)
+
+    def ocr_with_capture(self, image_path: Path, capture) -> str:
+        """ocr(), recording the site's upload request into an ocr_direct_api.ApiCapture (sync engine only)."""
+        if self.engine is not None:
+            return self.engine.ocr(image_path, url=self.config.url, timeout_ms=self.config.timeout_ms)
+        # The text comes back in memory; only the batch's real outputs (journal, combined
+        # file, --individual-files) are written to disk
+        return ocr_image_text(
+            image_path=image_path,
+            url=self.config.url,
+            headless=True,  # No browser window
+            timeout_ms=self.config.timeout_ms,
+            pool=getattr(self._local, "pool", None),
+            wait_mode=self.config.wait_mode,
+            reuse_page=self.config.reuse_page,
+            capture=capture,
+        )
+
+    def summary(self) -> str:
+        return self.hedge.summary() if self.hedge is not None else ""
+
+    def close(self) -> None:
+        if self.engine is not None:
+            self.engine.close()
+            self.engine = None
+
+
+@register_backend("direct")
+class DirectBackend:
+    """Captured-API replay over HTTP (no browser), falling back to the browser and re-capturing."""
+
+    name = "direct"
+
+    def __init__(self, config: BackendConfig) -> None:
+        self.config = config
+        self.cache_id = config.url  # same site, same results as the browser path
+        self.client = DirectOcrClient(config.api_profile, timeout_s=max(30.0, config.timeout_ms / 1000.0))
+        self.browser = PlaywrightBackend(config)
+
+    def start(self) -> None:
+        if self.client.usable:
+            log(f"Direct API: {self.client.profile['method']} {self.client.profile['endpoint']}")
+        else:
+            log(f"Direct API: no profile at {self.config.api_profile} yet; capturing it from the first browser upload")
+        self.browser.start()
+
+    def worker(self) -> ContextManager[None]:
+        # BrowserPool only launches Chromium on first use, so pure API runs never start it
+        return self.browser.worker()
+
+    def ocr(self, image_path: Path) -> str:
+        if self.client.usable:
+            try:
+                with span("direct_api"):
+                    return self.client.ocr(image_path)
+            except ProfileMismatch as e:
+                self.client.disable(str(e))
+        # Browser fallback; the sync path also records a fresh profile from this upload
+        capture = self.client.begin_capture() if self.browser.engine is None else None
+        try:
+            return self.browser.ocr_with_capture(image_path, capture)
+        finally:
+            if capture is not None:
+                self.client.end_capture(capture)
+
+    def summary(self) -> str:
+        return "\n".join(s for s in ("Direct API: " + self.client.summary(), self.browser.summary()) if s)
+
+    def close(self) -> None:
+        self.browser.close()
+
+
+@register_backend("tesseract")
+class TesseractBackend:
+    """Local Tesseract CLI with Tibetan (`bod`) language data; no browser and no network."""
+
+    name = "tesseract"
+
+    def __init__(self, config: BackendConfig) -> None:
+        self.config = config
+        self.cache_id = f"tesseract:{config.tesseract_lang}:psm{config.tesseract_psm}"
+        self._cmd = config.tesseract_cmd  # resolved to a full path by start(); the shared config is left alone
+
+    def start(self) -> None:
+        cmd = shutil.which(self.config.tesseract_cmd)
+        if cmd is None:
+            raise BackendUnavailable(f"Tesseract not found ('{self.config.tesseract_cmd}'); install it and add it to PATH")
+        try:
+            listed = subprocess.run([cmd, "--list-langs"], capture_output=True, text=True, timeout=30)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise BackendUnavailable(f"Could not run Tesseract: {e}")
+        langs = set((listed.stdout + listed.stderr).split())
+        if self.config.tesseract_lang not in langs:
+            raise BackendUnavailable(f"Tesseract language data '{self.config.tesseract_lang}' is not installed "
+                                     f"(install tesseract-ocr-{self.config.tesseract_lang} or {self.config.tesseract_lang}.traineddata)")
+        self._cmd = cmd
+
+    def worker(self) -> ContextManager[None]:
+        return nullcontext()
+
+    def ocr(self, image_path: Path) -> str:
+        cmd = [self._cmd, str(image_path), "stdout",
+               "-l", self.config.tesseract_lang, "--psm", str(self.config.tesseract_psm)]
+        try:
+            with span("tesseract"):
+                proc = subprocess.run(cmd, capture_output=True, timeout=self.config.timeout_ms / 1000.0)
+        except subprocess.TimeoutExpired:
+            raise ResultTimeout(f"Timed out waiting for Tesseract after {self.config.timeout_ms} ms")
+        if proc.returncode != 0:
+            message = proc.stderr.decode("utf-8", errors="replace").strip().splitlines()
+            raise OcrError(f"OCR returned error: Tesseract exit {proc.returncode}: {message[-1] if message else ''}")
+        result = extract_ocr_result(proc.stdout.decode("utf-8", errors="replace"))
+        chars = sum(len(m) for m in TIBETAN_REGEX.findall(result or ""))
+        if result is None or chars < self.config.tesseract_min_chars:
+            raise NoTibetan(f"OCR completed but no Tibetan text was extracted (Tesseract: {chars} Tibetan characters)")
+        return result
+
+    def summary(self) -> str:
+        return ""
+
+    def close(self) -> None:
+        pass
+
+
+class RoutedBackend:
+    """
+    Try `primary` first and escalate failed pages to `fallback` (rate limits are not
+    escalated; they go back to the caller's retry/back-off logic).
+    """
+
+    def __init__(self, primary: OcrBackend, fallback: OcrBackend) -> None:
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+        self.cache_id = f"{primary.cache_id}|{fallback.cache_id}"
+        self.escalated = 0
+        self._lock = Lock()
+
+    def start(self) -> None:
+        self.primary.start()
+        try:
+            self.fallback.start()
+        except BaseException:
+            self.primary.close()  # don't leak the browser / engine the primary already started
+            raise
+
+    @contextmanager
+    def worker(self) -> Iterator[None]:
+        with ExitStack() as stack:
+            stack.enter_context(self.primary.worker())
+            stack.enter_context(self.fallback.worker())
+            yield
+
+    def ocr(self, image_path: Path) -> str:
+        try:
+            return self.primary.ocr(image_path)
+        except Exception as e:
+            if isinstance(e, RateLimited):
+                raise
+            with self._lock:
+                self.escalated += 1
+            trace = current_trace()
+            if trace is not None:
+                trace.attrs["escalated"] = f"{self.primary.name}->{self.fallback.name}: {e}"
+            return self.fallback.ocr(image_path)
+
+    def summary(self) -> str:
+        parts = [f"Routing: {self.escalated} page(s) escalated from {self.primary.name} to {self.fallback.name}"]
+        parts += [s for s in (self.primary.summary(), self.fallback.summary()) if s]
+        return "\n".join(parts)
+
+    def close(self) -> None:
+        self.primary.close()
+        self.fallback.close()
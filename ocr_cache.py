@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Persistent OCR result cache keyed by image content.
+
+Results are stored in a small SQLite database under a key derived from the SHA-256 of
+the image bytes plus the OCR URL, so renamed files and duplicate pages across volumes
+are only OCR'd once. The cache is size-bounded: when the stored text exceeds max_bytes,
+the least recently used entries are evicted. The total size is tracked in memory (summed
+once when the cache is opened), entries are evicted in small batches, and the LRU time
+of cache hits is written in batches instead of one commit per hit.
+
+OCR 结果缓存：以图片内容哈希 + OCR 网址为键，重命名或重复的图片不会再次识别。
+超过容量上限时按最近最少使用（LRU）淘汰。
+"""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Optional
+
+DEFAULT_CACHE_PATH = Path.home() / ".tibetan_ocr" / "ocr_cache.sqlite"
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GiB of OCR text
+EVICT_BATCH = 256   # LRU rows read per eviction query
+TOUCH_BATCH = 64    # cache hits whose last_access is written in one commit
+
+
+def hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's bytes, read in chunks."""
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class OcrCache:
+    """
+    SQLite-backed, thread-safe OCR text cache with size-based LRU eviction.
+
+    Usage:
+        cache = OcrCache(path, max_bytes=512 * 1024 * 1024)
+        key = cache.key_for(image_path, url)
+        text = cache.get(key)          # None on miss
+        if text is None:
+            text = run_ocr(...)
+            cache.put(key, text)
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            " key TEXT PRIMARY KEY,"
+            " text TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_cache_lru ON ocr_cache(last_access)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+        self._touched: Dict[str, float] = {}  # key -> last_access not yet written
+
+    @staticmethod
+    def key_for(image_path: Path, url: str, digest: Optional[str] = None, page: Optional[int] = None) -> str:
+        """
+        Cache key: hash of the image bytes (or a known `digest` of them), salted with the OCR URL
+        and, for one page of a multi-page TIFF/PDF, the page number.
+        """
+        source = digest or hash_file(image_path)
+        if page is not None:
+            source += f"#page{page}"
+        return hashlib.sha256(f"{source}\n{url}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_BATCH:
+                self._flush_touched()
+                self._conn.commit()
+            return row[0]
+
+    def _flush_touched(self) -> None:
+        """Write pending last_access updates of cache hits (lock held, caller commits)."""
+        if self._touched:
+            self._conn.executemany("UPDATE ocr_cache SET last_access = ? WHERE key = ?",
+                                   [(ts, key) for key, ts in self._touched.items()])
+            self._touched.clear()
+
+    def contains(self, key: str) -> bool:
+        """Check for an entry without touching hit/miss counters or LRU order."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM ocr_cache WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key: str, text: str) -> None:
+        size = len(text.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, text, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, text, size, now, now),
+            )
+            self._touched.pop(key, None)
+            self._total += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the total size fits max_bytes (lock held)."""
+        if self._total <= self.max_bytes:
+            return
+        self._flush_touched()  # recent hits must not be evicted as if unused
+        while self._total > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_access ASC LIMIT ?",
+                                      (EVICT_BATCH,)).fetchall()
+            if not rows:
+                self._total = 0
+                break
+            victims = []
+            for key, size in rows:
+                if self._total <= self.max_bytes:
+                    break
+                victims.append((key,))
+                self._total -= size
+            self._conn.executemany("DELETE FROM ocr_cache WHERE key = ?", victims)
+            self.evictions += len(victims)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+            total = self._total
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
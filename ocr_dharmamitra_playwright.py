@@ -22,10 +22,27 @@ from __future__ import annotations
 import argparse
 import re
 import sys
+import time
+import weakref
+from contextlib import contextmanager
+from itertools import chain
 from pathlib import Path
-from typing import List, Optional
+from threading import Lock
+from typing import Any, Iterator, List, Optional
 
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
+from playwright.sync_api import sync_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeout
+
+# Import from same directory
+THIS_FILE = Path(__file__).resolve()
+SCRIPTS_DIR = THIS_FILE.parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from ocr_errors import NoTibetan, NavigationFailed, ResultTimeout, UploadFailed, site_error  # type: ignore
+from ocr_manifest import iter_images  # type: ignore
+from ocr_network import NetworkPolicy, add_network_arguments, install_routes, network_policy_from_args  # type: ignore
+from ocr_selector_profile import DEFAULT_PROFILE_PATH, SelectorProfile, page_key  # type: ignore
+from ocr_trace import span  # type: ignore
 
 
 OCR_URL_DEFAULT = "https://dharmamitra.org/zh-hant?view=ocr"
@@ -53,23 +70,126 @@ DESKTOP_CHROME_UA = (
     "Chrome/120.0 Safari/537.36"
 )
 
+# Selector heuristics, shared by the sync functions below and the async engine
+# 选择器启发式规则，供下方同步函数和异步引擎共用
+FILE_INPUT_SELECTORS = [
+    'input[type="file"]',
+    'input[type=file]',
+    'input#file',
+    'input[name="file"]',
+    'input[accept*="image"]',
+    'input[accept*="png"]',
+    'input[accept*="jpg"]',
+]
+FILECHOOSER_TEXT_SELECTORS = [
+    'text=/^Upload$/i', 'text=/^Choose/i', 'text=/^Select/i', 'text=/^OCR$/i',
+    'text=/上傳/', 'text=/選擇/', 'text=/選取/', 'text=/開始辨識/', 'text=/開始/', 'text=/辨識/',
+]
+FILECHOOSER_ROLE_SELECTORS = [
+    'role=button[name=/OCR|Upload|上傳|選擇|開始|辨識/i]',
+]
+LABEL_SELECTORS = [
+    'label[for]',
+    'label:has-text("上傳")',
+    'label:has-text("選擇")',
+    'label:has-text("OCR")',
+]
+START_TRIGGER_SELECTORS = [
+    'text=/▶/',                         # triangle glyph
+    'role=button[name=/▶/]',
+    'role=button[name=/開始|開始辨識|辨識|啟動/i]',
+    'role=button[name=/Start|Recognize|OCR/i]',
+    'button:has-text("▶")',
+    'button[aria-label*="▶"]',
+    'button[aria-label*="Start" i]',
+    'button[title*="Start" i]',
+    'button[aria-label*="開始"]',
+    'button[title*="開始"]',
+    'button[aria-label*="辨識"]',
+    'button[title*="辨識"]',
+    'button:has(svg[class*="play"])',
+    'button:has(svg[aria-label*="play" i])',
+    'button:has(i[class*="play"])',
+    '[data-icon*=play]',
+]
+OCR_TRIGGER_SELECTORS = [
+    'text=/^OCR$/i', 'text=/開始辨識/', 'text=/^Start$/i', 'text=/Recognize/i', 'text=/辨識/', 'text=/^開始$/',
+]
+
+# Optional learned-selector profile (see ocr_selector_profile.py). When set, the heuristics
+# below try the selector that worked last time first and only fall back to full discovery on a miss.
+SELECTOR_PROFILE: Optional[SelectorProfile] = None
+
+# Optional request interception (see ocr_network.py): block analytics/images/fonts and serve
+# JS/CSS from a shared disk cache. Installed on every browser context created below.
+NETWORK_POLICY: Optional[NetworkPolicy] = None
+
 def log(msg: str) -> None:
     print(f"[OCR] {msg}")
 
+def set_selector_profile(profile: Optional[SelectorProfile]) -> None:
+    """Install (or clear, with None) the process-wide learned selector profile."""
+    global SELECTOR_PROFILE
+    SELECTOR_PROFILE = profile
+
+def set_network_policy(policy: Optional[NetworkPolicy]) -> None:
+    """Install (or clear, with None) the process-wide request interception policy."""
+    global NETWORK_POLICY
+    NETWORK_POLICY = policy
+
+def new_ocr_context(browser):
+    """New browser context with the OCR page's settings and the network policy (if any)."""
+    context = browser.new_context(ignore_https_errors=True, user_agent=DESKTOP_CHROME_UA)
+    if NETWORK_POLICY is not None:
+        install_routes(context, NETWORK_POLICY)
+    return context
+
+def frame_key(ctx) -> str:
+    """Profile key for a page/frame: "" for the main frame, else the frame URL."""
+    if getattr(ctx, "parent_frame", None) is None:
+        return ""
+    return ctx.url
+
+def learned_context(page, role: str):
+    """Return (ctx, selector) learned for this page and role, or None if nothing usable is learned."""
+    if SELECTOR_PROFILE is None:
+        return None
+    entry = SELECTOR_PROFILE.lookup(role, page.url)
+    if entry is None:
+        return None
+    frame_url, sel = entry
+    if not frame_url:
+        return page, sel
+    for fr in page.frames:
+        if page_key(fr.url) == frame_url:
+            return fr, sel
+    return None
+
+def record_discovery(page, role: str, ctx=None, sel: Optional[str] = None) -> None:
+    if SELECTOR_PROFILE is not None:
+        SELECTOR_PROFILE.record_discovery(role, page.url, frame_key(ctx) if ctx is not None else "", sel)
+
+def click_learned(page, role: str, timeout_ms: int = 1000) -> bool:
+    """Click the learned selector for this role if it is present. Returns True if clicked."""
+    learned = learned_context(page, role)
+    if learned is None:
+        return False
+    ctx, sel = learned
+    try:
+        if ctx.query_selector(sel):
+            log(f"Clicking learned {role}: {sel}")
+            ctx.click(sel, timeout=timeout_ms)
+            SELECTOR_PROFILE.record_hit(role)
+            return True
+    except Exception:
+        pass
+    return False
+
 def find_file_input(page) -> Optional[str]:
     """
     Try to find a file input selector. Return selector string if found, else None.
     """
-    candidates = [
-        'input[type="file"]',
-        'input[type=file]',
-        'input#file',
-        'input[name="file"]',
-        'input[accept*="image"]',
-        'input[accept*="png"]',
-        'input[accept*="jpg"]',
-    ]
-    for sel in candidates:
+    for sel in FILE_INPUT_SELECTORS:
         try:
             el = page.query_selector(sel)
             if el:
@@ -78,49 +198,49 @@ def find_file_input(page) -> Optional[str]:
             pass
     return None
 
-def set_files_if_input_exists(page, image_path: Path) -> bool:
+def set_files_if_input_exists(page, image_path: Path) -> Optional[str]:
+    """Set files on the first matching file input; return the selector used, or None."""
     sel = find_file_input(page)
     if sel:
         try:
             page.set_input_files(sel, str(image_path))
             log(f"Set input files via selector: {sel}")
-            return True
+            return sel
         except Exception as e:
             log(f"Failed set_input_files on {sel}: {e}")
-    return False
+    return None
 
 
 def try_click_filechooser(page) -> None:
     """
     Attempt to trigger a file chooser by clicking common button texts.
     """
-    candidates = [
-        'text=/^Upload$/i', 'text=/^Choose/i', 'text=/^Select/i', 'text=/^OCR$/i',
-        'text=/上傳/', 'text=/選擇/', 'text=/選取/', 'text=/開始辨識/', 'text=/開始/', 'text=/辨識/',
-    ]
-    role_candidates = [
-        'role=button[name=/OCR|Upload|上傳|選擇|開始|辨識/i]',
-    ]
+    if click_learned(page, "filechooser"):
+        return
     def click_in_context(ctx) -> bool:
-        for sel in candidates:
+        for sel in FILECHOOSER_TEXT_SELECTORS:
             try:
                 if ctx.query_selector(sel):
                     log(f"Clicking candidate: {sel}")
                     ctx.click(sel, timeout=1000)
+                    record_discovery(page, "filechooser", ctx, sel)
                     return True
             except Exception:
                 continue
-        for sel in role_candidates:
+        for sel in FILECHOOSER_ROLE_SELECTORS:
             try:
                 if ctx.query_selector(sel):
                     log(f"Clicking role-candidate: {sel}")
                     ctx.click(sel, timeout=1000)
+                    record_discovery(page, "filechooser", ctx, sel)
                     return True
             except Exception:
                 continue
         try:
             log("Clicking the first <button> as fallback")
             ctx.click("button", timeout=1000)
+            # Don't learn the blind fallback
+            record_discovery(page, "filechooser")
             return True
         except Exception:
             return False
@@ -133,20 +253,37 @@ def try_click_filechooser(page) -> None:
                 return
     except Exception:
         pass
+    record_discovery(page, "filechooser")
 
 def set_files_in_any_context(page, image_path: Path) -> bool:
     """
     Try setting files on main page and then on each iframe.
     """
-    if set_files_if_input_exists(page, image_path):
+    learned = learned_context(page, "file_input")
+    if learned is not None:
+        ctx, sel = learned
+        try:
+            if ctx.query_selector(sel):
+                ctx.set_input_files(sel, str(image_path))
+                log(f"Set input files via learned selector: {sel}")
+                SELECTOR_PROFILE.record_hit("file_input")
+                return True
+        except Exception:
+            pass
+    sel = set_files_if_input_exists(page, image_path)
+    if sel:
+        record_discovery(page, "file_input", page, sel)
         return True
     try:
         for frame in page.frames:
-            if set_files_if_input_exists(frame, image_path):
+            sel = set_files_if_input_exists(frame, image_path)
+            if sel:
                 log("Set files via iframe context.")
+                record_discovery(page, "file_input", frame, sel)
                 return True
     except Exception as e:
         log(f"Frame scan error: {e}")
+    record_discovery(page, "file_input")
     return False
 
 def debug_list_frames(page) -> None:
@@ -178,20 +315,14 @@ def debug_probe_inputs(page) -> None:
     except Exception:
         pass
 
-def navigate_with_retries(page, primary_url: str, timeout_ms: int, retries: int = 2) -> None:
+def navigate_with_retries(page, primary_url: str, timeout_ms: int, retries: int = 2, probe: bool = True) -> None:
     """
     Navigate to the OCR URL with a couple of alternate forms and sanity checks
-    to avoid about:blank / blocked loads.
+    to avoid about:blank / blocked loads. probe=False skips the debug frame/input listing.
     """
-    alt_urls = [
-        primary_url,
-        primary_url.replace("https://dharmamitra.org", "https://www.dharmamitra.org"),
-        "https://dharmamitra.org/zh-hant?view=ocr",
-        "https://www.dharmamitra.org/zh-hant?view=ocr",
-    ]
     tried = 0
     last_err = None
-    for url in alt_urls:
+    for url in alternate_ocr_urls(primary_url):
         if tried > retries:
             break
         try:
@@ -204,47 +335,33 @@ def navigate_with_retries(page, primary_url: str, timeout_ms: int, retries: int
             except Exception:
                 current = ""
             log(f"After goto, page.url = {current}")
-            debug_list_frames(page)
-            debug_probe_inputs(page)
+            if probe:
+                debug_list_frames(page)
+                debug_probe_inputs(page)
             if current and "about:blank" not in current:
                 return
         except Exception as e:
             last_err = e
         tried += 1
     if last_err:
-        raise last_err
-    raise PlaywrightTimeout("Navigation failed: ended up on about:blank or could not load OCR page.")
+        raise NavigationFailed(f"Navigation failed: {last_err}") from last_err
+    raise NavigationFailed("Navigation failed: ended up on about:blank or could not load OCR page.")
 
 def click_start_trigger(page, click_timeout_ms: int = 1500) -> bool:
     """
     Try to click the 'start' control (triangle/Start) to begin OCR.
     Attempts selectors on main page and iframes. Returns True if clicked.
     """
-    selectors = [
-        'text=/▶/',                         # triangle glyph
-        'role=button[name=/▶/]',
-        'role=button[name=/開始|開始辨識|辨識|啟動/i]',
-        'role=button[name=/Start|Recognize|OCR/i]',
-        'button:has-text("▶")',
-        'button[aria-label*="▶"]',
-        'button[aria-label*="Start" i]',
-        'button[title*="Start" i]',
-        'button[aria-label*="開始"]',
-        'button[title*="開始"]',
-        'button[aria-label*="辨識"]',
-        'button[title*="辨識"]',
-        'button:has(svg[class*="play"])',
-        'button:has(svg[aria-label*="play" i])',
-        'button:has(i[class*="play"])',
-        '[data-icon*=play]',
-    ]
+    if click_learned(page, "start_trigger", timeout_ms=click_timeout_ms):
+        return True
     def try_click(ctx) -> bool:
-        for sel in selectors:
+        for sel in START_TRIGGER_SELECTORS:
             try:
                 el = ctx.query_selector(sel)
                 if el:
                     log(f"Clicking start trigger: {sel}")
                     ctx.click(sel, timeout=click_timeout_ms)
+                    record_discovery(page, "start_trigger", ctx, sel)
                     return True
             except Exception:
                 continue
@@ -259,6 +376,7 @@ def click_start_trigger(page, click_timeout_ms: int = 1500) -> bool:
                 return True
     except Exception:
         pass
+    record_discovery(page, "start_trigger")
     return False
 
 def debug_probe_inputs(page) -> None:
@@ -278,24 +396,19 @@ def debug_probe_inputs(page) -> None:
         pass
 
 
-def robust_upload_image(page, image_path: Path, timeout_ms: int = 12000) -> None:
+def robust_upload_image(page, image_path: Path, timeout_ms: int = 12000) -> str:
     """
     Try multiple strategies to upload the image:
       1) Direct set_input_files on any visible/hidden file input
       2) Click labels/buttons to reveal inputs, then set_input_files
       3) As last resort, wait for filechooser event briefly and click triggers
+    Returns the strategy that worked: "file_input", "label", "filechooser" or "rescan".
     """
     # 1) Direct try
     if set_files_in_any_context(page, image_path):
-        return
+        return "file_input"
     # 2) Click labels commonly associated with file inputs
-    label_candidates = [
-        'label[for]',
-        'label:has-text("上傳")',
-        'label:has-text("選擇")',
-        'label:has-text("OCR")',
-    ]
-    for sel in label_candidates:
+    for sel in LABEL_SELECTORS:
         try:
             els = page.query_selector_all(sel)
             if not els:
@@ -304,7 +417,7 @@ def robust_upload_image(page, image_path: Path, timeout_ms: int = 12000) -> None
                 log(f"Clicking label candidate: {sel}")
                 page.click(sel, timeout=1000)
                 if set_files_in_any_context(page, image_path):
-                    return
+                    return "label"
         except Exception:
             continue
     # 3) File chooser event (short attempts with different triggers)
@@ -314,122 +427,591 @@ def robust_upload_image(page, image_path: Path, timeout_ms: int = 12000) -> None
         file_chooser = fc_info.value
         file_chooser.set_files(str(image_path))
         log("Uploaded via file chooser event.")
-        return
+        return "filechooser"
     except PlaywrightTimeout:
         # As final fallback, try clicking triggers again then re-scan inputs
         log("File chooser timeout; attempting re-scan for inputs after trigger clicks.")
         try_click_filechooser(page)
         if set_files_in_any_context(page, image_path):
-            return
-        raise PlaywrightTimeout('Could not upload image: no file input and file chooser did not appear.')
+            return "rescan"
+        raise UploadFailed('Could not upload image: no file input and file chooser did not appear.')
+
+def alternate_ocr_urls(primary_url: str) -> List[str]:
+    """URLs to try in order when navigating to the OCR page."""
+    return [
+        primary_url,
+        primary_url.replace("https://dharmamitra.org", "https://www.dharmamitra.org"),
+        "https://dharmamitra.org/zh-hant?view=ocr",
+        "https://www.dharmamitra.org/zh-hant?view=ocr",
+    ]
+
+def extract_ocr_result(body_text: str) -> Optional[str]:
+    """
+    Inspect the page text once. Return the extracted Tibetan lines if OCR has finished,
+    None if we should keep waiting, or raise a typed OcrError (RateLimited, BlankPage, ...)
+    if the page shows a real error.
+    """
+    # Check for real errors first (not progress messages)
+    if ERROR_PATTERN.search(body_text):
+        # Make sure it's not just a progress message
+        if not PROGRESS_PATTERN.search(body_text):
+            # Extract the error message for better diagnostics
+            error_lines = [line.strip() for line in body_text.splitlines() 
+                          if ERROR_PATTERN.search(line) and line.strip()]
+            error_msg = "; ".join(error_lines[:3]) if error_lines else "Error indicator detected"
+            raise site_error(error_msg)
+        # If it's a progress message, continue waiting
+        # 如果是进度消息，继续等待
+
+    # Check for Tibetan text
+    if TIBETAN_REGEX.search(body_text):
+        # Extract lines containing Tibetan
+        lines = []
+        for line in body_text.splitlines():
+            if TIBETAN_REGEX.search(line):
+                lines.append(line.strip())
+        # Deduplicate while preserving order
+        seen = set()
+        uniq = []
+        for l in lines:
+            if l not in seen:
+                seen.add(l)
+                uniq.append(l)
+        result = "\n".join(uniq).strip()
+        # Double-check: if result is empty or only contains non-Tibetan, it's likely an error
+        if not result or not TIBETAN_REGEX.search(result):
+            raise NoTibetan("OCR completed but no Tibetan text was extracted")
+        return result
+    return None
+
+# Injected completion watcher for wait_for_function(). A MutationObserver marks the DOM dirty
+# and records the time of the last change; the predicate only rescans when something changed
+# (or every 500 ms, to catch <textarea> value updates that don't mutate the DOM). It resolves
+#   {kind: "error", text}  as soon as a real error (not a progress message) is shown, or
+#   {kind: "text", text}   once the node holding Tibetan text has been stable for settleMs.
+# On a reused page, text nodes already shown before the reset (window.__ocrStale) are ignored.
+# 注入页面的完成检测脚本：用 MutationObserver 代替轮询 inner_text("body")
+COMPLETION_WATCH_JS = r"""
+([errSrc, progSrc, settleMs]) => {
+  const tib = /[\u0F00-\u0FFF]/;
+  const err = new RegExp(errSrc, 'i');
+  const prog = new RegExp(progSrc, 'i');
+  if (!document.body) return false;
+  let st = window.__ocrWatch;
+  if (!st) {
+    st = window.__ocrWatch = { last: performance.now(), dirty: true, scanned: 0, result: null };
+    st.observer = new MutationObserver(() => { st.last = performance.now(); st.dirty = true; });
+    st.observer.observe(document.body, { childList: true, subtree: true, characterData: true });
+  }
+  const stale = window.__ocrStale;
+  const scan = () => {
+    const bodyText = document.body.innerText || '';
+    if (err.test(bodyText) && !prog.test(bodyText)) {
+      const lines = bodyText.split('\n').map(l => l.trim()).filter(l => l && err.test(l));
+      return { kind: 'error', text: lines.slice(0, 3).join('; ') };
+    }
+    for (const el of document.querySelectorAll('textarea, input[type=text]')) {
+      if (tib.test(el.value || '')) return { kind: 'text', text: el.value };
+    }
+    // Lowest common ancestor of every text node containing Tibetan = the output node
+    let node = null;
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+    while (walker.nextNode()) {
+      const t = walker.currentNode;
+      if (!tib.test(t.nodeValue) || !t.parentElement || (stale && stale.has(t))) continue;
+      if (!node) { node = t.parentElement; continue; }
+      const ancestors = new Set();
+      for (let a = node; a; a = a.parentElement) ancestors.add(a);
+      let b = t.parentElement;
+      while (b && !ancestors.has(b)) b = b.parentElement;
+      node = b || document.body;
+    }
+    return node ? { kind: 'text', text: node.innerText || '' } : null;
+  };
+  const now = performance.now();
+  if (st.dirty || now - st.scanned > 500) {
+    const prev = st.result;
+    st.dirty = false;
+    st.scanned = now;
+    st.result = scan();
+    if (st.result && prev && st.result.text !== prev.text) st.last = now;
+  }
+  const r = st.result;
+  if (!r) return false;
+  if (r.kind === 'error') return r;
+  return now - st.last >= settleMs ? r : false;
+}
+"""
+
+
+# Reset the OCR widget in place for the next image on an already loaded page: disconnect and
+# drop the completion watcher (its MutationObserver would otherwise keep firing for every later
+# image), mark the text nodes of the previous result as stale (window.__ocrStale) and clear
+# Tibetan text from text fields, then clear the file inputs so setting the same file name fires
+# a change again. Stale nodes are skipped when looking for the result, so the next image is only
+# done once the site shows new or rewritten output, even if its text equals the previous one.
+# The site's own elements are not removed. Returns the number of file inputs cleared.
+# 在已加载的页面上原地重置 OCR 组件，供下一张图片使用（无需重新加载页面）
+RESET_WIDGET_JS = r"""
+() => {
+  const tib = /[\u0F00-\u0FFF]/;
+  if (window.__ocrWatch && window.__ocrWatch.observer) window.__ocrWatch.observer.disconnect();
+  window.__ocrWatch = undefined;
+  if (window.__ocrStaleObserver) window.__ocrStaleObserver.disconnect();
+  const stale = window.__ocrStale = new WeakSet();
+  if (document.body) {
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+    while (walker.nextNode()) {
+      if (tib.test(walker.currentNode.nodeValue)) stale.add(walker.currentNode);
+    }
+    // A stale text node rewritten in place holds new output
+    window.__ocrStaleObserver = new MutationObserver(records => {
+      for (const r of records) stale.delete(r.target);
+    });
+    window.__ocrStaleObserver.observe(document.body, { characterData: true, subtree: true });
+  }
+  for (const el of document.querySelectorAll('textarea, input[type=text]')) {
+    if (tib.test(el.value || '')) el.value = '';
+  }
+  let cleared = 0;
+  for (const el of document.querySelectorAll('input[type=file]')) {
+    try { el.value = ''; cleared++; } catch (e) {}
+  }
+  return cleared;
+}
+"""
+
+# Page text for the polling wait: body.innerText, or on a reset page (see RESET_WIDGET_JS)
+# the text nodes that are not stale, one per line.
+# 轮询等待用的页面文本：复用页面时跳过上一张图片留下的文本节点
+BODY_TEXT_JS = r"""
+() => {
+  const body = document.body;
+  if (!body) return '';
+  const stale = window.__ocrStale;
+  if (!stale) return body.innerText || '';
+  const hidden = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE']);
+  const lines = [];
+  const walker = document.createTreeWalker(body, NodeFilter.SHOW_TEXT);
+  while (walker.nextNode()) {
+    const t = walker.currentNode;
+    if (stale.has(t) || !t.parentElement || hidden.has(t.parentElement.tagName)) continue;
+    lines.push(t.nodeValue);
+  }
+  return lines.join('\n');
+}
+"""
+
+
+class PageSession:
+    """
+    Single-navigation session state of one page: the OCR URL it has loaded. Used by
+    ocr_page(reuse_page=True) to reset the widget in place instead of reloading the page
+    for every image.
+    """
+
+    def __init__(self) -> None:
+        self.url: Optional[str] = None
+        self.navigations = 0
+        self.resets = 0
+
+    def invalidate(self) -> None:
+        """Force a fresh navigation for the next image (after any failure)."""
+        self.url = None
+
+
+_SESSIONS: "weakref.WeakKeyDictionary[Any, PageSession]" = weakref.WeakKeyDictionary()
+_SESSIONS_LOCK = Lock()
+
+
+def page_session(page) -> PageSession:
+    """Session state for this page (created on first use, dropped with the page)."""
+    with _SESSIONS_LOCK:
+        sess = _SESSIONS.get(page)
+        if sess is None:
+            sess = _SESSIONS[page] = PageSession()
+        return sess
+
+
+def completion_watch_result(info: dict) -> str:
+    """Turn the watcher's resolved value into extracted Tibetan text (or raise a typed OcrError)."""
+    if info.get("kind") == "error":
+        raise site_error(info.get("text") or "Error indicator detected")
+    result = extract_ocr_result(info.get("text") or "")
+    if result is None:
+        raise NoTibetan("OCR completed but no Tibetan text was extracted")
+    return result
+
+
+def wait_for_tibetan_text_event(page, timeout_ms: int = 15000, settle_ms: int = 250) -> str:
+    """
+    Event-driven completion: inject COMPLETION_WATCH_JS and let the browser decide when the
+    Tibetan output node has appeared and stopped changing. Only that node's text crosses
+    back to Python, instead of the whole body on every poll.
+    """
+    handle = page.wait_for_function(
+        COMPLETION_WATCH_JS,
+        arg=[ERROR_PATTERN.pattern, PROGRESS_PATTERN.pattern, settle_ms],
+        timeout=timeout_ms,
+        polling=100,
+    )
+    return completion_watch_result(handle.json_value())
+
 
-def wait_for_tibetan_text(page, timeout_ms: int = 15000) -> str:
+def wait_for_tibetan_text(page, timeout_ms: int = 15000, mode: str = "event") -> str:
     """
     Wait until Tibetan characters appear in the page text, then return extracted Tibetan lines.
-    If real error indicators are detected (e.g., "白页", "請求過多"), raise an error immediately.
+    If real error indicators are detected (e.g., "白页", "請求過多"), raise the matching typed error
+    (BlankPage, RateLimited, ...) immediately; time running out raises ResultTimeout.
     Progress messages (e.g., "大型檔案可能需要較長時間") are ignored and we continue waiting.
+
+    mode="event" uses the injected watcher (wait_for_tibetan_text_event) and falls back to
+    polling if the page refuses script evaluation; mode="poll" polls the body text
+    (BODY_TEXT_JS, which skips the previous image's output on a reused page).
     """
+    start = time.monotonic()
+    if mode == "event":
+        try:
+            return wait_for_tibetan_text_event(page, timeout_ms=timeout_ms)
+        except PlaywrightTimeout as e:
+            raise ResultTimeout("Timed out waiting for Tibetan OCR text to appear.") from e
+        except PlaywrightError as e:
+            log(f"Event-driven wait failed ({e}); falling back to polling.")
+        timeout_ms = max(0, timeout_ms - int((time.monotonic() - start) * 1000))
+
     page.wait_for_timeout(500)
     elapsed = 0
     step = 250
     while elapsed < timeout_ms:
         try:
-            body_text = page.inner_text("body")
+            body_text = page.evaluate(BODY_TEXT_JS)
         except Exception:
-            body_text = ""
-        
-        # Check for real errors first (not progress messages)
-        if ERROR_PATTERN.search(body_text):
-            # Make sure it's not just a progress message
-            if not PROGRESS_PATTERN.search(body_text):
-                # Extract the error message for better diagnostics
-                error_lines = [line.strip() for line in body_text.splitlines() 
-                              if ERROR_PATTERN.search(line) and line.strip()]
-                error_msg = "; ".join(error_lines[:3]) if error_lines else "Error indicator detected"
-                raise ValueError(f"OCR returned error: {error_msg}")
-            # If it's a progress message, continue waiting
-            # 如果是进度消息，继续等待
+            try:
+                body_text = page.inner_text("body")
+            except Exception:
+                body_text = ""
         
-        # Check for Tibetan text
-        if TIBETAN_REGEX.search(body_text):
-            # Extract lines containing Tibetan
-            lines = []
-            for line in body_text.splitlines():
-                if TIBETAN_REGEX.search(line):
-                    lines.append(line.strip())
-            # Deduplicate while preserving order
-            seen = set()
-            uniq = []
-            for l in lines:
-                if l not in seen:
-                    seen.add(l)
-                    uniq.append(l)
-            result = "\n".join(uniq).strip()
-            # Double-check: if result is empty or only contains non-Tibetan, it's likely an error
-            if not result or not TIBETAN_REGEX.search(result):
-                raise ValueError("OCR completed but no Tibetan text was extracted")
+        result = extract_ocr_result(body_text)
+        if result is not None:
             return result
-        
+
         page.wait_for_timeout(step)
         elapsed += step
-    raise PlaywrightTimeout("Timed out waiting for Tibetan OCR text to appear.")
+    raise ResultTimeout("Timed out waiting for Tibetan OCR text to appear.")
 
 
-def ocr_single_image(image_path: Path, output_dir: Path, url: str, headless: bool = True, timeout_ms: int = 15000) -> Path:
+def ocr_page(
+    page,
+    image_path: Path,
+    url: str,
+    timeout_ms: int = 15000,
+    upload_timeout_ms: int = 12000,
+    file_input_selector: Optional[str] = None,
+    extra_triggers: Optional[List[str]] = None,
+    wait_mode: str = "event",
+    reuse_page: bool = False,
+) -> str:
     """
-    Perform OCR for a single image by automating the dharmamitra OCR page.
-    Writes the Tibetan text to a .txt file under output_dir (same stem as image).
-    Returns the path to the written text file.
-    """
-    if not image_path.exists() or not image_path.is_file():
-        raise FileNotFoundError(f"Image not found: {image_path}")
-    output_dir.mkdir(parents=True, exist_ok=True)
-    out_txt = output_dir / (image_path.stem + ".txt")
+    Run one OCR pass on an already-open page: navigate, upload, trigger, wait.
+    Returns the extracted Tibetan text (nothing is written to disk).
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=headless)
-        context = browser.new_context(ignore_https_errors=True, user_agent=DESKTOP_CHROME_UA)
-        page = context.new_page()
+    With reuse_page=True the page is loaded once and later images only reset the OCR widget
+    in place (RESET_WIDGET_JS). If the reset or the upload fails (browser error, no file
+    input), the page is re-navigated and the image is uploaded there instead. Once the image
+    is uploaded nothing is repeated here: a ResultTimeout or an error answer from the site
+    (e.g. 請求過多) is raised to the caller's retry policy, and the next image navigates fresh.
+    """
+    stages = dict(timeout_ms=timeout_ms, upload_timeout_ms=upload_timeout_ms,
+                  file_input_selector=file_input_selector, extra_triggers=extra_triggers, wait_mode=wait_mode)
+    if not reuse_page:
+        # Each stage is timed as a span of the current image trace (see ocr_trace.py)
         # Try robust navigation with sanity checks
-        navigate_with_retries(page, url, timeout_ms=timeout_ms)
+        with span("navigate"):
+            navigate_with_retries(page, url, timeout_ms=timeout_ms)
+        return _ocr_loaded_page(page, image_path, **stages)
+
+    sess = page_session(page)
+    if sess.url == url:
+        uploaded = False
+        try:
+            with span("reset"):
+                page.evaluate(RESET_WIDGET_JS)
+            sess.resets += 1
+            _upload_image(page, image_path, upload_timeout_ms, file_input_selector)
+            uploaded = True
+        except (PlaywrightError, UploadFailed) as e:
+            log(f"In-place reset failed ({e}); re-navigating.")
+            sess.invalidate()
+        except Exception:
+            sess.invalidate()
+            raise
+        if uploaded:
+            log("Reusing loaded OCR page (widget reset in place).")
+            try:
+                return _trigger_and_wait(page, timeout_ms, extra_triggers, wait_mode)
+            except Exception:
+                sess.invalidate()
+                raise
+    try:
+        with span("navigate"):
+            navigate_with_retries(page, url, timeout_ms=timeout_ms, probe=sess.navigations == 0)
+        sess.navigations += 1
+        sess.url = url
+        return _ocr_loaded_page(page, image_path, **stages)
+    except Exception:
+        sess.invalidate()
+        raise
+
+
+def _ocr_loaded_page(
+    page,
+    image_path: Path,
+    timeout_ms: int,
+    upload_timeout_ms: int,
+    file_input_selector: Optional[str],
+    extra_triggers: Optional[List[str]],
+    wait_mode: str,
+) -> str:
+    """Upload, trigger and wait on a page that already shows the OCR widget."""
+    _upload_image(page, image_path, upload_timeout_ms, file_input_selector)
+    return _trigger_and_wait(page, timeout_ms, extra_triggers, wait_mode)
 
-        # Robust upload with multiple strategies
-        robust_upload_image(page, image_path, timeout_ms=min(12000, timeout_ms))
 
-        # Try to trigger OCR if a start button exists
+def _upload_image(page, image_path: Path, upload_timeout_ms: int, file_input_selector: Optional[str]) -> None:
+    with span("upload") as sp:
+        # If user supplied a specific file input selector, try it first
+        if file_input_selector:
+            try:
+                page.set_input_files(file_input_selector, str(image_path))
+                log(f"Set input via user selector: {file_input_selector}")
+                sp["strategy"] = "user_selector"
+            except Exception as e:
+                log(f"User selector failed ({file_input_selector}): {e}; falling back to robust upload.")
+                sp["strategy"] = robust_upload_image(page, image_path, timeout_ms=upload_timeout_ms)
+        else:
+            # Robust upload with multiple strategies
+            sp["strategy"] = robust_upload_image(page, image_path, timeout_ms=upload_timeout_ms)
+
+
+def _trigger_and_wait(page, timeout_ms: int, extra_triggers: Optional[List[str]], wait_mode: str) -> str:
+    # Try to trigger OCR if a start button exists
+    with span("start_trigger"):
         if click_start_trigger(page):
             log("Clicked start trigger (triangle/Start).")
-        trigger_candidates = [
-            'text=/^OCR$/i', 'text=/開始辨識/', 'text=/^Start$/i', 'text=/Recognize/i', 'text=/辨識/', 'text=/^開始$/',
-        ]
-        for sel in trigger_candidates:
+    with span("ocr_trigger"):
+        if not click_learned(page, "ocr_trigger"):
+            clicked = None
+            for sel in list(extra_triggers or []) + OCR_TRIGGER_SELECTORS:
+                try:
+                    if page.query_selector(sel):
+                        log(f"Clicking trigger: {sel}")
+                        page.click(sel, timeout=1000)
+                        clicked = sel
+                        break
+                except Exception:
+                    continue
+            record_discovery(page, "ocr_trigger", page, clicked)
+
+    # Wait for Tibetan text to appear and extract
+    log("Waiting for Tibetan OCR text...")
+    with span("wait"):
+        return wait_for_tibetan_text(page, timeout_ms=timeout_ms, mode=wait_mode)
+
+
+class _PooledPage:
+    """A page in its own browser context, plus bookkeeping for recycling."""
+
+    def __init__(self, context, page) -> None:
+        self.context = context
+        self.page = page
+        self.uses = 0
+        self.crashed = False
+        page.on("crash", self._on_crash)
+
+    def _on_crash(self, _page) -> None:
+        self.crashed = True
+
+
+class BrowserPool:
+    """
+    Keep one Chromium browser alive and hand out warm pages for OCR.
+
+    Usage:
+        with BrowserPool(headless=True, max_uses=50) as pool:
+            with pool.page() as page:
+                text = ocr_page(page, image_path, url)
+
+    Each page lives in its own browser context. It is recycled (context closed,
+    a fresh one created on next acquire) after max_uses OCR runs, or as soon as
+    the page crashes or a Playwright error escapes the `with pool.page()` block.
+    The browser itself is relaunched only if it disconnects.
+
+    Sync Playwright objects are bound to the thread that created them,
+    so use one pool per worker thread.
+    """
+
+    def __init__(self, headless: bool = True, max_uses: int = 50) -> None:
+        self.headless = headless
+        self.max_uses = max(1, max_uses)
+        self._playwright = None
+        self._browser = None
+        self._idle: List[_PooledPage] = []
+        self.launches = 0
+        self.recycled = 0
+
+    def __enter__(self) -> "BrowserPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """Launch the browser if it is not running (called lazily by page())."""
+        if self._browser is not None and self._browser.is_connected():
+            return
+        if self._playwright is None:
+            with span("driver_start"):
+                self._playwright = sync_playwright().start()
+        self._idle = []
+        with span("launch"):
+            self._browser = self._playwright.chromium.launch(headless=self.headless)
+        self.launches += 1
+        log(f"Browser pool: launched Chromium (launch #{self.launches})")
+
+    def _new_slot(self) -> _PooledPage:
+        with span("new_page"):
+            context = new_ocr_context(self._browser)
+            return _PooledPage(context, context.new_page())
+
+    def _discard(self, slot: _PooledPage) -> None:
+        self.recycled += 1
+        try:
+            slot.context.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def page(self) -> Iterator[Any]:
+        """Acquire a warm page; it is returned to the pool (or recycled) on exit."""
+        self.start()
+        slot = self._idle.pop() if self._idle else self._new_slot()
+        try:
+            yield slot.page
+        except (PlaywrightError, NavigationFailed, UploadFailed, ResultTimeout):
+            # Timeouts, closed targets, crashed renderers: don't trust this page again
+            slot.crashed = True
+            raise
+        finally:
+            slot.uses += 1
+            if slot.crashed or slot.uses >= self.max_uses or slot.page.is_closed():
+                self._discard(slot)
+            else:
+                self._idle.append(slot)
+
+    def close(self) -> None:
+        for slot in self._idle:
             try:
-                if page.query_selector(sel):
-                    log(f"Clicking trigger: {sel}")
-                    page.click(sel, timeout=1000)
-                    break
+                slot.context.close()
             except Exception:
-                continue
+                pass
+        self._idle = []
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
 
-        # Wait for Tibetan text to appear and extract
-        log("Waiting for Tibetan OCR text...")
-        tibetan_text = wait_for_tibetan_text(page, timeout_ms=timeout_ms)
-        out_txt.write_text(tibetan_text, encoding="utf-8")
-        log(f"Wrote OCR text: {out_txt}")
 
-        context.close()
-        browser.close()
-    return out_txt
+def ocr_image_text(
+    image_path: Path,
+    url: str,
+    headless: bool = True,
+    timeout_ms: int = 15000,
+    pool: Optional[BrowserPool] = None,
+    wait_mode: str = "event",
+    reuse_page: bool = False,
+    capture: Any = None,
+) -> str:
+    """
+    Perform OCR for a single image by automating the dharmamitra OCR page and
+    return the Tibetan text (nothing is written to disk; see ocr_single_image).
+
+    If a BrowserPool is given, a warm page is borrowed from it instead of
+    launching (and tearing down) a browser for this one image; with reuse_page=True
+    that page also stays on the OCR site between images (see ocr_page).
+    `capture` (an ocr_direct_api.ApiCapture) records the page's upload request into
+    an API profile for the direct HTTP backend.
+    """
+    if not image_path.exists() or not image_path.is_file():
+        raise FileNotFoundError(f"Image not found: {image_path}")
+
+    upload_timeout_ms = min(12000, timeout_ms)
+    if pool is not None:
+        with pool.page() as page:
+            if capture is not None:
+                capture.attach(page)
+            try:
+                tibetan_text = ocr_page(page, image_path, url, timeout_ms=timeout_ms,
+                                        upload_timeout_ms=upload_timeout_ms, wait_mode=wait_mode,
+                                        reuse_page=reuse_page)
+            finally:
+                if capture is not None:
+                    capture.detach(page)
+            if capture is not None:
+                capture.finish(page, image_path, tibetan_text)
+    else:
+        with sync_playwright() as p:
+            with span("launch"):
+                browser = p.chromium.launch(headless=headless)
+                context = new_ocr_context(browser)
+                page = context.new_page()
+            if capture is not None:
+                capture.attach(page)
+            tibetan_text = ocr_page(page, image_path, url, timeout_ms=timeout_ms,
+                                    upload_timeout_ms=upload_timeout_ms, wait_mode=wait_mode)
+            if capture is not None:
+                capture.finish(page, image_path, tibetan_text)
+            context.close()
+            browser.close()
+    return tibetan_text
 
 
-def find_images(input_dir: Path, recursive: bool) -> List[Path]:
-    exts = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".webp"}
-    if recursive:
-        return sorted([p for p in input_dir.rglob("*") if p.is_file() and p.suffix.lower() in exts])
-    return sorted([p for p in input_dir.iterdir() if p.is_file() and p.suffix.lower() in exts])
+def ocr_single_image(
+    image_path: Path,
+    output_dir: Path,
+    url: str,
+    headless: bool = True,
+    timeout_ms: int = 15000,
+    pool: Optional[BrowserPool] = None,
+    wait_mode: str = "event",
+    reuse_page: bool = False,
+    capture: Any = None,
+) -> Path:
+    """
+    Perform OCR for a single image (see ocr_image_text) and write the Tibetan text
+    to a .txt file under output_dir (same stem as image).
+    Returns the path to the written text file.
+    """
+    tibetan_text = ocr_image_text(image_path, url, headless=headless, timeout_ms=timeout_ms, pool=pool,
+                                  wait_mode=wait_mode, reuse_page=reuse_page, capture=capture)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    out_txt = output_dir / (image_path.stem + ".txt")
+    out_txt.write_text(tibetan_text, encoding="utf-8")
+    log(f"Wrote OCR text: {out_txt}")
+    return out_txt
 
 
 def main(argv: List[str] | None = None) -> int:
+    # Imported here: ocr_direct_api builds on this module
+    from ocr_direct_api import DEFAULT_API_PROFILE_PATH, ApiCapture  # type: ignore
+
     parser = argparse.ArgumentParser(description="Automate dharmamitra.org OCR to extract Tibetan text.")
     parser.add_argument("--url", type=str, default=OCR_URL_DEFAULT, help="OCR page URL")
     parser.add_argument("--image", type=Path, help="Single image path for test mode")
@@ -440,11 +1022,29 @@ def main(argv: List[str] | None = None) -> int:
     parser.add_argument("--timeout-ms", type=int, default=15000, help="Timeout per page (ms)")
     parser.add_argument("--file-input-selector", type=str, help="Force a specific CSS selector for file input")
     parser.add_argument("--trigger-selector", action="append", help="Additional trigger selector(s) to click for OCR")
+    parser.add_argument("--wait-mode", choices=["event", "poll"], default="event",
+                        help="How to detect OCR completion: injected DOM watcher (event) or body-text polling (poll)")
+    parser.add_argument("--selector-profile", type=Path, default=DEFAULT_PROFILE_PATH,
+                        help=f"JSON file of learned upload/trigger selectors (default: {DEFAULT_PROFILE_PATH})")
+    parser.add_argument("--no-selector-profile", action="store_true",
+                        help="Always run full selector discovery; don't read or write the profile")
+    parser.add_argument("--recycle-after", type=int, default=50, help="Batch mode: recycle the browser page after N images (default: 50)")
+    parser.add_argument("--reuse-page", action="store_true",
+                        help="Batch mode: load the OCR page once and reset it in place between images "
+                             "(re-navigate only if the reset fails)")
+    add_network_arguments(parser)
+    parser.add_argument("--capture-api", nargs="?", type=Path, const=DEFAULT_API_PROFILE_PATH, default=None,
+                        metavar="PROFILE",
+                        help="Single-image mode: record the page's upload request into an API profile for the "
+                             f"direct HTTP backend (default: {DEFAULT_API_PROFILE_PATH})")
     args = parser.parse_args(argv)
 
     if not args.image and not args.input_dir:
         print("Error: provide --image for single test or --input-dir for batch.", file=sys.stderr)
         return 2
+    if not args.no_selector_profile:
+        set_selector_profile(SelectorProfile(args.selector_profile))
+    set_network_policy(network_policy_from_args(args))
 
     try:
         if args.image:
@@ -454,6 +1054,8 @@ def main(argv: List[str] | None = None) -> int:
                 url=args.url,
                 headless=not args.headed,
                 timeout_ms=args.timeout_ms,
+                wait_mode=args.wait_mode,
+                capture=ApiCapture(args.capture_api) if args.capture_api else None,
             )
             print(f"OCR written: {out_path}")
             return 0
@@ -463,60 +1065,43 @@ def main(argv: List[str] | None = None) -> int:
         if not input_dir.exists() or not input_dir.is_dir():
             print(f"Error: input directory not found: {input_dir}", file=sys.stderr)
             return 2
-        images = find_images(input_dir, recursive=args.recursive)
-        if not images:
+        # Streamed from a scandir walk: the first image is OCR'd while the rest are still being found
+        images = iter_images(input_dir, recursive=args.recursive, skip_dirs=[args.output_dir])
+        first = next(images, None)
+        if first is None:
             print(f"No images found under {input_dir} (recursive={args.recursive}).")
             return 0
 
-        # Reuse a single browser session for batch
+        # Reuse a single warm browser for the whole batch
         args.output_dir.mkdir(parents=True, exist_ok=True)
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=not args.headed)
-            context = browser.new_context(ignore_https_errors=True, user_agent=DESKTOP_CHROME_UA)
-            page = context.new_page()
-            wrote = 0
-            for img in images:
+        wrote = 0
+        with BrowserPool(headless=not args.headed, max_uses=args.recycle_after) as pool:
+            for img in chain([first], images):
                 try:
                     log(f"Processing: {img}")
-                    navigate_with_retries(page, args.url, timeout_ms=args.timeout_ms)
-                    # If user supplied a specific file input selector, try it first
-                    if args.file_input_selector:
-                        try:
-                            page.set_input_files(args.file_input_selector, str(img))
-                            log(f"Set input via user selector: {args.file_input_selector}")
-                        except Exception as e:
-                            log(f"User selector failed ({args.file_input_selector}): {e}; falling back to robust upload.")
-                            robust_upload_image(page, img, timeout_ms=min(20000, args.timeout_ms))
-                    else:
-                        robust_upload_image(page, img, timeout_ms=min(20000, args.timeout_ms))
-
-                    # Trigger OCR if possible
-                    if click_start_trigger(page):
-                        log("Clicked start trigger (triangle/Start).")
-                    trigger_list = []
-                    if args.trigger_selector:
-                        trigger_list.extend(args.trigger_selector)
-                    trigger_list.extend(['text=/^OCR$/i', 'text=/開始辨識/', 'text=/^Start$/i', 'text=/Recognize/i', 'text=/辨識/', 'text=/^開始$/'])
-                    for sel in trigger_list:
-                        try:
-                            if page.query_selector(sel):
-                                log(f"Clicking trigger: {sel}")
-                                page.click(sel, timeout=1000)
-                                break
-                        except Exception:
-                            continue
-
-                    log("Waiting for Tibetan OCR text...")
-                    tibetan_text = wait_for_tibetan_text(page, timeout_ms=args.timeout_ms)
+                    with pool.page() as page:
+                        tibetan_text = ocr_page(
+                            page,
+                            img,
+                            args.url,
+                            timeout_ms=args.timeout_ms,
+                            upload_timeout_ms=min(20000, args.timeout_ms),
+                            file_input_selector=args.file_input_selector,
+                            extra_triggers=args.trigger_selector,
+                            wait_mode=args.wait_mode,
+                            reuse_page=args.reuse_page,
+                        )
                     out_txt = args.output_dir / (img.stem + ".txt")
                     out_txt.write_text(tibetan_text, encoding="utf-8")
                     print(f"OCR: {img} -> {out_txt}")
                     wrote += 1
                 except Exception as e:
                     print(f"Failed OCR for {img}: {e}", file=sys.stderr)
-            context.close()
-            browser.close()
         print(f"Done. Wrote {wrote} OCR text files to {args.output_dir}")
+        if SELECTOR_PROFILE is not None and SELECTOR_PROFILE.summary():
+            print("Selector discovery:\n" + SELECTOR_PROFILE.summary())
+        if NETWORK_POLICY is not None:
+            print("Network: " + NETWORK_POLICY.summary())
         return 0
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
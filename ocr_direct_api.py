@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Direct HTTP backend: replay the OCR page's own upload request without a browser.
+
+The Playwright flow only exists to get an image to the site's backend and scrape the
+result back out of the page. Capture mode watches the XHR/fetch request the page makes
+when an image is uploaded and records its shape in a JSON profile:
+
+    {"endpoint": "https://.../api/ocr", "method": "POST", "body": "multipart",
+     "parts": [{"name": "lang", "value": "bo"},
+               {"name": "file", "file": true, "filename": "{filename}", "content_type": "image/png"}],
+     "headers": {"origin": "...", "referer": "..."},
+     "response": {"format": "json", "text_path": ["text"], "error_keys": ["error", "detail", "message"]}}
+
+DirectOcrClient replays that profile over pooled keep-alive http.client connections
+(one per worker thread and host) and reads the text straight from the JSON response.
+When the site no longer answers the way the profile says (404, HTML instead of JSON,
+missing result key) it raises ProfileMismatch, and callers fall back to the browser;
+a browser run with capture enabled then refreshes the profile.
+
+直接 API 后端：捕获 OCR 页面上传图片时发出的 XHR/fetch 请求（网址、方法、multipart
+结构、响应格式）并保存为配置文件，之后用复用连接的 http.client 直接重放该请求并解析
+JSON 结果，无需 Chromium；配置与网站不再匹配时回退到浏览器并重新捕获。
+"""
+from __future__ import annotations
+
+import http.client
+import json
+import mimetypes
+import os
+import sys
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from pathlib import Path
+from threading import Lock, local
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+# Import from same directory
+THIS_FILE = Path(__file__).resolve()
+SCRIPTS_DIR = THIS_FILE.parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from ocr_dharmamitra_playwright import TIBETAN_REGEX, extract_ocr_result, log  # type: ignore
+from ocr_errors import NavigationFailed, NoTibetan, RateLimited, site_error  # type: ignore
+
+DEFAULT_API_PROFILE_PATH = Path.home() / ".tibetan_ocr" / "api_profile.json"
+PROFILE_VERSION = 1
+DEFAULT_ERROR_KEYS = ["error", "detail", "message"]
+
+# Request headers worth replaying; everything else is rebuilt or connection-specific
+REPLAY_HEADERS = ("accept", "accept-language", "origin", "referer", "user-agent")
+RETRYABLE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                               ConnectionResetError, BrokenPipeError)
+
+
+class ProfileMismatch(RuntimeError):
+    """The endpoint no longer behaves like the captured profile; use the browser instead."""
+
+
+def _templated(value: str, filename: str) -> str:
+    """Replace the uploaded file's name inside a captured value with "{filename}"."""
+    for form in (quote(filename), filename):
+        if form and form in value:
+            return value.replace(form, "{filename}")
+    return value
+
+
+def _find_text_path(data: Any, needle: str, path: Optional[List[Any]] = None) -> Optional[List[Any]]:
+    """Key/index path to the first string in `data` that contains `needle`."""
+    path = path or []
+    if isinstance(data, str):
+        return path if needle in data else None
+    if isinstance(data, dict):
+        items = list(data.items())
+    elif isinstance(data, list):
+        items = list(enumerate(data))
+    else:
+        return None
+    for key, value in items:
+        found = _find_text_path(value, needle, path + [key])
+        if found is not None:
+            return found
+    return None
+
+
+def _lookup(data: Any, path: List[Any]) -> Any:
+    for key in path:
+        if isinstance(data, dict) and isinstance(key, str):
+            data = data.get(key)
+        elif isinstance(data, list) and isinstance(key, int) and key < len(data):
+            data = data[key]
+        else:
+            return None
+    return data
+
+
+def build_profile(page_url: str, url: str, method: str, headers: Dict[str, str], body: bytes,
+                  response_body: str, image_bytes: bytes, filename: str, result_text: str) -> Optional[Dict[str, Any]]:
+    """
+    Profile for one captured request, or None if it isn't the upload (the image bytes are
+    not in its body) or its JSON response doesn't contain the OCR result.
+    """
+    content_type = headers.get("content-type", "")
+    parts: List[Dict[str, Any]] = []
+    if content_type.startswith("multipart/form-data"):
+        msg = BytesParser(policy=HTTP).parsebytes(b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+        if not msg.is_multipart():
+            return None
+        has_file = False
+        for part in msg.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            if payload == image_bytes:
+                has_file = True
+                parts.append({"name": name, "file": True,
+                              "filename": _templated(part.get_filename() or "image.png", filename),
+                              "content_type": part.get_content_type()})
+            else:
+                parts.append({"name": name, "value": payload.decode("utf-8", errors="replace")})
+        if not has_file:
+            return None
+        body_kind = "multipart"
+    elif body == image_bytes:
+        body_kind = "raw"
+    else:
+        return None
+
+    try:
+        data = json.loads(response_body)
+    except ValueError:
+        return None
+    first_line = next((l for l in result_text.splitlines() if TIBETAN_REGEX.search(l)), "")
+    text_path = _find_text_path(data, first_line.strip()) if first_line else None
+    if text_path is None:
+        return None
+
+    replay = {k: _templated(v, filename) for k, v in headers.items()
+              if k in REPLAY_HEADERS or (k.startswith("x-") and k != "x-requested-with")}
+    if body_kind == "raw" and content_type:
+        replay["content-type"] = content_type
+    return {
+        "version": PROFILE_VERSION,
+        "captured": round(time.time(), 3),
+        "page_url": page_url,
+        "endpoint": url,
+        "method": method,
+        "body": body_kind,
+        "parts": parts,
+        "headers": replay,
+        "response": {"format": "json", "text_path": text_path, "error_keys": DEFAULT_ERROR_KEYS},
+    }
+
+
+def save_profile(path: Path, profile: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(profile, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def load_profile(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        profile = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if profile.get("version") != PROFILE_VERSION or not profile.get("endpoint"):
+        return None
+    return profile
+
+
+class ApiCapture:
+    """
+    Record the upload request of one browser OCR run.
+
+    Usage:
+        capture = ApiCapture(profile_path)
+        capture.attach(page)
+        text = ocr_page(page, image_path, url)
+        capture.finish(page, image_path, text)    # writes the profile if the upload was found
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.profile: Optional[Dict[str, Any]] = None
+        self._requests: List[Any] = []
+
+    def _on_request(self, request) -> None:
+        if request.method in ("POST", "PUT") and request.resource_type in ("xhr", "fetch"):
+            self._requests.append(request)
+
+    def attach(self, page) -> None:
+        self._requests = []
+        page.on("request", self._on_request)
+
+    def detach(self, page) -> None:
+        try:
+            page.remove_listener("request", self._on_request)
+        except Exception:
+            pass
+
+    def finish(self, page, image_path: Path, result_text: str) -> Optional[Dict[str, Any]]:
+        """Find the upload among the recorded requests and save its profile (None if not found)."""
+        self.detach(page)
+        image_bytes = image_path.read_bytes()
+        for request in self._requests:
+            try:
+                body = request.post_data_buffer or b""
+                response = request.response()
+                if response is None:
+                    continue
+                profile = build_profile(page.url, request.url, request.method, request.headers, body,
+                                        response.text(), image_bytes, image_path.name, result_text)
+            except Exception:
+                continue
+            if profile is not None:
+                save_profile(self.path, profile)
+                self.profile = profile
+                log(f"Captured OCR API profile: {profile['method']} {profile['endpoint']} "
+                    f"({profile['body']}) -> {self.path}")
+                return profile
+        log("API capture: no upload request with a JSON result was seen")
+        return None
+
+
+class DirectOcrClient:
+    """
+    Replay a captured API profile over pooled keep-alive connections (thread-safe).
+
+    Usage:
+        client = DirectOcrClient(DEFAULT_API_PROFILE_PATH)
+        if client.usable:
+            try:
+                text = client.ocr(image_path)
+            except ProfileMismatch as e:
+                client.disable(str(e))           # fall back to the browser
+                capture = client.begin_capture()  # and refresh the profile from it
+    """
+
+    def __init__(self, profile_path: Path = DEFAULT_API_PROFILE_PATH, timeout_s: float = 60.0,
+                 max_captures: int = 2) -> None:
+        self.profile_path = profile_path
+        self.timeout_s = timeout_s
+        self.max_captures = max_captures
+        self.profile = load_profile(profile_path)
+        self.requests = 0
+        self.fallbacks = 0
+        self.captures = 0
+        self._lock = Lock()
+        self._capturing = False
+        self._local = local()
+
+    @property
+    def usable(self) -> bool:
+        return self.profile is not None
+
+    def disable(self, reason: str) -> None:
+        """Stop replaying until a fresh profile is captured."""
+        with self._lock:
+            if self.profile is not None:
+                log(f"Direct API profile no longer matches ({reason}); falling back to the browser")
+            self.profile = None
+            self.fallbacks += 1
+
+    def begin_capture(self) -> Optional[ApiCapture]:
+        """An ApiCapture for the next browser run, or None (capturing elsewhere / capture budget used)."""
+        with self._lock:
+            if self.profile is not None or self._capturing or self.captures >= self.max_captures:
+                return None
+            self._capturing = True
+        return ApiCapture(self.profile_path)
+
+    def end_capture(self, capture: ApiCapture) -> None:
+        with self._lock:
+            self._capturing = False
+            if capture.profile is not None:
+                self.profile = capture.profile
+                self.captures += 1
+
+    # --- HTTP ---------------------------------------------------------------
+
+    def _connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        pool = getattr(self._local, "pool", None)
+        if pool is None:
+            pool = self._local.pool = {}
+        conn = pool.get((scheme, netloc))
+        if conn is None:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = pool[(scheme, netloc)] = cls(netloc, timeout=self.timeout_s)
+        return conn
+
+    def _drop_connection(self, scheme: str, netloc: str) -> None:
+        conn = getattr(self._local, "pool", {}).pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def _request(self, method: str, url: str, body: bytes, headers: Dict[str, str]) -> Tuple[int, bytes]:
+        parts = urlsplit(url)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        for attempt in range(2):
+            conn = self._connection(parts.scheme, parts.netloc)
+            try:
+                conn.request(method, target, body=body, headers=headers)
+                response = conn.getresponse()
+                return response.status, response.read()
+            except RETRYABLE_CONNECTION_ERRORS:
+                # Server closed the keep-alive connection: reconnect once
+                self._drop_connection(parts.scheme, parts.netloc)
+                if attempt:
+                    raise
+            except Exception:
+                self._drop_connection(parts.scheme, parts.netloc)
+                raise
+        raise RuntimeError("unreachable")
+
+    def _body(self, profile: Dict[str, Any], image_path: Path) -> Tuple[bytes, Dict[str, str]]:
+        data = image_path.read_bytes()
+        headers = {k: v.replace("{filename}", quote(image_path.name)) for k, v in profile.get("headers", {}).items()}
+        if profile.get("body") == "raw":
+            headers["content-type"] = (mimetypes.guess_type(image_path.name)[0] or headers.get("content-type")
+                                       or "application/octet-stream")
+            return data, headers
+        boundary = "----tibetanocr" + uuid.uuid4().hex
+        chunks: List[bytes] = []
+        for part in profile.get("parts", []):
+            chunks.append(f"--{boundary}\r\n".encode("ascii"))
+            if part.get("file"):
+                filename = str(part.get("filename") or "{filename}").replace("{filename}", image_path.name)
+                content_type = mimetypes.guess_type(image_path.name)[0] or part.get("content_type") or "application/octet-stream"
+                chunks.append(f'Content-Disposition: form-data; name="{part["name"]}"; filename="{filename}"\r\n'
+                              f"Content-Type: {content_type}\r\n\r\n".encode("utf-8"))
+                chunks.append(data)
+            else:
+                chunks.append(f'Content-Disposition: form-data; name="{part["name"]}"\r\n\r\n'.encode("utf-8"))
+                chunks.append(str(part.get("value", "")).encode("utf-8"))
+            chunks.append(b"\r\n")
+        chunks.append(f"--{boundary}--\r\n".encode("ascii"))
+        headers["content-type"] = f"multipart/form-data; boundary={boundary}"
+        return b"".join(chunks), headers
+
+    def ocr(self, image_path: Path) -> str:
+        """
+        OCR one image via the captured endpoint. Returns the Tibetan text like the browser
+        path does; raises the same typed errors for what the site reports (RateLimited for
+        請求過多 / HTTP 429, BlankPage, NoTibetan, ...), NavigationFailed when the endpoint
+        can't be reached, and ProfileMismatch when the response no longer fits the profile.
+        """
+        profile = self.profile
+        if profile is None:
+            raise ProfileMismatch("no API profile captured")
+        body, headers = self._body(profile, image_path)
+        with self._lock:
+            self.requests += 1
+        try:
+            status, raw = self._request(profile.get("method", "POST"), profile["endpoint"], body, headers)
+        except (OSError, http.client.HTTPException) as e:
+            raise NavigationFailed(f"Direct API request failed: {e}") from e
+        try:
+            data = json.loads(raw.decode("utf-8"))
+        except ValueError:
+            if status == 429:
+                raise RateLimited("OCR returned error: 請求過多 (HTTP 429)")
+            raise ProfileMismatch(f"HTTP {status}, response is not JSON")
+
+        rules = profile.get("response", {})
+        text = _lookup(data, rules.get("text_path", ["text"]))
+        if isinstance(text, str) and text.strip():
+            result = extract_ocr_result(text)
+            if result is None:
+                raise NoTibetan("OCR completed but no Tibetan text was extracted")
+            return result
+        for key in rules.get("error_keys", DEFAULT_ERROR_KEYS):
+            message = data.get(key) if isinstance(data, dict) else None
+            if message:
+                raise site_error(message)
+        if status == 429:
+            raise RateLimited("OCR returned error: 請求過多 (HTTP 429)")
+        raise ProfileMismatch(f"HTTP {status}, no result at {rules.get('text_path')}")
+
+    def summary(self) -> str:
+        return (f"{self.requests} direct request(s), {self.fallbacks} fallback(s) to the browser, "
+                f"{self.captures} profile capture(s)")
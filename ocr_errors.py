@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Typed OCR failures and per-class retry policies.
+
+Every OCR path (browser, async engine, direct API, Tesseract) raises one of the classes
+below instead of a bare ValueError / PlaywrightTimeout, so callers can decide by type:
+
+    RateLimited       the site answered 請求過多 / HTTP 429          -> back off and retry
+    BlankPage         the site reported 白页 / no content             -> don't retry
+    NoTibetan         OCR finished but produced no Tibetan text       -> don't retry
+    UploadFailed      no file input / file chooser on the page        -> retry on a fresh page
+    NavigationFailed  the OCR page / API endpoint could not be reached -> retry after a pause
+    ResultTimeout     no result before --timeout-ms                   -> retry once
+    OcrError          any other error the site reported ("ocr_error")
+
+All of them subclass ValueError, so existing `except ValueError` handlers keep working.
+`error_class` labels (also used in metrics and diagnostics) come from the class, or from
+ERROR_CLASSES for exceptions raised by third-party code.
+
+类型化的 OCR 错误（速率限制、白页、无藏文、上传失败、导航失败、结果超时等），
+每类错误可单独配置重试次数、退避时间和随机抖动。
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import re
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple, Type, Union
+
+
+class OcrError(ValueError):
+    """An error reported by (or while talking to) the OCR service; base of all typed errors."""
+
+    error_class = "ocr_error"
+
+
+class RateLimited(OcrError):
+    error_class = "rate_limited"
+
+
+class BlankPage(OcrError):
+    error_class = "blank_page"
+
+
+class NoTibetan(OcrError):
+    error_class = "no_tibetan"
+
+
+class UploadFailed(OcrError):
+    error_class = "upload_failed"
+
+
+class NavigationFailed(OcrError):
+    error_class = "navigation_failed"
+
+
+class ResultTimeout(OcrError):
+    error_class = "timeout"
+
+
+# Error classes for failure messages, checked in order (for errors that are not typed)
+ERROR_CLASSES: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("rate_limited", re.compile(r"請求過多|请求过多|rate limit|too many requests", re.IGNORECASE)),
+    ("blank_page", re.compile(r"白\s*页|白\s*頁|空白|无内容|无文字|无文本", re.IGNORECASE)),
+    ("no_tibetan", re.compile(r"no Tibetan text", re.IGNORECASE)),
+    ("upload_failed", re.compile(r"Could not upload|set_input_files", re.IGNORECASE)),
+    ("navigation_failed", re.compile(r"Navigation failed|net::ERR_|page\.goto", re.IGNORECASE)),
+    ("timeout", re.compile(r"Timed out|Timeout", re.IGNORECASE)),
+    ("ocr_error", re.compile(r"OCR returned error", re.IGNORECASE)),
+]
+
+ERROR_TYPES: Dict[str, Type[OcrError]] = {
+    cls.error_class: cls
+    for cls in (RateLimited, BlankPage, NoTibetan, UploadFailed, NavigationFailed, ResultTimeout, OcrError)
+}
+
+
+def classify(error: Union[BaseException, str, None]) -> str:
+    """Error class label for an exception (typed or not) or a message; "other" if unknown."""
+    if isinstance(error, OcrError):
+        return error.error_class
+    message = str(error or "")
+    for name, pattern in ERROR_CLASSES:
+        if pattern.search(message):
+            return name
+    if isinstance(error, TimeoutError):
+        return "timeout"
+    return "other"
+
+
+def site_error(message: str) -> OcrError:
+    """Typed exception for an error text shown/returned by the OCR site ("OCR returned error: ...")."""
+    text = f"OCR returned error: {message}"
+    label = classify(message)
+    if label not in ("rate_limited", "blank_page"):
+        label = "ocr_error"
+    return ERROR_TYPES[label](text)
+
+
+@dataclass
+class RetryPolicy:
+    """
+    How often to retry one error class and how long to wait in between.
+    The n-th retry (1-based) waits backoff_s * n, scaled by a random factor in
+    [1 - jitter, 1 + jitter] so parallel workers don't retry in lockstep.
+    """
+
+    retries: int = 0
+    backoff_s: float = 0.0
+    jitter: float = 0.25
+
+    def delay(self, retry: int) -> float:
+        base = self.backoff_s * retry
+        if base <= 0 or self.jitter <= 0:
+            return max(0.0, base)
+        return base * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+
+
+DEFAULT_RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    "rate_limited": RetryPolicy(retries=3, backoff_s=5.0),
+    "navigation_failed": RetryPolicy(retries=2, backoff_s=2.0),
+    "upload_failed": RetryPolicy(retries=1, backoff_s=1.0),
+    "timeout": RetryPolicy(retries=1, backoff_s=2.0),
+    "blank_page": RetryPolicy(),
+    "no_tibetan": RetryPolicy(),
+    "ocr_error": RetryPolicy(),
+    "other": RetryPolicy(),
+}
+
+
+def parse_retry_spec(spec: str) -> Tuple[str, RetryPolicy]:
+    """Parse CLASS=RETRIES[:BACKOFF_S[:JITTER]] (e.g. "timeout=2:3:0.5") for --retry."""
+    name, sep, values = spec.partition("=")
+    name = name.strip()
+    if not sep or name not in DEFAULT_RETRY_POLICIES:
+        raise argparse.ArgumentTypeError(
+            f"expected CLASS=RETRIES[:BACKOFF[:JITTER]] with CLASS one of {', '.join(DEFAULT_RETRY_POLICIES)}")
+    fields = values.split(":")
+    try:
+        retries = int(fields[0])
+        policy = RetryPolicy(retries=max(0, retries), backoff_s=DEFAULT_RETRY_POLICIES[name].backoff_s)
+        if len(fields) > 1 and fields[1]:
+            policy.backoff_s = max(0.0, float(fields[1]))
+        if len(fields) > 2 and fields[2]:
+            policy.jitter = min(1.0, max(0.0, float(fields[2])))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid retry spec '{spec}'")
+    if len(fields) > 3:
+        raise argparse.ArgumentTypeError(f"invalid retry spec '{spec}'")
+    return name, policy
+
+
+def retry_policies(rate_limit_retries: Optional[int] = None, rate_limit_delay_s: Optional[float] = None,
+                   overrides: Optional[List[Tuple[str, RetryPolicy]]] = None) -> Dict[str, RetryPolicy]:
+    """DEFAULT_RETRY_POLICIES with the legacy rate-limit options and --retry overrides applied."""
+    policies = {name: replace(policy) for name, policy in DEFAULT_RETRY_POLICIES.items()}
+    if rate_limit_retries is not None:
+        policies["rate_limited"].retries = max(0, rate_limit_retries)
+    if rate_limit_delay_s is not None:
+        policies["rate_limited"].backoff_s = max(0.0, float(rate_limit_delay_s))
+    for name, policy in overrides or []:
+        policies[name] = policy
+    return policies
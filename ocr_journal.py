@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Append-only batch journal (write-ahead log) of per-image OCR status.
+
+Every state change of every image is appended as one JSON line:
+    {"image": "vol1/p001.tif", "status": "done", "text": "...", "ts": 1700000000.0}
+Statuses: queued, in_flight, done, failed (failed/done records carry "error"/"text").
+The last record for an image wins. Because results are stored in the journal, a batch
+that dies halfway can be restarted with --resume: completed images are taken from the
+journal and only failed or in-flight ones are OCR'd again. On resume only each image's
+last status is kept in memory; the text of a done image is read back from the journal
+file (by byte offset) when it is needed. A run without --resume starts a new journal,
+but an unfinished previous journal is first renamed to <name>.<timestamp>.jsonl instead
+of being overwritten, so forgetting --resume after a crash loses nothing.
+
+Image lists (read_image_list / write_image_list) use the same keys, one per line; they are
+written by diagnose_ocr_failures.py --retry-list and read by ocr_simple_batch.py --only.
+
+批处理日志（预写日志）：逐行记录每张图片的状态及结果，进程中断后可用 --resume
+跳过已完成的图片，只重试失败或进行中的图片。
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+QUEUED = "queued"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+
+def replay_journal(path: Path) -> Tuple[Dict[str, dict], Dict[str, int]]:
+    """
+    Replay a journal file: the last record per image without its "text", and the byte offset
+    of the line holding each image's last text (see read_text_at). Torn last lines are ignored.
+    """
+    state: Dict[str, dict] = {}
+    offsets: Dict[str, int] = {}
+    if not path.exists():
+        return state, offsets
+    offset = 0
+    with path.open("rb") as f:
+        for raw in f:
+            line_offset, offset = offset, offset + len(raw)
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line.decode("utf-8", errors="ignore"))
+            except ValueError:
+                continue  # partially written line from a crash
+            image = rec.get("image")
+            if image:
+                if rec.pop("text", None) is not None:
+                    offsets[image] = line_offset
+                else:
+                    offsets.pop(image, None)
+                state[image] = rec
+    return state, offsets
+
+
+def load_journal(path: Path) -> Dict[str, dict]:
+    """Replay a journal file and return the last record per image (without its OCR text)."""
+    return replay_journal(path)[0]
+
+
+def read_text_at(path: Path, offset: int) -> Optional[str]:
+    """The "text" of the journal record whose line starts at `offset`."""
+    with path.open("rb") as f:
+        f.seek(offset)
+        try:
+            return json.loads(f.readline().decode("utf-8", errors="ignore")).get("text")
+        except ValueError:
+            return None
+
+
+def read_image_list(path: Path) -> Set[str]:
+    """Image keys from a list file (one per line; blank lines and "# ..." comments ignored)."""
+    images: Set[str] = set()
+    with path.open("r", encoding="utf-8-sig", errors="ignore") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                images.add(line.replace("\\", "/"))
+    return images
+
+
+def write_image_list(path: Path, images: Iterable[str], comment: Optional[str] = None) -> int:
+    """Write image keys one per line (with an optional "# comment" first); returns the count."""
+    count = 0
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        if comment:
+            f.write(f"# {comment}\n")
+        for image in images:
+            f.write(image + "\n")
+            count += 1
+    return count
+
+
+class BatchJournal:
+    """
+    Thread-safe JSONL journal. Each record is flushed immediately and fsync'd
+    every `fsync_every` records or `fsync_interval_s` seconds, whichever comes first.
+
+    Usage:
+        journal = BatchJournal(path, resume=True)
+        rec = journal.state.get("vol1/p001.tif")      # last known record (resume), without text
+        text = journal.completed_text("vol1/p001.tif")  # read back from the file
+        journal.record("vol1/p001.tif", IN_FLIGHT)
+        journal.record("vol1/p001.tif", DONE, text=text)
+        journal.close()
+    """
+
+    def __init__(self, path: Path, resume: bool = False,
+                 fsync_every: int = 20, fsync_interval_s: float = 5.0) -> None:
+        self.path = path
+        self.rotated: Optional[Path] = None  # where an unfinished previous journal was moved
+        self.state: Dict[str, dict] = {}
+        self._offsets: Dict[str, int] = {}
+        if resume:
+            self.state, self._offsets = replay_journal(path)
+        elif path.exists():
+            self._rotate_unfinished()
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval_s = fsync_interval_s
+        self._lock = Lock()
+        self._since_sync = 0
+        self._last_sync = time.monotonic()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = path.open("a" if resume else "w", encoding="utf-8")
+        if resume and self._f.tell() > 0:
+            with path.open("rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._f.write("\n")  # don't glue the first new record onto a torn line
+
+    def _rotate_unfinished(self) -> None:
+        """Keep a previous journal that still has unfinished images (crash, failures) under a new name."""
+        state, _ = replay_journal(self.path)
+        if all(rec.get("status") == DONE for rec in state.values()):
+            return
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.path.stat().st_mtime))
+        target = self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}")
+        n = 1
+        while target.exists():
+            n += 1
+            target = self.path.with_name(f"{self.path.stem}.{stamp}-{n}{self.path.suffix}")
+        os.replace(self.path, target)
+        self.rotated = target
+
+    def is_done(self, image: str) -> bool:
+        rec = self.state.get(image)
+        return bool(rec) and rec.get("status") == DONE
+
+    def completed_text(self, image: str) -> Optional[str]:
+        """Result text if the journal already has this image as done, else None."""
+        if self.is_done(image):
+            offset = self._offsets.get(image)
+            if offset is None:
+                return ""
+            return read_text_at(self.path, offset) or ""
+        return None
+
+    def record(self, image: str, status: str, text: Optional[str] = None,
+               error: Optional[str] = None, **extra) -> None:
+        rec = {"image": image, "status": status, "ts": round(time.time(), 3)}
+        if text is not None:
+            rec["text"] = text
+        if error is not None:
+            rec["error"] = error
+        rec.update(extra)
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            self._since_sync += 1
+            if self._since_sync >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval_s:
+                self._sync()
+
+    def _sync(self) -> None:
+        self._f.flush()
+        try:
+            os.fsync(self._f.fileno())
+        except OSError:
+            pass
+        self._since_sync = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync()
+            self._f.close()
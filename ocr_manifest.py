@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Streaming image discovery with a manifest snapshot of the folder tree.
+
+`rglob("*")` + `is_file()` stats every file and the result has to be sorted before the
+first image can be processed; on a network share with hundreds of thousands of files
+that takes minutes. iter_images() walks the tree with os.scandir (file types come from
+the directory listing, no stat per file) and yields images one by one, in the same
+order as sorted(rglob(...)), so OCR can start while the walk continues.
+
+ImageManifest remembers, per directory, its mtime and listing, and per image its size,
+mtime and SHA-256 (once known). On the next run a directory whose mtime is unchanged
+is not listed again; its stored entries are reused, so an unchanged tree costs one stat
+per directory instead of one per file. Image hashes are reused for the result cache
+while size and mtime still match. Differences to the previous snapshot (new, removed
+and changed images) are counted and the manifest is rewritten at the end of the run.
+
+The manifest lives outside the tree (~/.tibetan_ocr/manifests/, keyed by the root path),
+but the batch still writes its journal, combined file and temp folders into the image
+root, which changes the root's mtime on every run. Before saving, folders whose mtime
+changed during the run are listed once more: if their subfolders and images are the
+same as at the start, only the new mtime is stored, so the next run reuses the listing.
+
+流式图片发现：用 os.scandir 逐个返回图片（顺序与排序后的 rglob 相同），OCR 无需等待
+整个目录扫描完成。清单文件记录每个目录的修改时间和文件列表，以及每张图片的大小、
+修改时间和哈希；下次运行时未变化的目录不再重新列出，只需比较差异。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Import from same directory
+THIS_FILE = Path(__file__).resolve()
+SCRIPTS_DIR = THIS_FILE.parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from ocr_cache import hash_file  # type: ignore
+
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".webp"}
+MANIFEST_VERSION = 1
+DEFAULT_MANIFEST_DIR = Path.home() / ".tibetan_ocr" / "manifests"
+# Directory mtimes this close to "now" may still change within the same timestamp tick
+RACY_MTIME_S = 2.0
+
+
+def _sort_key(name: str) -> str:
+    # Same order as sorting Path objects (case-insensitive on Windows)
+    return os.path.normcase(name)
+
+
+def default_manifest_path(root: Path) -> Path:
+    """Manifest file for an image root, outside the tree so writing it never changes the root's mtime."""
+    digest = hashlib.sha1(str(root).encode("utf-8")).hexdigest()[:12]
+    return DEFAULT_MANIFEST_DIR / f"{root.name}_{digest}.jsonl"
+
+
+def _list_dir(path: Path) -> List[Tuple[str, bool]]:
+    """Sorted (name, is_dir) entries of one directory, from a single scandir call."""
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir():
+                    entries.append((entry.name, True))
+                elif entry.is_file():
+                    entries.append((entry.name, False))
+            except OSError:
+                continue
+    entries.sort(key=lambda e: _sort_key(e[0]))
+    return entries
+
+
+def iter_images(root: Path, recursive: bool = True, exts: Iterable[str] = IMAGE_EXTS,
+                manifest: Optional["ImageManifest"] = None, skip_dirs: Iterable[Path] = ()) -> Iterator[Path]:
+    """
+    Yield the image files under root as they are found, in sorted order.
+    With a manifest, unchanged directories are taken from the previous snapshot.
+    `skip_dirs` (e.g. the tool's own output/temp folders) are not entered; unreadable
+    directories are skipped like rglob does.
+    """
+    exts = {e.lower() for e in exts}
+    skip = {os.path.abspath(d) for d in skip_dirs}
+    if manifest is not None:
+        manifest.exts, manifest.skip = exts, skip
+
+    def walk(directory: Path, rel: str) -> Iterator[Path]:
+        try:
+            entries = manifest.listing(directory, rel) if manifest is not None else _list_dir(directory)
+        except OSError:
+            return
+        for name, is_dir in entries:
+            if is_dir:
+                if recursive and not (skip and os.path.abspath(directory / name) in skip):
+                    yield from walk(directory / name, f"{rel}/{name}" if rel else name)
+            elif os.path.splitext(name)[1].lower() in exts:
+                path = directory / name
+                if manifest is not None:
+                    manifest.saw(path)
+                yield path
+
+    yield from walk(root, "")
+    if manifest is not None:
+        manifest.walk_complete = True
+
+
+class ImageManifest:
+    """
+    Snapshot of a folder tree: directory listings (keyed by relative path, with mtime)
+    and image records {"path", "size", "mtime_ns", "sha256"} (stat and hash filled in
+    when an image's content is first needed). Thread-safe.
+
+    Usage:
+        manifest = ImageManifest(path, root)
+        for image in iter_images(root, manifest=manifest): ...
+        digest = manifest.digest(image)      # reused while size/mtime are unchanged
+        manifest.save()                      # only after a complete walk
+        print(manifest.summary())
+    """
+
+    def __init__(self, path: Path, root: Path, rescan: bool = False) -> None:
+        self.path = path
+        self.root = root
+        self.rescan = rescan
+        self.walk_complete = False
+        # What the walk looks at (set by iter_images); other names don't invalidate a listing
+        self.exts: Set[str] = set(IMAGE_EXTS)
+        self.skip: Set[str] = set()
+        self._lock = Lock()
+        self._old_dirs: Dict[str, dict] = {}
+        self._old_files: Dict[str, dict] = {}
+        self._dirs: Dict[str, dict] = {}
+        self._files: Dict[str, dict] = {}
+        self.stats = {"dirs_scanned": 0, "dirs_reused": 0, "new": 0, "changed": 0, "hashed": 0}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                header = json.loads(f.readline() or "{}")
+                if header.get("version") != MANIFEST_VERSION or header.get("root") != str(self.root):
+                    return
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    if "dir" in rec:
+                        self._old_dirs[rec["dir"]] = rec
+                    elif "path" in rec:
+                        self._old_files[rec["path"]] = rec
+        except (OSError, ValueError):
+            pass
+
+    def _rel(self, path: Path) -> str:
+        return path.relative_to(self.root).as_posix()
+
+    # --- walking ------------------------------------------------------------
+
+    def listing(self, directory: Path, rel: str) -> List[Tuple[str, bool]]:
+        """Entries of one directory: from the snapshot if its mtime is unchanged, else scandir."""
+        mtime_ns = os.stat(directory).st_mtime_ns
+        old = self._old_dirs.get(rel)
+        if (old is not None and not self.rescan and old.get("mtime_ns") == mtime_ns
+                and time.time() - mtime_ns / 1e9 > RACY_MTIME_S):
+            entries = [(name, bool(is_dir)) for name, is_dir in old.get("entries", [])]
+            reused = True
+        else:
+            entries = _list_dir(directory)
+            reused = False
+        with self._lock:
+            self.stats["dirs_reused" if reused else "dirs_scanned"] += 1
+            self._dirs[rel] = {"dir": rel, "mtime_ns": mtime_ns, "entries": entries}
+        return entries
+
+    def saw(self, path: Path) -> None:
+        rel = self._rel(path)
+        with self._lock:
+            old = self._old_files.get(rel)
+            if old is None:
+                self.stats["new"] += 1
+            self._files.setdefault(rel, dict(old) if old is not None else {"path": rel})
+
+    def _walked(self, directory: Path, entries: Iterable) -> Set[Tuple[str, bool]]:
+        """The entries of a listing that matter to the walk: subfolders (not skipped) and images."""
+        walked = set()
+        for name, is_dir in entries:
+            if is_dir:
+                if os.path.abspath(directory / name) not in self.skip:
+                    walked.add((name, True))
+            elif os.path.splitext(name)[1].lower() in self.exts:
+                walked.add((name, False))
+        return walked
+
+    def _settle_dirs(self) -> None:
+        """
+        Re-list folders whose mtime changed during the run; if only names the walk ignores
+        changed (the batch's own journal, combined file, temp folders), keep the new mtime.
+        """
+        with self._lock:
+            dirs = list(self._dirs.items())
+        for rel, rec in dirs:
+            directory = self.root / rel if rel else self.root
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+                if mtime_ns == rec["mtime_ns"]:
+                    continue
+                entries = _list_dir(directory)
+            except OSError:
+                continue
+            if self._walked(directory, entries) == self._walked(directory, rec["entries"]):
+                with self._lock:
+                    self._dirs[rel] = {"dir": rel, "mtime_ns": mtime_ns, "entries": entries}
+
+    # --- content ------------------------------------------------------------
+
+    def digest(self, path: Path) -> str:
+        """SHA-256 of an image; the recorded one is reused while size and mtime match."""
+        rel = self._rel(path)
+        st = path.stat()
+        with self._lock:
+            rec = self._files.get(rel) or {"path": rel}
+            if rec.get("sha256") and rec.get("size") == st.st_size and rec.get("mtime_ns") == st.st_mtime_ns:
+                return rec["sha256"]
+            changed = rel in self._old_files and "sha256" in rec
+        digest = hash_file(path)
+        with self._lock:
+            self.stats["hashed"] += 1
+            if changed:
+                self.stats["changed"] += 1
+            self._files[rel] = {"path": rel, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+        return digest
+
+    # --- snapshot -----------------------------------------------------------
+
+    def removed(self) -> int:
+        with self._lock:
+            return sum(1 for rel in self._old_files if rel not in self._files)
+
+    def save(self) -> None:
+        """
+        Write the snapshot of this walk (atomically); skipped if the walk did not finish.
+        Call it after the batch has written its own files into the tree.
+        """
+        if not self.walk_complete:
+            return
+        self._settle_dirs()
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with self._lock:
+            dirs, files = list(self._dirs.values()), list(self._files.values())
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp.open("w", encoding="utf-8") as f:
+                f.write(json.dumps({"version": MANIFEST_VERSION, "root": str(self.root),
+                                    "saved": round(time.time(), 3)}) + "\n")
+                for rec in dirs:
+                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                for rec in files:
+                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def summary(self) -> str:
+        s = self.stats
+        if not self._old_dirs:
+            return (f"new snapshot: {len(self._files)} image(s) in {s['dirs_scanned']} folder(s), "
+                    f"{s['hashed']} hashed")
+        text = (f"{s['dirs_reused']} of {s['dirs_reused'] + s['dirs_scanned']} folder(s) unchanged since the "
+                f"last snapshot; {s['new']} new image(s)")
+        if self.walk_complete:
+            text += f", {self.removed()} removed"
+        return text + f", {s['changed']} changed, {s['hashed']} hashed"
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Live batch metrics in the Prometheus text exposition format.
+
+Long batches used to report progress only in the final summary. BatchMetrics keeps
+thread-safe counters, gauges and histograms while the batch runs and exposes them either
+- over HTTP on a local port (`/metrics`, for Prometheus to scrape), or
+- as a textfile rewritten every few seconds (for node_exporter's textfile collector),
+so throughput can be graphed and alerted on while the job is still running.
+
+No third-party client library is needed; the exposition format is plain text.
+
+批处理实时指标（Prometheus 文本格式）：通过本地 HTTP 端口（/metrics）或定期写入的
+文本文件（node_exporter textfile collector）提供，可在任务运行期间监控吞吐量并设置告警。
+"""
+from __future__ import annotations
+
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 15.0, 20.0, 30.0, 60.0, 120.0)
+
+
+def _num(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for k, v in sorted(labels.items()):
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class BatchMetrics:
+    """
+    Thread-safe registry of the batch's counters, gauges and histograms.
+
+    Usage:
+        metrics = BatchMetrics()
+        metrics.inc("images_done_total", source="ocr")
+        metrics.observe("ocr_latency_seconds", 4.2)
+        metrics.gauge_fn("queue_depth", "Images waiting for a worker", work_queue.qsize)
+        text = metrics.render()
+    """
+
+    def __init__(self, prefix: str = "tibetan_ocr") -> None:
+        self.prefix = prefix
+        self._lock = Lock()
+        self._meta: Dict[str, Tuple[str, str]] = {}          # name -> (type, help)
+        self._values: Dict[str, Dict[Tuple, float]] = {}     # counters and set gauges
+        self._gauge_fns: Dict[str, Callable[[], float]] = {}
+        self._buckets: Dict[str, Sequence[float]] = {}
+        self._hist: Dict[str, List[float]] = {}              # per-bucket counts + [sum, count]
+
+        self.counter("images_done_total", "Images with OCR text, by source (ocr, cache)")
+        self.counter("images_skipped_total", "Images skipped, by reason (journal, existing, blank)")
+        self.counter("images_failed_total", "Images that failed, by error class")
+        self.counter("rate_limit_events_total", "Rate-limit responses (請求過多) seen by any worker")
+        self.counter("ocr_attempts_total", "OCR attempts (including retries), by outcome")
+        self.counter("ocr_retries_total", "OCR retries, by error class")
+        self.counter("upload_bytes_total", "Bytes of image data uploaded to the OCR page")
+        self.gauge("in_flight", "OCR requests currently in flight")
+        self.gauge("images_total", "Images in this batch")
+        self.gauge("start_time_seconds", "Unix time the batch started")
+        self.histogram("ocr_latency_seconds", "Latency of successful OCR attempts", LATENCY_BUCKETS)
+        self.set("start_time_seconds", time.time())
+
+    # --- declaration ------------------------------------------------------
+
+    def counter(self, name: str, help_text: str) -> None:
+        self._meta[name] = ("counter", help_text)
+        self._values.setdefault(name, {})
+
+    def gauge(self, name: str, help_text: str) -> None:
+        self._meta[name] = ("gauge", help_text)
+        self._values.setdefault(name, {})
+
+    def gauge_fn(self, name: str, help_text: str, fn: Callable[[], float]) -> None:
+        """Gauge whose value is read from `fn` at render time (e.g. a queue size)."""
+        self._meta[name] = ("gauge", help_text)
+        self._gauge_fns[name] = fn
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float]) -> None:
+        self._meta[name] = ("histogram", help_text)
+        self._buckets[name] = tuple(sorted(buckets))
+        self._hist[name] = [0.0] * (len(buckets) + 3)  # buckets, +Inf only, sum, count
+
+    # --- updates ----------------------------------------------------------
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[name][tuple(sorted(labels.items()))] = float(value)
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            counts = self._hist[name]
+            for i, bound in enumerate(self._buckets[name]):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self._buckets[name])] += 1  # +Inf only
+            counts[-2] += value
+            counts[-1] += 1
+
+    def value(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._values[name].get(tuple(sorted(labels.items())), 0.0)
+
+    # --- exposition -------------------------------------------------------
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            values = {name: dict(series) for name, series in self._values.items()}
+            hist = {name: list(counts) for name, counts in self._hist.items()}
+        for name, (kind, help_text) in self._meta.items():
+            full = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            if kind == "histogram":
+                counts = hist[name]
+                cumulative = 0.0
+                for i, bound in enumerate(self._buckets[name]):
+                    cumulative += counts[i]
+                    lines.append(f'{full}_bucket{{le="{bound:g}"}} {_num(cumulative)}')
+                cumulative += counts[len(self._buckets[name])]
+                lines.append(f'{full}_bucket{{le="+Inf"}} {_num(cumulative)}')
+                lines.append(f"{full}_sum {_num(counts[-2])}")
+                lines.append(f"{full}_count {_num(counts[-1])}")
+            elif name in self._gauge_fns:
+                try:
+                    lines.append(f"{full} {_num(self._gauge_fns[name]())}")
+                except Exception:
+                    pass
+            else:
+                series = values.get(name) or ({(): 0.0} if kind == "gauge" else {})
+                for key, v in sorted(series.items()):
+                    lines.append(f"{full}{_labels(dict(key))} {_num(v)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serve `metrics.render()` at http://host:port/metrics from a daemon thread."""
+
+    def __init__(self, metrics: BatchMetrics, port: int, host: str = "127.0.0.1") -> None:
+        self.metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = Thread(target=self._httpd.serve_forever, name="ocr-metrics", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> "MetricsServer":
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class MetricsTextfile:
+    """Rewrite `path` with the current metrics every `interval_s` seconds (atomic replace)."""
+
+    def __init__(self, metrics: BatchMetrics, path: Path, interval_s: float = 15.0) -> None:
+        self.metrics = metrics
+        self.path = path
+        self.interval_s = max(1.0, interval_s)
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="ocr-metrics-textfile", daemon=True)
+
+    def start(self) -> "MetricsTextfile":
+        self.write()
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.write()
+
+    def write(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+            tmp.write_text(self.metrics.render(), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.write()  # final values
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Network interception for the OCR browser pages: block what OCR doesn't need, cache the rest.
+
+Every navigation to the OCR page downloads the site's analytics, images, fonts and
+JS/CSS bundles again, and fresh browser contexts start with an empty HTTP cache.
+NetworkPolicy is installed as a `context.route("**/*")` handler and
+- aborts analytics/tracking requests and (optionally) images, fonts and media,
+- serves GET scripts/stylesheets from an on-disk cache shared by all workers and runs
+  (honouring Cache-Control: no-store and a TTL),
+- counts blocked requests, cache hits and the bytes/time saved per page load.
+
+网络拦截：屏蔽统计/跟踪请求及不必要的图片、字体，并将 JS/CSS 静态资源缓存到磁盘
+（所有工作线程和多次运行共享），统计每次页面加载节省的流量和时间。
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_STATIC_CACHE_DIR = Path.home() / ".tibetan_ocr" / "static_cache"
+
+# Analytics / tracking hosts and paths (matched against the full URL)
+TRACKING_PATTERN = re.compile(
+    r"google-analytics\.com|googletagmanager\.com|doubleclick\.net|googlesyndication\.com"
+    r"|facebook\.net|connect\.facebook|hotjar\.com|segment\.(io|com)|mixpanel\.com|plausible\.io"
+    r"|clarity\.ms|cloudflareinsights\.com|sentry\.io|umami\.|posthog\.com|/gtag/|/analytics(\.js)?\b",
+    re.IGNORECASE,
+)
+NON_ESSENTIAL_TYPES = ("image", "font", "media")
+STATIC_TYPES = ("script", "stylesheet")
+
+
+class NetworkPolicy:
+    """
+    Thread-safe request policy plus on-disk static asset cache.
+
+    Usage:
+        policy = NetworkPolicy(block_assets=True, cache_dir=DEFAULT_STATIC_CACHE_DIR)
+        install_routes(context, policy)         # sync Playwright
+        await install_routes_async(context, policy)   # async Playwright
+        print(policy.summary())
+    """
+
+    def __init__(self, block_assets: bool = True, cache_dir: Optional[Path] = None,
+                 ttl_s: float = 24 * 3600, block_types: Iterable[str] = NON_ESSENTIAL_TYPES) -> None:
+        self.block_assets = block_assets
+        self.cache_dir = cache_dir
+        self.ttl_s = ttl_s
+        self.block_types = set(block_types) if block_assets else set()
+        self._lock = Lock()
+        self.stats: Dict[str, float] = {
+            "page_loads": 0, "blocked_tracking": 0, "blocked_assets": 0,
+            "cache_hits": 0, "cache_misses": 0, "bytes_from_cache": 0, "ms_saved": 0.0,
+        }
+        if cache_dir is not None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # --- decisions ----------------------------------------------------------
+
+    def block_reason(self, url: str, resource_type: str) -> Optional[str]:
+        """"tracking" / "asset" if the request should be aborted, else None."""
+        if TRACKING_PATTERN.search(url):
+            return "tracking"
+        if resource_type in self.block_types and not url.startswith(("data:", "blob:")):
+            return "asset"
+        return None
+
+    def cacheable(self, method: str, resource_type: str) -> bool:
+        return self.cache_dir is not None and method == "GET" and resource_type in STATIC_TYPES
+
+    # --- disk cache ---------------------------------------------------------
+
+    def _paths(self, url: str) -> Tuple[Path, Path]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.body", self.cache_dir / f"{key}.json"
+
+    def lookup(self, url: str) -> Optional[Tuple[Dict[str, str], bytes, float]]:
+        """(headers, body, original fetch ms) for a fresh cached copy of url, or None."""
+        body_path, meta_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if time.time() - meta.get("stored", 0) > self.ttl_s or meta.get("url") != url:
+                return None
+            return meta.get("headers", {}), body_path.read_bytes(), float(meta.get("fetch_ms", 0.0))
+        except (OSError, ValueError):
+            return None
+
+    def store(self, url: str, status: int, headers: Dict[str, str], body: bytes, fetch_ms: float) -> None:
+        """Cache a successful static response unless the server forbids it."""
+        cache_control = (headers.get("cache-control") or "").lower()
+        if status != 200 or "no-store" in cache_control or "private" in cache_control:
+            return
+        keep = {k: v for k, v in headers.items() if k.lower() in ("content-type", "cache-control", "etag")}
+        body_path, meta_path = self._paths(url)
+        meta = {"url": url, "stored": time.time(), "fetch_ms": round(fetch_ms, 1),
+                "size": len(body), "headers": keep}
+        try:
+            suffix = f".{os.getpid()}.tmp"
+            tmp_body = body_path.with_name(body_path.name + suffix)
+            tmp_meta = meta_path.with_name(meta_path.name + suffix)
+            tmp_body.write_bytes(body)
+            tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp_body, body_path)
+            os.replace(tmp_meta, meta_path)  # meta last: a readable meta implies a complete body
+        except OSError:
+            pass
+
+    # --- accounting ---------------------------------------------------------
+
+    def count(self, key: str, value: float = 1) -> None:
+        with self._lock:
+            self.stats[key] += value
+
+    def summary(self) -> str:
+        with self._lock:
+            s = dict(self.stats)
+        loads = max(1, int(s["page_loads"]))
+        mb = s["bytes_from_cache"] / 1e6
+        return (f"{int(s['page_loads'])} page load(s), {int(s['blocked_tracking'])} tracking + "
+                f"{int(s['blocked_assets'])} asset request(s) blocked, {int(s['cache_hits'])} static cache hit(s) "
+                f"({mb:.1f} MB, ~{s['ms_saved'] / 1000:.1f}s); per page load: "
+                f"{(s['blocked_tracking'] + s['blocked_assets']) / loads:.1f} blocked, "
+                f"{s['bytes_from_cache'] / loads / 1024:.0f} KB and {s['ms_saved'] / loads:.0f} ms saved")
+
+
+def install_routes(context, policy: NetworkPolicy) -> None:
+    """Install the policy on a sync Playwright BrowserContext (or Page)."""
+
+    def handle(route) -> None:
+        req = route.request
+        try:
+            if req.is_navigation_request():
+                policy.count("page_loads")
+            reason = policy.block_reason(req.url, req.resource_type)
+            if reason is not None:
+                policy.count("blocked_tracking" if reason == "tracking" else "blocked_assets")
+                route.abort()
+                return
+            if policy.cacheable(req.method, req.resource_type):
+                hit = policy.lookup(req.url)
+                if hit is not None:
+                    headers, body, fetch_ms = hit
+                    policy.count("cache_hits")
+                    policy.count("bytes_from_cache", len(body))
+                    policy.count("ms_saved", fetch_ms)
+                    route.fulfill(status=200, headers=headers, body=body)
+                    return
+                started = time.perf_counter()
+                response = route.fetch()
+                body = response.body()
+                policy.count("cache_misses")
+                policy.store(req.url, response.status, response.headers, body,
+                             (time.perf_counter() - started) * 1000.0)
+                route.fulfill(response=response, body=body)
+                return
+            route.continue_()
+        except Exception:
+            # Never let the policy break the page: fall back to the normal request
+            try:
+                route.continue_()
+            except Exception:
+                pass
+
+    context.route("**/*", handle)
+
+
+async def install_routes_async(context, policy: NetworkPolicy) -> None:
+    """Install the policy on an async Playwright BrowserContext (or Page)."""
+
+    async def handle(route) -> None:
+        req = route.request
+        try:
+            if req.is_navigation_request():
+                policy.count("page_loads")
+            reason = policy.block_reason(req.url, req.resource_type)
+            if reason is not None:
+                policy.count("blocked_tracking" if reason == "tracking" else "blocked_assets")
+                await route.abort()
+                return
+            if policy.cacheable(req.method, req.resource_type):
+                hit = policy.lookup(req.url)
+                if hit is not None:
+                    headers, body, fetch_ms = hit
+                    policy.count("cache_hits")
+                    policy.count("bytes_from_cache", len(body))
+                    policy.count("ms_saved", fetch_ms)
+                    await route.fulfill(status=200, headers=headers, body=body)
+                    return
+                started = time.perf_counter()
+                response = await route.fetch()
+                body = await response.body()
+                policy.count("cache_misses")
+                policy.store(req.url, response.status, response.headers, body,
+                             (time.perf_counter() - started) * 1000.0)
+                await route.fulfill(response=response, body=body)
+                return
+            await route.continue_()
+        except Exception:
+            try:
+                await route.continue_()
+            except Exception:
+                pass
+
+    await context.route("**/*", handle)
+
+
+def add_network_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add --block-assets / --static-cache options to a CLI parser."""
+    parser.add_argument("--block-assets", action="store_true",
+                        help="Abort analytics/tracking requests and images, fonts and media on the OCR page")
+    parser.add_argument("--static-cache", action="store_true",
+                        help="Serve the OCR page's JS/CSS from an on-disk cache shared across workers and runs")
+    parser.add_argument("--static-cache-dir", type=Path, default=DEFAULT_STATIC_CACHE_DIR,
+                        help=f"Directory for --static-cache (default: {DEFAULT_STATIC_CACHE_DIR})")
+    parser.add_argument("--static-cache-ttl-hours", type=float, default=24.0,
+                        help="Re-download cached JS/CSS older than this (default: 24)")
+
+
+def network_policy_from_args(args: argparse.Namespace) -> Optional[NetworkPolicy]:
+    """NetworkPolicy for the parsed options, or None when interception is off."""
+    if not args.block_assets and not args.static_cache:
+        return None
+    return NetworkPolicy(
+        block_assets=args.block_assets,
+        cache_dir=args.static_cache_dir if args.static_cache else None,
+        ttl_s=args.static_cache_ttl_hours * 3600,
+    )
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Streaming writer (and reader) for the combined `<folder>_all_ocr.txt` file.
+
+Sections are appended in input order as images finish. Results that finish early
+(out of order, e.g. with several workers) wait in a small reorder buffer until the
+images before them are done. The buffer is bounded: with max_pending results waiting,
+add() blocks until the missing image arrives (backpressure on the workers), so a page
+stuck in a long timeout cannot make every later result pile up in memory. While the
+batch runs, sections go to `<combined>.partial` and are flushed and fsync'd
+periodically, so a crash still leaves a valid partial file. finish() writes the final file: the header with the
+final counts, followed by the streamed sections (copied, never held in memory).
+iter_sections() reads such a file back section by section, also with bounded memory.
+
+合并输出文件的流式写入器：按输入顺序逐个追加结果，定期刷新到磁盘，
+崩溃后仍保留有效的部分结果文件（.partial）。
+"""
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Condition, Lock
+from typing import Dict, Iterator, List, Optional
+
+# Import from same directory
+THIS_FILE = Path(__file__).resolve()
+SCRIPTS_DIR = THIS_FILE.parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from ocr_blank_pages import BLANK_MARKER  # type: ignore
+from ocr_documents import Entry, PageRef, entry_path  # type: ignore
+
+NOT_COMPLETED_MARKER = "[OCR not completed / OCR 未完成]"
+FAILED_MARKER = "[OCR Failed / OCR 失败]"
+
+SECTION_RULE = "=" * 80
+BODY_RULE = "-" * 80
+SOURCE_PREFIX = "Source / 来源: "
+FULL_PATH_PREFIX = "Full Path / 完整路径: "
+PAGE_SUFFIX = re.compile(r" \(page (\d+)/(\d+) / 第 \d+ 页\)$")
+# Header counts: "Total Images / 总图片数: 340" -> "total"
+HEADER_COUNTS = {
+    "Total Images / 总图片数: ": "total",
+    "Processed / 已处理: ": "processed",
+    "Skipped / 已跳过: ": "skipped",
+    "Failed / 失败: ": "failed",
+}
+MAX_ERROR_CHARS = 4000  # longer error messages (e.g. Playwright call logs) are cut when read back
+
+
+def header_lines(image_folder: Path, total: int, processed: Optional[int] = None,
+                 skipped: Optional[int] = None, failed: Optional[int] = None) -> List[str]:
+    lines = [
+        "=" * 80,
+        f"Combined OCR Results / 合并 OCR 结果",
+        f"Source Folder / 源文件夹: {image_folder}",
+    ]
+    if processed is None:
+        # The total is not known yet while images are still being discovered
+        lines.append("Status / 状态: in progress (partial file) / 进行中（部分结果）")
+    else:
+        lines.append(f"Total Images / 总图片数: {total}")
+        lines.append(f"Processed / 已处理: {processed}")
+        lines.append(f"Skipped / 已跳过: {skipped}")
+        lines.append(f"Failed / 失败: {failed}")
+    lines.append("=" * 80)
+    lines.append("")
+    return lines
+
+
+def section_lines(entry: Entry, image_folder: Path, content: Optional[str]) -> List[str]:
+    img_path = entry_path(entry)
+    source = str(img_path.relative_to(image_folder))
+    if isinstance(entry, PageRef):
+        source += f" (page {entry.page}/{entry.pages} / 第 {entry.page} 页)"
+    return [
+        "=" * 80,
+        f"Source / 来源: {source}",
+        f"Full Path / 完整路径: {img_path}",
+        "-" * 80,
+        content if content else NOT_COMPLETED_MARKER,
+        "",
+    ]
+
+
+@dataclass
+class Section:
+    """
+    One image section read back from a combined file. `status` is ok / failed / blank /
+    not_completed; only the error of failed sections is kept, never the OCR text.
+    """
+    source: str
+    full_path: str = ""
+    status: str = "ok"
+    error: Optional[str] = None
+    chars: int = 0
+
+    @property
+    def key(self) -> str:
+        """Journal key of the image (relative path, "#page<n>" for a page), as used by --only / --resume."""
+        source = self.source
+        m = PAGE_SUFFIX.search(source)
+        page = m.group(1) if m else None
+        if m:
+            source = source[:m.start()]
+        key = source.replace("\\", "/")
+        return f"{key}#page{page}" if page else key
+
+
+@dataclass
+class CombinedHeader:
+    """Header of a combined file; `counts` stays empty for a partial (in-progress) file."""
+    source_folder: str = ""
+    counts: Dict[str, int] = field(default_factory=dict)
+
+
+def iter_sections(path: Path, header: Optional[CombinedHeader] = None) -> Iterator[Section]:
+    """
+    Stream the sections of a combined file line by line (memory bounded by one error message,
+    not by the file size). Header fields are filled into `header` if one is passed.
+    """
+    current: Optional[Section] = None
+    in_body = False
+    first_body_line = True
+    after_rule = False
+    error_lines: List[str] = []
+
+    def finish(section: Section) -> Section:
+        if section.status == "failed":
+            error = "\n".join(error_lines).strip()
+            section.error = error[:MAX_ERROR_CHARS]
+        return section
+
+    with path.open("r", encoding="utf-8", errors="ignore") as f:
+        for raw in f:
+            line = raw.rstrip("\r\n")
+            if after_rule:
+                after_rule = False
+                if line.startswith(SOURCE_PREFIX):
+                    if current is not None:
+                        yield finish(current)
+                    current = Section(source=line[len(SOURCE_PREFIX):])
+                    in_body, first_body_line, error_lines = False, True, []
+                    continue
+                if current is not None and in_body:
+                    # A rule line inside OCR text, not a section start
+                    current.chars += len(SECTION_RULE)
+            if line == SECTION_RULE:
+                after_rule = True
+                continue
+            if current is None:
+                if header is not None:
+                    if line.startswith("Source Folder / 源文件夹: "):
+                        header.source_folder = line.split(": ", 1)[1]
+                    for prefix, name in HEADER_COUNTS.items():
+                        if line.startswith(prefix):
+                            try:
+                                header.counts[name] = int(line[len(prefix):])
+                            except ValueError:
+                                pass
+                continue
+            if not in_body:
+                if line.startswith(FULL_PATH_PREFIX):
+                    current.full_path = line[len(FULL_PATH_PREFIX):]
+                elif line == BODY_RULE:
+                    in_body = True
+                continue
+            if first_body_line:
+                first_body_line = False
+                if line.startswith(FAILED_MARKER):
+                    current.status = "failed"
+                    error_lines.append(line[len(FAILED_MARKER):].strip())
+                    continue
+                if line.startswith(NOT_COMPLETED_MARKER):
+                    current.status = "not_completed"
+                elif line.startswith(BLANK_MARKER):
+                    current.status = "blank"
+            if current.status == "failed":
+                if sum(len(e) for e in error_lines) < MAX_ERROR_CHARS:
+                    error_lines.append(line)
+            else:
+                current.chars += len(line)
+    if current is not None:
+        yield finish(current)
+
+
+class CombinedWriter:
+    """
+    Thread-safe, order-preserving, incremental writer for the combined TXT file.
+
+    `images` may keep growing while the batch runs (streamed discovery); an image must be
+    appended before its result is added. Entries are image paths or pages of multi-page
+    files (ocr_documents.PageRef), each with its own section.
+
+    Usage:
+        writer = CombinedWriter(combined_path, image_folder, images)
+        writer.add(i, content)      # i = 1-based index into images, from any thread
+        writer.finish(processed, skipped, failed)
+
+    add() blocks while `max_pending` later results are already buffered; the image they
+    wait for is always being processed by another worker, so this cannot deadlock as long
+    as every index is eventually added (the first add() of an index wins).
+    """
+
+    def __init__(self, path: Path, image_folder: Path, images: List[Entry],
+                 fsync_every: int = 50, fsync_interval_s: float = 30.0, max_pending: int = 256) -> None:
+        self.path = path
+        self.partial_path = path.with_name(path.name + ".partial")
+        self.image_folder = image_folder
+        self.images = images
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval_s = fsync_interval_s
+        self.max_pending = max(1, max_pending)
+        self._lock = Lock()
+        self._room = Condition(self._lock)
+        self._pending: Dict[int, Optional[str]] = {}
+        self._next = 1
+        self._since_sync = 0
+        self._last_sync = time.monotonic()
+        self._f = self.partial_path.open("w", encoding="utf-8")
+        self._f.write("\n".join(header_lines(image_folder, len(images))) + "\n")
+        self._body_offset = self._f.tell()
+        self._sync()
+
+    @property
+    def buffered(self) -> int:
+        """Number of finished results waiting for an earlier image (reorder buffer size)."""
+        with self._lock:
+            return len(self._pending)
+
+    def add(self, index: int, content: Optional[str]) -> None:
+        """
+        Record the result for images[index - 1]; writes every section that is now in order.
+        Blocks while the reorder buffer is full and this is not the next image in order.
+        """
+        with self._lock:
+            while index != self._next and len(self._pending) >= self.max_pending:
+                self._room.wait()
+            if index < self._next or index in self._pending:
+                return  # already recorded
+            self._pending[index] = content.strip() if content else None
+            self._drain()
+
+    def _drain(self) -> None:
+        wrote = False
+        while self._next in self._pending:
+            content = self._pending.pop(self._next)
+            self._write_section(self._next, content)
+            self._next += 1
+            wrote = True
+        if wrote:
+            self._room.notify_all()
+            self._f.flush()
+            if self._since_sync >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval_s:
+                self._sync()
+
+    def _write_section(self, index: int, content: Optional[str]) -> None:
+        self._f.write("\n".join(section_lines(self.images[index - 1], self.image_folder, content)) + "\n")
+        self._since_sync += 1
+
+    def _sync(self) -> None:
+        self._f.flush()
+        try:
+            os.fsync(self._f.fileno())
+        except OSError:
+            pass
+        self._since_sync = 0
+        self._last_sync = time.monotonic()
+
+    def finish(self, processed: int, skipped: int, failed: int) -> Path:
+        """
+        Write any remaining sections (images never reported are marked "not completed"),
+        then produce the final combined file with the real counts and remove the partial file.
+        """
+        with self._lock:
+            while self._next <= len(self.images):
+                self._write_section(self._next, self._pending.pop(self._next, None))
+                self._next += 1
+            self._sync()
+            self._f.close()
+
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with tmp_path.open("w", encoding="utf-8") as out, \
+                    self.partial_path.open("r", encoding="utf-8") as body:
+                out.write("\n".join(header_lines(self.image_folder, len(self.images),
+                                                 processed, skipped, failed)) + "\n")
+                body.seek(self._body_offset)
+                shutil.copyfileobj(body, out, 1024 * 1024)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, self.path)
+            self.partial_path.unlink()
+        return self.path
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Adaptive (AIMD) concurrency governor shared by all OCR workers.
+
+Instead of every worker retrying rate-limit errors on its own schedule, all OCR
+attempts pass through one governor that caps how many requests are in flight:
+
+- Additive increase: while requests succeed, latency stays close to the best seen and
+  the error rate is low, the limit grows by about one slot per "round" of requests.
+- Multiplicative decrease: on a rate-limit response (請求過多) the limit is cut
+  (halved by default) and every worker pauses for a shared cooldown, so they back off
+  together once instead of hammering the site and backing off in lockstep.
+
+HedgePolicy decides when a slow OCR attempt gets a second, speculative attempt (after a
+percentile of recent latencies) and caps how many of those extra requests are sent.
+
+自适应（AIMD）并发控制器：请求健康时逐步增加并发，遇到速率限制时大幅降低并发，
+并让所有工作线程统一等待冷却时间。HedgePolicy 决定慢请求何时发起第二次（对冲）请求，
+并限制额外请求的数量。
+"""
+from __future__ import annotations
+
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from threading import Condition, Lock
+from typing import Deque, Dict, Optional
+
+# Import from same directory
+THIS_FILE = Path(__file__).resolve()
+SCRIPTS_DIR = THIS_FILE.parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from ocr_trace import percentile  # type: ignore
+
+OK = "ok"
+ERROR = "error"
+RATE_LIMITED = "rate_limited"
+
+
+class AimdController:
+    """
+    Thread-safe AIMD limiter on in-flight OCR requests.
+
+    Usage:
+        governor = AimdController(max_limit=8)
+        governor.acquire()
+        try:
+            text = run_ocr(...)
+            outcome = OK
+        except RateLimitError:
+            outcome = RATE_LIMITED
+        finally:
+            governor.release(latency_s, outcome)
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        initial: int = 1,
+        min_limit: int = 1,
+        backoff_factor: float = 0.5,
+        cooldown_s: float = 5.0,
+        latency_slack: float = 2.0,
+        max_error_rate: float = 0.2,
+    ) -> None:
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.backoff_factor = backoff_factor
+        self.cooldown_s = cooldown_s
+        self.latency_slack = latency_slack
+        self.max_error_rate = max_error_rate
+        self._cond = Condition()
+        self._limit = float(max(self.min_limit, min(initial, self.max_limit)))
+        self._in_flight = 0
+        self._cooldown_until = 0.0
+        self._latency_ewma: Optional[float] = None
+        self._latency_floor: Optional[float] = None
+        self._error_ewma = 0.0
+        self.successes = 0
+        self.errors = 0
+        self.rate_limits = 0
+        self.peak_limit = int(self._limit)
+
+    @property
+    def limit(self) -> int:
+        """Current number of requests allowed in flight."""
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> None:
+        """Block until a slot is free and no shared cooldown is active."""
+        with self._cond:
+            while True:
+                wait = self._cooldown_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                if self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                self._cond.wait()
+
+    def release(self, latency_s: Optional[float] = None, outcome: str = OK) -> None:
+        """Return a slot and feed the outcome of the request into the controller."""
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            now = time.monotonic()
+            if outcome == OK:
+                self.successes += 1
+                self._error_ewma *= 0.9
+                if latency_s is not None:
+                    self._observe_latency(latency_s)
+                if self._healthy(latency_s):
+                    # +1 slot per full round of successful requests
+                    self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+                    self.peak_limit = max(self.peak_limit, self.limit)
+            elif outcome == RATE_LIMITED:
+                self.rate_limits += 1
+                # Requests already in flight when the limit was hit report it too; only cut once per cooldown
+                if now >= self._cooldown_until:
+                    self._limit = max(float(self.min_limit), self._limit * self.backoff_factor)
+                    self._cooldown_until = now + self.cooldown_s
+            else:
+                self.errors += 1
+                self._error_ewma = 0.9 * self._error_ewma + 0.1
+            self._cond.notify_all()
+
+    def _observe_latency(self, latency_s: float) -> None:
+        if self._latency_ewma is None:
+            self._latency_ewma = latency_s
+        else:
+            self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * latency_s
+        if self._latency_floor is None or self._latency_ewma < self._latency_floor:
+            self._latency_floor = self._latency_ewma
+
+    def _healthy(self, latency_s: Optional[float]) -> bool:
+        if self._error_ewma > self.max_error_rate:
+            return False
+        if latency_s is None or self._latency_floor is None:
+            return True
+        return self._latency_ewma <= self._latency_floor * self.latency_slack
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "peak_limit": self.peak_limit,
+                "in_flight": self._in_flight,
+                "successes": self.successes,
+                "errors": self.errors,
+                "rate_limits": self.rate_limits,
+                "latency_ewma_s": round(self._latency_ewma or 0.0, 3),
+                "error_rate": round(self._error_ewma, 3),
+            }
+
+
+class HedgePolicy:
+    """
+    Thread-safe policy for hedged (speculative) OCR attempts.
+
+    An attempt that has not finished after the `percentile` of recent successful
+    latencies (never earlier than min_delay_s, and only once min_samples are known)
+    may start a second attempt; whichever finishes first wins. The extra load is capped:
+    - budget: every first attempt earns `budget` tokens (0.05 = at most ~5% extra
+      requests), up to `burst`; a hedge spends one token,
+    - at most max_concurrent hedges in flight,
+    - no hedges for cooldown_s after any rate-limit response (請求過多).
+
+    Usage:
+        hedge = HedgePolicy(percentile=95, budget=0.05)
+        delay = hedge.delay()                # None: don't hedge yet
+        ... first attempt not done after `delay` seconds ...
+        if hedge.try_start():
+            ... run the second attempt, keep the first result ...
+            hedge.finish(won=True)
+        hedge.observe(latency_s)             # after every successful attempt
+    """
+
+    def __init__(self, percentile: float = 95.0, budget: float = 0.05, min_delay_s: float = 2.0,
+                 min_samples: int = 10, window: int = 200, burst: float = 2.0,
+                 max_concurrent: int = 2, cooldown_s: float = 30.0) -> None:
+        self.percentile = percentile
+        self.budget = budget
+        self.min_delay_s = min_delay_s
+        self.min_samples = min_samples
+        self.burst = burst
+        self.max_concurrent = max(1, max_concurrent)
+        self.cooldown_s = cooldown_s
+        self._lock = Lock()
+        self._latencies: Deque[float] = deque(maxlen=max(min_samples, window))
+        self._tokens = 1.0
+        self._in_flight = 0
+        self._cooldown_until = 0.0
+        self.attempts = 0
+        self.hedged = 0
+        self.won = 0
+        self.denied = 0
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging a new attempt (None = not enough history). Earns budget."""
+        with self._lock:
+            self.attempts += 1
+            self._tokens = min(self.burst, self._tokens + self.budget)
+            if len(self._latencies) < self.min_samples:
+                return None
+            return max(self.min_delay_s, percentile(list(self._latencies), self.percentile))
+
+    def observe(self, latency_s: float) -> None:
+        with self._lock:
+            self._latencies.append(latency_s)
+
+    def try_start(self) -> bool:
+        """Reserve a hedge if budget, concurrency and rate-limit cooldown allow it."""
+        with self._lock:
+            if (self._tokens < 1.0 or self._in_flight >= self.max_concurrent
+                    or time.monotonic() < self._cooldown_until):
+                self.denied += 1
+                return False
+            self._tokens -= 1.0
+            self._in_flight += 1
+            self.hedged += 1
+            return True
+
+    def finish(self, won: bool) -> None:
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            if won:
+                self.won += 1
+
+    def note_rate_limit(self) -> None:
+        with self._lock:
+            self._cooldown_until = time.monotonic() + self.cooldown_s
+
+    def summary(self) -> str:
+        with self._lock:
+            share = 100.0 * self.hedged / self.attempts if self.attempts else 0.0
+            return (f"Hedging: {self.hedged} of {self.attempts} attempt(s) hedged ({share:.1f}%), "
+                    f"{self.won} won by the hedge, {self.denied} denied by budget/cooldown")
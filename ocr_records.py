@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Structured per-image results: JSONL records and an optional columnar (Parquet) copy.
+
+The combined `_all_ocr.txt` is meant for reading; tools that analyse a batch (failure
+diagnostics, corpus building) would have to regex-scan it. With --records every image
+(or page of a multi-page file) gets one JSON line as soon as it finishes:
+
+    {"image": "vol1/p001.tif", "path": "vol1/p001.tif", "page": null,
+     "sha256": "9f2c...", "status": "done", "source": "ocr", "error": null,
+     "error_class": null, "attempts": 2, "backend": "playwright", "chars": 1834,
+     "total_ms": 5234.1, "timings_ms": {"navigate": 812.4, "upload": 95.0, "wait": 4190.2},
+     "ts": 1700000000.0, "text": "..."}
+
+status: done / skipped (result from the journal or an existing .txt) / blank / failed;
+source: ocr / cache / journal / existing. timings_ms sums the ocr_trace spans per stage;
+attempts counts OCR requests including retries.
+
+--records-parquet converts the JSONL into a Parquet file at the end of the run (needs
+pyarrow: pip install pyarrow), in row groups of RECORDS_PER_ROW_GROUP lines, so the text of
+a large batch is never held in memory at once.
+
+结构化结果：每张图片（或多页文件的每一页）一行 JSON 记录（路径、哈希、状态、错误类型、
+文本、各阶段耗时、请求次数），可选转换为 Parquet 列式文件，便于诊断和语料处理。
+"""
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = None
+    pq = None
+
+RECORDS_PER_ROW_GROUP = 10000
+
+# Record status values (done/failed match the journal)
+DONE = "done"
+SKIPPED = "skipped"
+BLANK = "blank"
+FAILED = "failed"
+
+
+@dataclass
+class ImageResult:
+    """Outcome of one image or page, as returned by the batch pipeline and written as a record."""
+    image: str                       # journal key: relative path, "#page<n>" for pages
+    path: str                        # source file, relative to the image folder
+    page: Optional[int] = None       # 1-based page of a multi-page TIFF/PDF
+    status: str = DONE
+    source: Optional[str] = None     # ocr / cache / journal / existing
+    text: Optional[str] = None
+    error: Optional[str] = None
+    error_class: Optional[str] = None
+    attempts: int = 0
+    sha256: Optional[str] = None
+    backend: Optional[str] = None
+    total_ms: Optional[float] = None
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def skipped(self) -> bool:
+        return self.status in (SKIPPED, BLANK)
+
+    def to_record(self) -> dict:
+        rec = asdict(self)
+        text = rec.pop("text")
+        rec["chars"] = len(text) if text else 0
+        rec["ts"] = round(time.time(), 3)
+        rec["text"] = text  # last, so the metadata stays readable in the raw file
+        return rec
+
+
+def stage_timings(spans: List[Dict[str, object]]) -> Dict[str, float]:
+    """Total milliseconds per stage from ocr_trace spans (retries add up)."""
+    timings: Dict[str, float] = {}
+    for sp in spans:
+        stage = str(sp["stage"])
+        timings[stage] = round(timings.get(stage, 0.0) + float(sp["ms"]), 1)
+    return timings
+
+
+def parquet_available() -> bool:
+    return pa is not None
+
+
+class RecordWriter:
+    """
+    Thread-safe JSONL writer of ImageResult records (one line per image, flushed per line).
+
+    Usage:
+        writer = RecordWriter(Path("vol_ocr_records.jsonl"))
+        writer.write(result)
+        writer.close()
+        write_parquet(writer.path, Path("vol_ocr_records.parquet"))   # optional
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.count = 0
+        self._lock = Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = path.open("w", encoding="utf-8")
+
+    def write(self, result: ImageResult) -> None:
+        line = json.dumps(result.to_record(), ensure_ascii=False) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            self.count += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._f.close()
+
+
+def _read_batches(path: Path, size: int) -> Iterator[List[dict]]:
+    batch: List[dict] = []
+    with path.open("r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            try:
+                batch.append(json.loads(line))
+            except ValueError:
+                continue
+            if len(batch) >= size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _schema():
+    return pa.schema([
+        ("image", pa.string()),
+        ("path", pa.string()),
+        ("page", pa.int32()),
+        ("sha256", pa.string()),
+        ("status", pa.string()),
+        ("source", pa.string()),
+        ("error", pa.string()),
+        ("error_class", pa.string()),
+        ("attempts", pa.int32()),
+        ("backend", pa.string()),
+        ("chars", pa.int64()),
+        ("total_ms", pa.float64()),
+        ("timings_ms", pa.map_(pa.string(), pa.float64())),
+        ("ts", pa.float64()),
+        ("text", pa.large_string()),
+    ])
+
+
+def write_parquet(jsonl_path: Path, parquet_path: Path, row_group: int = RECORDS_PER_ROW_GROUP) -> int:
+    """Convert a records JSONL file to Parquet (columnar); returns the number of rows. Needs pyarrow."""
+    if pa is None:
+        raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+    schema = _schema()
+    rows = 0
+    tmp_path = parquet_path.with_name(parquet_path.name + ".tmp")
+    with pq.ParquetWriter(str(tmp_path), schema, compression="zstd") as writer:
+        for batch in _read_batches(jsonl_path, row_group):
+            columns = {name: [rec.get(name) for rec in batch] for name in schema.names}
+            columns["timings_ms"] = [list((rec.get("timings_ms") or {}).items()) for rec in batch]
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            rows += len(batch)
+    tmp_path.replace(parquet_path)
+    return rows
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Learned selector profile for the OCR page heuristics.
+
+The upload/trigger heuristics try up to 16 selectors on the page and every iframe for
+each image, and most of those are failed round-trips to the browser. This profile
+remembers, per page URL and role, which frame and selector worked the first time and
+persists it to a small JSON file, so later images (and later runs) try the learned
+selector first and only fall back to full discovery when it misses.
+
+选择器学习档案：记住每个页面 URL、每种操作首次成功的框架和选择器，保存为 JSON，
+之后的图片先尝试已学到的选择器，失败时才重新完整搜索。
+
+Roles used by the OCR code: "file_input", "filechooser", "start_trigger", "ocr_trigger".
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+DEFAULT_PROFILE_PATH = Path.home() / ".tibetan_ocr" / "selector_profile.json"
+
+
+def page_key(url: str) -> str:
+    """Normalize a page/frame URL for use as a profile key (drop the #fragment)."""
+    return (url or "").split("#", 1)[0]
+
+
+class SelectorProfile:
+    """
+    Thread-safe map of (page URL, role) -> (frame URL, selector), with hit/discovery stats.
+
+    frame URL is "" for the main frame.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path
+        self._lock = Lock()
+        self._entries: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        if path is not None and path.exists():
+            try:
+                self._entries = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                self._entries = {}
+
+    def lookup(self, role: str, page_url: str) -> Optional[Tuple[str, str]]:
+        """Return (frame_url, selector) learned for this page and role, if any."""
+        with self._lock:
+            entry = self._entries.get(page_key(page_url), {}).get(role)
+        if not entry:
+            return None
+        return entry.get("frame", ""), entry["selector"]
+
+    def record_hit(self, role: str) -> None:
+        """The learned selector worked; no discovery was needed."""
+        self._count(role, "learned_hits")
+
+    def record_discovery(self, role: str, page_url: str, frame_url: str, selector: Optional[str]) -> None:
+        """Full discovery ran; remember its winner (if any) and persist the profile."""
+        self._count(role, "discoveries")
+        if not selector:
+            return
+        key = page_key(page_url)
+        entry = {"frame": page_key(frame_url), "selector": selector}
+        with self._lock:
+            if self._entries.get(key, {}).get(role) == entry:
+                return
+            self._entries.setdefault(key, {})[role] = entry
+        self.save()
+
+    def forget(self, role: str, page_url: str) -> None:
+        with self._lock:
+            self._entries.get(page_key(page_url), {}).pop(role, None)
+
+    def _count(self, role: str, field: str) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(role, {"learned_hits": 0, "discoveries": 0})
+            stats[field] += 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {role: dict(s) for role, s in self._stats.items()}
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            data = json.dumps(self._entries, ensure_ascii=False, indent=2)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+            tmp.write_text(data, encoding="utf-8")
+            os.replace(tmp, self.path)
+        except Exception:
+            pass
+
+    def summary(self) -> str:
+        """One line per role: how often the learned selector hit vs. full discovery ran."""
+        lines = []
+        for role, s in sorted(self.stats().items()):
+            total = s["learned_hits"] + s["discoveries"]
+            lines.append(f"{role}: {s['learned_hits']}/{total} learned, {s['discoveries']} discovery run(s)")
+        return "\n".join(lines)
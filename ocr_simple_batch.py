@@ -19,21 +19,29 @@ Usage (PowerShell):
 
 Features:
 - Automatically creates <image_folder>/ocr/ subfolder
-- Recursively finds all images (PNG, JPG, TIF, etc.)
+- Recursively finds all images (PNG, JPG, TIF, etc.), streaming them to OCR while the folder is still being scanned
 - For each image, creates a corresponding .txt file in ocr/ with OCR results
 - Reuses existing OCR results if .txt already exists (skip re-processing)
-- Converts TIF to PNG for better compatibility
+- Caches OCR results by image content, so renamed/duplicate images are not re-OCR'd
+- Converts TIF to PNG for better compatibility; optional upload-size optimization for all formats
+- Multi-page TIFFs and PDFs are OCR'd page by page, one section per page in the combined file
+- Optional blank-page prefilter: blank versos/covers are marked without an OCR request
 - Headless mode (no browser window) by default
 - Parallel processing support (default: 4 workers) for faster batch processing
 """
 from __future__ import annotations
 
 import argparse
+import hashlib
+import os
+import queue
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from pathlib import Path
-from threading import Lock
-from typing import List
+from itertools import chain
+from threading import Event, Lock, Thread
+from typing import Dict, List, Optional, Tuple
 
 # Import from same directory
 THIS_FILE = Path(__file__).resolve()
@@ -41,50 +49,244 @@ SCRIPTS_DIR = THIS_FILE.parent
 if str(SCRIPTS_DIR) not in sys.path:
     sys.path.insert(0, str(SCRIPTS_DIR))
 
+import ocr_dharmamitra_playwright as core  # type: ignore
 from ocr_dharmamitra_playwright import (  # type: ignore
-    ocr_single_image,
+    set_network_policy,
+    set_selector_profile,
     OCR_URL_DEFAULT,
 )
+from ocr_network import add_network_arguments, network_policy_from_args  # type: ignore
+from ocr_blank_pages import BLANK_MARKER, DEFAULT_BLANK_THRESHOLD, PageStats, image_stats, page_stats  # type: ignore
+from ocr_blank_pages import available as blank_filter_available  # type: ignore
+from ocr_backends import (  # type: ignore
+    BackendConfig,
+    BackendUnavailable,
+    RoutedBackend,
+    available_backends,
+    create_backend,
+)
+from ocr_direct_api import DEFAULT_API_PROFILE_PATH  # type: ignore
+from ocr_documents import (  # type: ignore
+    DEFAULT_PDF_DPI,
+    DOCUMENT_EXTS,
+    Entry,
+    PageRef,
+    close_documents,
+    entry_key,
+    entry_path,
+    expand,
+    is_pdf,
+    load_page,
+    pdf_available,
+)
+from ocr_errors import DEFAULT_RETRY_POLICIES, OcrError, classify, parse_retry_spec, retry_policies  # type: ignore
+from ocr_selector_profile import DEFAULT_PROFILE_PATH, SelectorProfile  # type: ignore
+from ocr_cache import DEFAULT_CACHE_PATH, OcrCache, hash_file  # type: ignore
+from ocr_journal import DONE, FAILED, IN_FLIGHT, QUEUED, BatchJournal, read_image_list  # type: ignore
+from ocr_manifest import IMAGE_EXTS, ImageManifest, default_manifest_path, iter_images  # type: ignore
+from ocr_output import FAILED_MARKER, CombinedWriter  # type: ignore
+from ocr_records import (  # type: ignore
+    BLANK,
+    SKIPPED,
+    ImageResult,
+    RecordWriter,
+    parquet_available,
+    stage_timings,
+    write_parquet,
+)
+from ocr_rate_control import (  # type: ignore
+    ERROR as GOV_ERROR,
+    OK as GOV_OK,
+    RATE_LIMITED as GOV_RATE_LIMITED,
+    AimdController,
+)
+from ocr_metrics import BatchMetrics, MetricsServer, MetricsTextfile  # type: ignore
+from ocr_trace import Tracer, span  # type: ignore
+from ocr_upload_prep import COLOR_MODES, UPLOAD_FORMATS, UploadOptions, encode_smallest, prepare_image  # type: ignore
 
 try:
     from PIL import Image
 except Exception:
     Image = None
 
-IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".webp"}
 
 
-def find_images(input_dir: Path, recursive: bool = True) -> List[Path]:
-    """Find all image files under input_dir."""
-    if recursive:
-        return sorted([p for p in input_dir.rglob("*") if p.is_file() and p.suffix.lower() in IMAGE_EXTS])
-    return sorted([p for p in input_dir.iterdir() if p.is_file() and p.suffix.lower() in IMAGE_EXTS])
+def needs_conversion(src: Entry, options: Optional[UploadOptions] = None) -> bool:
+    """True if prepare_upload would re-encode this file (CPU-heavy); pages of multi-page files always are."""
+    if isinstance(src, PageRef):
+        return True
+    if Image is None:
+        return False
+    return src.suffix.lower() in {".tif", ".tiff"} or (options is not None and options.enabled)
+
 
+def _encode_for_upload(im, out_base: Path, options: Optional[UploadOptions]) -> Path:
+    """Write a decoded image as PNG, or with the upload optimization when enabled; returns the file."""
+    if options is None or not options.enabled:
+        out_path = out_base.with_name(out_base.name + ".png")
+        im.convert("RGB").save(out_path, format="PNG", optimize=True)
+        return out_path
+    data, ext = encode_smallest(prepare_image(im, options), options)
+    out_path = out_base.with_name(out_base.name + ext)
+    out_path.write_bytes(data)
+    return out_path
 
-def convert_image_for_upload(src: Path, tmp_dir: Path, verbose: bool = False) -> Path:
-    """Convert TIF/TIFF to PNG for better OCR compatibility."""
+
+def convert_image_for_upload(src: Path, tmp_dir: Path, verbose: bool = False,
+                             options: Optional[UploadOptions] = None) -> Path:
+    """
+    Convert TIF/TIFF to PNG for better OCR compatibility.
+
+    With upload optimization enabled (see ocr_upload_prep), every format is downscaled /
+    colour-reduced and re-encoded, and the smaller of the result and the original is uploaded.
+    """
     suffix = src.suffix.lower()
-    if suffix in {".tif", ".tiff"}:
+    optimize = options is not None and options.enabled
+    if suffix in {".tif", ".tiff"} or optimize:
         if Image is None:
             if verbose:
-                print(f"[OCR] Pillow not available; uploading TIF directly: {src.name}")
+                print(f"[OCR] Pillow not available; uploading original: {src.name}")
             return src
         try:
             tmp_dir.mkdir(parents=True, exist_ok=True)
-            out_path = tmp_dir / (src.stem + ".png")
-            if verbose:
-                print(f"[OCR] Converting TIF->PNG: {src.name} -> {out_path.name}")
+            # Path hash keeps same-named images from different subfolders apart
+            path_tag = hashlib.sha1(str(src).encode("utf-8")).hexdigest()[:8]
+            if not optimize:
+                if verbose:
+                    print(f"[OCR] Converting TIF->PNG: {src.name} -> {src.stem}_{path_tag}.png")
+                with Image.open(src) as im:
+                    return _encode_for_upload(im, tmp_dir / f"{src.stem}_{path_tag}", None)
+
             with Image.open(src) as im:
-                im = im.convert("RGB")
-                im.save(out_path, format="PNG", optimize=True)
+                data, ext = encode_smallest(prepare_image(im, options), options)
+            original_size = src.stat().st_size
+            # TIFs are always converted; other formats only when re-encoding actually helps
+            if suffix not in {".tif", ".tiff"} and len(data) >= original_size:
+                if verbose:
+                    print(f"[OCR] Optimized upload not smaller, using original: {src.name}")
+                return src
+            out_path = tmp_dir / f"{src.stem}_{path_tag}{ext}"
+            out_path.write_bytes(data)
+            if verbose:
+                print(f"[OCR] Optimized upload: {src.name} {original_size // 1024} KB -> "
+                      f"{out_path.name} {len(data) // 1024} KB")
             return out_path
         except Exception as e:
             if verbose:
-                print(f"[OCR] TIF conversion failed ({src.name}), using original: {e}")
+                print(f"[OCR] Conversion failed ({src.name}), using original: {e}")
             return src
     return src
 
 
+def convert_page_for_upload(page: PageRef, tmp_dir: Path, verbose: bool = False,
+                            options: Optional[UploadOptions] = None, pdf_dpi: int = DEFAULT_PDF_DPI,
+                            blank_threshold: Optional[float] = None) -> Tuple[Path, Optional[PageStats]]:
+    """
+    Decode one page of a multi-page TIFF/PDF (ocr_documents.load_page) and write it as an upload
+    file; with blank_threshold set, the blank-page check runs on the same decoded page first.
+    """
+    im = load_page(page, pdf_dpi)
+    try:
+        stats = None
+        if blank_threshold is not None and blank_filter_available():
+            stats = image_stats(im, blank_threshold)
+            if stats.blank:
+                return page.path, stats
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        path_tag = hashlib.sha1(str(page.path).encode("utf-8")).hexdigest()[:8]
+        out_path = _encode_for_upload(im, tmp_dir / f"{page.stem}_{path_tag}", options)
+        if verbose:
+            print(f"[OCR] Extracted page: {page.name} -> {out_path.name} ({out_path.stat().st_size // 1024} KB)")
+        return out_path, stats
+    finally:
+        im.close()
+
+
+def prepare_upload(src: Entry, tmp_dir: Path, verbose: bool = False, options: Optional[UploadOptions] = None,
+                   blank_threshold: Optional[float] = None,
+                   pdf_dpi: int = DEFAULT_PDF_DPI) -> Tuple[Path, Optional[PageStats]]:
+    """
+    Preprocess one image: the blank-page check (when blank_threshold is set), then
+    convert_image_for_upload. Returns (upload path, PageStats or None); blank pages are
+    not converted. Pages of multi-page files are extracted with convert_page_for_upload.
+    """
+    if isinstance(src, PageRef):
+        return convert_page_for_upload(src, tmp_dir, verbose, options, pdf_dpi, blank_threshold)
+    stats = None
+    if blank_threshold is not None and blank_filter_available():
+        try:
+            stats = page_stats(src, blank_threshold)
+        except Exception as e:
+            if verbose:
+                print(f"[OCR] Blank-page check failed ({src.name}), uploading: {e}")
+        if stats is not None and stats.blank:
+            return src, stats
+    return convert_image_for_upload(src, tmp_dir, verbose=verbose, options=options), stats
+
+
+def _page_stats_or_none(entry: Entry, threshold: float, pdf_dpi: int = DEFAULT_PDF_DPI) -> Optional[PageStats]:
+    try:
+        if isinstance(entry, PageRef):
+            im = load_page(entry, pdf_dpi)
+            try:
+                return image_stats(im, threshold)
+            finally:
+                im.close()
+        return page_stats(entry, threshold)
+    except Exception:
+        return None
+
+
+_pdf_warning_shown = False
+
+
+def expand_input(path: Path) -> List[Entry]:
+    """
+    What to OCR for one input file: the image itself, or one entry per page of a multi-page
+    TIFF/PDF. PDFs are skipped (with a warning) when pypdfium2 is not installed; a file whose
+    pages cannot be counted is processed as a single page, so its error shows up in the output.
+    """
+    global _pdf_warning_shown
+    if is_pdf(path) and not pdf_available():
+        if not _pdf_warning_shown:
+            _pdf_warning_shown = True
+            print("[OCR] Skipping PDF files: PDF input needs pypdfium2 (pip install pypdfium2)", file=sys.stderr)
+        return []
+    try:
+        return expand(path)
+    except Exception as e:
+        print(f"[OCR] Could not count the pages of {path.name}, processing it as one page: {e}", file=sys.stderr)
+        return [PageRef(path, 1, 1)] if is_pdf(path) else [path]
+
+
+def blank_page_report(images: List[Entry], image_folder: Path, threshold: float, workers: int,
+                      pdf_dpi: int = DEFAULT_PDF_DPI) -> int:
+    """--blank-dry-run: list the pages the prefilter would skip (and borderline ones); nothing is uploaded."""
+    if not blank_filter_available():
+        print("Error: the blank-page prefilter needs Pillow (pip install Pillow)", file=sys.stderr)
+        return 2
+    thresholds = [threshold] * len(images)
+    dpis = [pdf_dpi] * len(images)
+    if workers > 0:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_page_stats_or_none, images, thresholds, dpis, chunksize=8))
+    else:
+        results = list(map(_page_stats_or_none, images, thresholds, dpis))
+    blank = sum(1 for stats in results if stats is not None and stats.blank)
+    print(f"Blank-page dry run (threshold {threshold * 100:.3f}% ink): "
+          f"{blank} of {len(images)} page(s) would be skipped")
+    print(f"空白页预检：{len(images)} 页中有 {blank} 页将被跳过")
+    for entry, stats in zip(images, results):
+        rel = entry_key(entry, image_folder)
+        if stats is None:
+            print(f"  ERROR  (unreadable, would be uploaded)  {rel}")
+        elif stats.blank:
+            print(f"  SKIP   {stats.describe()}  {rel}")
+        elif stats.ink_ratio < 5 * threshold:
+            print(f"  keep   {stats.describe()}  {rel}  (near threshold)")
+    return 0
+
+
 def main(argv: List[str] | None = None) -> int:
     parser = argparse.ArgumentParser(
         description="Simple batch OCR: process all images in a folder, save results to <folder>/ocr/",
@@ -137,7 +339,7 @@ Examples:
     parser.add_argument(
         "--force",
         action="store_true",
-        help="Re-process images even if .txt already exists",
+        help="Re-process images even if .txt already exists or a cached result is available",
     )
     parser.add_argument(
         "--url",
@@ -168,12 +370,343 @@ Examples:
         default=5,
         help="Delay in seconds before retrying after rate limit error (default: 5)",
     )
+    parser.add_argument(
+        "--retry",
+        action="append",
+        type=parse_retry_spec,
+        default=[],
+        metavar="CLASS=N[:BACKOFF[:JITTER]]",
+        help="Retry policy for one error class: N retries, BACKOFF seconds (x retry number), "
+             "JITTER fraction (default 0.25). Classes: " + ", ".join(DEFAULT_RETRY_POLICIES) +
+             ". Repeatable, e.g. --retry timeout=2:5 --retry blank_page=1 "
+             "(defaults: rate_limited=3:5, navigation_failed=2:2, upload_failed=1:1, timeout=1:2, others 0)",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Let a shared AIMD governor pick the concurrency: start at 1 request in flight, "
+             "grow while healthy, halve on rate limits; --workers becomes the upper bound",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted batch: skip images the journal records as done, "
+             "retry failed and in-flight ones",
+    )
+    parser.add_argument(
+        "--journal",
+        type=Path,
+        default=None,
+        help="Batch journal file (default: <folder>/<folder>_ocr_journal.jsonl)",
+    )
+    parser.add_argument(
+        "--only",
+        type=Path,
+        default=None,
+        metavar="LIST",
+        help="Only OCR the images/pages listed in LIST (one per line, e.g. written by "
+             "diagnose_ocr_failures.py --retry-list); all others keep their result from the journal",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        default=None,
+        help="Image manifest (folder listings, image size/mtime/hash) used to skip re-listing unchanged "
+             "folders on later runs (default: ~/.tibetan_ocr/manifests/<folder>_<hash of its path>.jsonl)",
+    )
+    parser.add_argument(
+        "--no-manifest",
+        action="store_true",
+        help="Don't read or write the image manifest; list every folder",
+    )
+    parser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="List every folder again (ignore the manifest's stored listings) and rewrite the manifest",
+    )
+    parser.add_argument(
+        "--cache-path",
+        type=Path,
+        default=DEFAULT_CACHE_PATH,
+        help=f"OCR result cache database, keyed by image content (default: {DEFAULT_CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=1024,
+        help="Maximum size of cached OCR text in MB; least recently used entries are evicted (default: 1024)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the OCR result cache",
+    )
+    parser.add_argument(
+        "--selector-profile",
+        type=Path,
+        default=DEFAULT_PROFILE_PATH,
+        help=f"JSON file of learned upload/trigger selectors (default: {DEFAULT_PROFILE_PATH})",
+    )
+    parser.add_argument(
+        "--no-selector-profile",
+        action="store_true",
+        help="Always run full selector discovery for every image; don't read or write the profile",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=available_backends(),
+        default="playwright",
+        help="OCR backend: 'playwright' = the OCR website in a browser, 'direct' = its captured HTTP API "
+             "(see --direct-api), 'tesseract' = local Tesseract with Tibetan data (default: playwright)",
+    )
+    parser.add_argument(
+        "--fallback-backend",
+        choices=available_backends(),
+        default=None,
+        help="Retry pages the --backend fails on (e.g. no Tibetan text) with this backend, "
+             "e.g. --backend tesseract --fallback-backend playwright",
+    )
+    parser.add_argument(
+        "--tesseract-lang",
+        type=str,
+        default="bod",
+        help="Tesseract language for the tesseract backend (default: bod)",
+    )
+    parser.add_argument(
+        "--tesseract-psm",
+        type=int,
+        default=6,
+        help="Tesseract page segmentation mode (default: 6, a single uniform block of text)",
+    )
+    parser.add_argument(
+        "--tesseract-cmd",
+        type=str,
+        default="tesseract",
+        help="Tesseract executable (default: tesseract on PATH)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["sync", "async"],
+        default="sync",
+        help="Browser engine: 'sync' = one browser per worker, 'async' = one shared browser "
+             "with --workers concurrent pages (default: sync)",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="If an image has no text after --hedge-percentile of recent latencies, race a second attempt "
+             "on another page and keep whichever finishes first (uses the async engine)",
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=95.0,
+        help="Latency percentile after which an attempt is hedged (default: 95)",
+    )
+    parser.add_argument(
+        "--hedge-budget",
+        type=float,
+        default=0.05,
+        help="Maximum share of extra requests spent on hedges (default: 0.05 = 5%%); "
+             "hedging also pauses after any rate-limit response",
+    )
+    parser.add_argument(
+        "--hedge-min-delay",
+        type=float,
+        default=2.0,
+        help="Never hedge earlier than this many seconds into an attempt (default: 2)",
+    )
+    parser.add_argument(
+        "--wait-mode",
+        choices=["event", "poll"],
+        default="event",
+        help="How to detect OCR completion: injected DOM watcher (event) or body-text polling (poll) (default: event)",
+    )
+    parser.add_argument(
+        "--prep-workers",
+        type=int,
+        default=max(1, (os.cpu_count() or 2) - 1),
+        help="Processes for converting images ahead of upload (0 = convert inline in the browser worker; "
+             "default: CPU count - 1)",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=16,
+        help="How many images the preprocessing stage may run ahead of the browser workers (default: 16)",
+    )
+    parser.add_argument(
+        "--max-dim",
+        type=int,
+        default=0,
+        help="Upload optimization: downscale so the longest side is at most N pixels (default: 0 = off)",
+    )
+    parser.add_argument(
+        "--target-dpi",
+        type=int,
+        default=0,
+        help="Upload optimization: downscale images that record a higher DPI to this DPI (default: 0 = off)",
+    )
+    parser.add_argument(
+        "--color",
+        choices=COLOR_MODES,
+        default="keep",
+        help="Upload optimization: keep colour, or convert to grayscale / bilevel black-and-white (default: keep)",
+    )
+    parser.add_argument(
+        "--upload-format",
+        choices=UPLOAD_FORMATS,
+        default="png",
+        help="Upload optimization: encoding of re-encoded images; 'auto' keeps the smallest of PNG, "
+             "lossless WebP and (with --jpeg-quality) JPEG (default: png)",
+    )
+    parser.add_argument(
+        "--jpeg-quality",
+        type=int,
+        default=0,
+        help="JPEG quality (1-95) for --upload-format jpeg/auto; 0 = no JPEG in auto mode (default: 0)",
+    )
+    parser.add_argument(
+        "--pdf-dpi",
+        type=int,
+        default=DEFAULT_PDF_DPI,
+        help=f"Resolution at which PDF pages are rendered for OCR (default: {DEFAULT_PDF_DPI}; needs pypdfium2)",
+    )
+    parser.add_argument(
+        "--skip-blank",
+        action="store_true",
+        help="Detect blank pages locally (ink ratio, variance, histogram of a thumbnail) and mark them "
+             "in the output without sending them to OCR",
+    )
+    parser.add_argument(
+        "--blank-threshold",
+        type=float,
+        default=DEFAULT_BLANK_THRESHOLD,
+        help="Ink ratio below which --skip-blank treats a page as blank "
+             f"(default: {DEFAULT_BLANK_THRESHOLD} = {DEFAULT_BLANK_THRESHOLD * 100:g}%% of the page)",
+    )
+    parser.add_argument(
+        "--blank-dry-run",
+        action="store_true",
+        help="Only report which pages --skip-blank would skip (and borderline ones), then exit; nothing is uploaded",
+    )
+    parser.add_argument(
+        "--upload-mbps",
+        type=float,
+        default=10.0,
+        help="Assumed upload bandwidth in Mbit/s, used to estimate upload time saved (default: 10)",
+    )
+    parser.add_argument(
+        "--records",
+        type=str,
+        nargs="?",
+        const="",
+        default=None,
+        metavar="FILE",
+        help="Write one JSON record per image (path, hash, status, error class, text, stage timings, attempts) "
+             "to this JSONL file (default: <folder>/<folder>_ocr_records.jsonl)",
+    )
+    parser.add_argument(
+        "--records-parquet",
+        type=str,
+        nargs="?",
+        const="",
+        default=None,
+        metavar="FILE",
+        help="Also convert the records to a columnar Parquet file at the end; implies --records, needs pyarrow "
+             "(default: the records file with a .parquet suffix)",
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        default=None,
+        help="Write per-image stage timings (launch, navigate, upload, triggers, wait, ...) to this JSONL file",
+    )
+    parser.add_argument(
+        "--trace-summary",
+        action="store_true",
+        help="Print a per-stage p50/p95 timing table and upload-strategy counts at the end",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="Serve live Prometheus metrics at http://127.0.0.1:PORT/metrics while the batch runs (default: off)",
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        type=Path,
+        default=None,
+        help="Rewrite this .prom file with live metrics every --metrics-interval seconds "
+             "(node_exporter textfile collector)",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=15.0,
+        help="Seconds between --metrics-textfile updates (default: 15)",
+    )
+    parser.add_argument(
+        "--reuse-page",
+        action="store_true",
+        help="Load the OCR page once per browser page and reset it in place between images; "
+             "re-navigate only if the reset fails",
+    )
+    parser.add_argument(
+        "--recycle-after",
+        type=int,
+        default=50,
+        help="Recycle each worker's browser page after N images (default: 50)",
+    )
+    add_network_arguments(parser)
+    parser.add_argument(
+        "--direct-api",
+        action="store_true",
+        help="Same as --backend direct: send images straight to the OCR endpoint recorded in --api-profile "
+             "(no browser); falls back to the browser, and re-captures the profile, when it no longer matches",
+    )
+    parser.add_argument(
+        "--api-profile",
+        type=Path,
+        default=DEFAULT_API_PROFILE_PATH,
+        help=f"API profile for --direct-api (default: {DEFAULT_API_PROFILE_PATH})",
+    )
     args = parser.parse_args(argv)
 
     image_folder = args.image_folder.resolve()
     if not image_folder.exists() or not image_folder.is_dir():
         print(f"Error: image folder not found: {image_folder}", file=sys.stderr)
         return 2
+    only = None
+    if args.only is not None:
+        try:
+            only = read_image_list(args.only)
+        except OSError as e:
+            print(f"Error: cannot read image list {args.only}: {e}", file=sys.stderr)
+            return 2
+
+    # Images are streamed from a scandir walk (ocr_manifest): OCR starts before the walk finishes.
+    # The manifest lets later runs reuse the listings of unchanged folders.
+    # 流式扫描图片：无需等待整个目录扫描完成即可开始 OCR；清单文件让后续运行跳过未变化的目录
+    manifest = None
+    if not args.no_manifest and not args.blank_dry_run:
+        # Kept outside the image folder: writing it must not change the folder's mtime
+        manifest_path = args.manifest or default_manifest_path(image_folder)
+        manifest = ImageManifest(manifest_path, image_folder, rescan=args.rescan)
+    # The tool's own folders are not walked; the --ocr-folder only exists with --individual-files,
+    # otherwise a folder of that name belongs to the user and is scanned like any other
+    output_dirs = [image_folder / ".ocr_temp"]
+    if args.individual_files:
+        output_dirs.append(image_folder / args.ocr_folder)
+    image_iter = iter_images(image_folder, recursive=not args.no_recursive, exts=IMAGE_EXTS | DOCUMENT_EXTS,
+                             manifest=manifest, skip_dirs=output_dirs)
+    first_image = next(image_iter, None)
+    if first_image is None:
+        print(f"No images found in {image_folder} (recursive={not args.no_recursive})")
+        return 0
+    if args.blank_dry_run:
+        entries = [entry for img_path in chain([first_image], image_iter) for entry in expand_input(img_path)]
+        return blank_page_report(entries, image_folder, args.blank_threshold, args.prep_workers, args.pdf_dpi)
 
     # Auto-create OCR output folder only if individual files are requested
     # Otherwise, we'll use a hidden temp folder that gets cleaned up
@@ -189,13 +722,7 @@ Examples:
         if args.verbose:
             print(f"[OCR] Using temporary folder (will be cleaned up): {ocr_output_dir}")
 
-    # Find all images
-    images = find_images(image_folder, recursive=not args.no_recursive)
-    if not images:
-        print(f"No images found in {image_folder} (recursive={not args.no_recursive})")
-        return 0
-
-    print(f"Found {len(images)} image(s) to process...")
+    print(f"Scanning {image_folder} for images (OCR starts as they are found)...")
     if args.verbose:
         print(f"  Output folder: {ocr_output_dir}")
 
@@ -203,183 +730,575 @@ Examples:
     tmp_dir = ocr_output_dir / ".tmp_conversions"
     tmp_dir.mkdir(parents=True, exist_ok=True)
 
+    # Upload optimization (any of --max-dim/--target-dpi/--color/--upload-format/--jpeg-quality)
+    # 上传优化：缩小尺寸、转灰度/黑白、选择最小编码
+    upload_options = UploadOptions(
+        max_dim=args.max_dim,
+        target_dpi=args.target_dpi,
+        color=args.color,
+        fmt=args.upload_format,
+        jpeg_quality=args.jpeg_quality,
+    )
+    if upload_options.enabled and args.verbose:
+        print(f"[OCR] Upload optimization: {upload_options}")
+
+    # Blank-page prefilter (--skip-blank): runs with the preprocessing, before any upload
+    # 空白页预过滤：在预处理阶段进行，空白页不上传
+    blank_threshold = None
+    if args.skip_blank:
+        if blank_filter_available():
+            blank_threshold = args.blank_threshold
+        else:
+            print("[OCR] --skip-blank needs Pillow (pip install Pillow); all pages will be uploaded", file=sys.stderr)
+
+    # Learned upload/trigger selectors: later images skip the full selector scan
+    # 已学习的上传/触发选择器：后续图片无需完整扫描
+    if not args.no_selector_profile:
+        set_selector_profile(SelectorProfile(args.selector_profile))
+
+    # Request interception: block analytics/images/fonts, serve JS/CSS from a shared disk cache
+    # 请求拦截：屏蔽统计/图片/字体，JS/CSS 从共享磁盘缓存读取
+    set_network_policy(network_policy_from_args(args))
+
+    # Persistent OCR result cache (shared by all workers)
+    cache = None
+    if not args.no_cache:
+        cache = OcrCache(args.cache_path, max_bytes=args.cache_max_mb * 1024 * 1024)
+        if args.verbose:
+            print(f"[OCR] Result cache: {args.cache_path}")
+
+    # OCR backend (--backend, optionally escalating failed pages to --fallback-backend)
+    # OCR 后端（--backend，失败的页面可转交 --fallback-backend）
+    if args.direct_api:
+        args.backend = "direct"
+    if args.hedge and args.engine != "async":
+        # Hedged attempts are raced and cancelled on the shared asyncio engine
+        print("[OCR] --hedge: using the async engine (--engine async)")
+        args.engine = "async"
+    backend_config = BackendConfig(
+        url=args.url,
+        timeout_ms=args.timeout_ms,
+        wait_mode=args.wait_mode,
+        reuse_page=args.reuse_page,
+        recycle_after=args.recycle_after,
+        engine=args.engine,
+        concurrency=args.workers,
+        hedge=args.hedge,
+        hedge_percentile=args.hedge_percentile,
+        hedge_budget=args.hedge_budget,
+        hedge_min_delay_s=args.hedge_min_delay,
+        api_profile=args.api_profile,
+        tesseract_cmd=args.tesseract_cmd,
+        tesseract_lang=args.tesseract_lang,
+        tesseract_psm=args.tesseract_psm,
+    )
+    backend = create_backend(args.backend, backend_config)
+    if args.fallback_backend and args.fallback_backend != args.backend:
+        backend = RoutedBackend(backend, create_backend(args.fallback_backend, backend_config))
+    # With --engine async the playwright backend drives one shared browser on an asyncio loop,
+    # so --workers sets the number of in-flight pages, not browsers.
+    # 异步引擎：所有工作线程共享一个浏览器，--workers 表示并发页面数而非浏览器数
+    try:
+        backend.start()
+    except BackendUnavailable as e:
+        print(f"Error: {e}", file=sys.stderr)
+        if cache is not None:
+            cache.close()
+        return 2
+
+    # Adaptive concurrency: one governor for all workers; rate limits back everyone off together
+    # 自适应并发：所有工作线程共用一个控制器，遇到速率限制时统一退避
+    # Per-error-class retry policies (--retry-rate-limit / --retry-delay set the rate_limited one)
+    # 每类错误的重试策略
+    retry_policy = retry_policies(args.retry_rate_limit, args.retry_delay, args.retry)
+
+    governor = None
+    if args.adaptive:
+        governor = AimdController(max_limit=args.workers, cooldown_s=args.retry_delay)
+
+    # Structured per-image records (--records / --records-parquet); their stage timings come from the tracer
+    # 结构化结果记录：每张图片一行 JSON，可选转换为 Parquet
+    records = None
+    if args.records is not None or args.records_parquet is not None:
+        records_path = Path(args.records) if args.records else (image_folder / f"{image_folder.name}_ocr_records.jsonl")
+        records = RecordWriter(records_path)
+        if args.records_parquet is not None and not parquet_available():
+            print("[OCR] --records-parquet needs pyarrow (pip install pyarrow); writing JSONL records only",
+                  file=sys.stderr)
+
+    # Per-stage timing spans for every image (--trace / --trace-summary)
+    # 每张图片的逐阶段耗时
+    tracer = Tracer(args.trace) if (args.trace or args.trace_summary or records is not None) else None
+
+    # Live counters/histograms for --metrics-port / --metrics-textfile (always collected, cheap)
+    # 实时指标：运行期间可通过 HTTP 端口或文本文件查看
+    metrics = BatchMetrics()
+    if governor is not None:
+        metrics.gauge_fn("concurrency_limit", "Current adaptive concurrency limit", lambda: governor.limit)
+
     # Thread-safe counters and progress tracking
     processed_lock = Lock()
     processed = 0
     skipped = 0
     failed = 0
-    total = len(images)
+    blank_pages = 0
+    # Filled by the producer as the walk finds images (one entry per page of a multi-page
+    # TIFF/PDF); workers only read entries already queued
+    images: List[Entry] = []
+    documents = 0
+    only_found = 0  # --only entries seen by the walk
+    walk_done = Event()
+    # Bytes of the original images vs. what was actually uploaded (upload optimization report)
+    upload_bytes_original = 0
+    upload_bytes_sent = 0
+
+    def progress(i: int) -> str:
+        # "[12/340+]" while the walk is still finding images
+        return f"[{i}/{len(images)}{'' if walk_done.is_set() else '+'}]"
+
+    # Hash of each multi-page file, so its pages don't re-read the whole file (without a manifest)
+    document_digests: Dict[Path, str] = {}
+
+    def digest_for(entry: Entry) -> str:
+        """SHA-256 of the image file (the whole file for a page), reusing the manifest's when possible."""
+        img_path = entry_path(entry)
+        if manifest is not None:
+            return manifest.digest(img_path)
+        if isinstance(entry, PageRef):
+            digest = document_digests.get(img_path)
+            if digest is None:
+                digest = document_digests[img_path] = hash_file(img_path)
+            return digest
+        return hash_file(img_path)
+
+    def cache_key_for(entry: Entry, digest: Optional[str] = None) -> str:
+        page = entry.page if isinstance(entry, PageRef) else None
+        return cache.key_for(entry_path(entry), backend.cache_id, digest or digest_for(entry), page)
+
+    def individual_txt_path(entry: Entry) -> Path:
+        """Individual .txt path (preserves relative structure if recursive); <stem>_p0001.txt for pages."""
+        if args.no_recursive:
+            return ocr_output_dir / (entry.stem + ".txt")
+        return ocr_output_dir / entry_path(entry).relative_to(image_folder).parent / (entry.stem + ".txt")
+
+    def resumed(image_key: str) -> bool:
+        """Whether the image's result is taken from the journal instead of being OCR'd."""
+        if only is not None:
+            # --only: listed images are OCR'd again, all others come from the journal
+            return image_key not in only and journal.is_done(image_key)
+        return args.resume and not args.force and journal.is_done(image_key)
+
+    def resumed_text_for(image_key: str):
+        return journal.completed_text(image_key) if resumed(image_key) else None
 
     def process_single_image(args_tuple):
         """Process a single image - designed for parallel execution."""
-        i, img_path, args, image_folder, ocr_output_dir, tmp_dir = args_tuple
-        nonlocal processed, skipped, failed
-        
+        i, entry, args, image_folder, ocr_output_dir, tmp_dir, prepared = args_tuple
+        nonlocal processed, skipped, failed, blank_pages, upload_bytes_original, upload_bytes_sent
+        # prepared = (future of a background conversion or None, precomputed cache key and image hash or None)
+        conversion, cache_key, digest = prepared
+        # entry is an image file or one page of a multi-page TIFF/PDF (ocr_documents.PageRef)
+        img_path = entry_path(entry)
+        result = ImageResult(image=entry_key(entry, image_folder),
+                             path=img_path.relative_to(image_folder).as_posix(),
+                             page=entry.page if isinstance(entry, PageRef) else None,
+                             backend=backend.name, sha256=digest)
+
         # Determine output TXT path (preserve relative structure if recursive)
-        if args.no_recursive:
-            out_txt = ocr_output_dir / (img_path.stem + ".txt")
-        else:
-            # Preserve subfolder structure in OCR output
-            rel_path = img_path.relative_to(image_folder)
-            out_txt = ocr_output_dir / rel_path.with_suffix(".txt")
+        out_txt = individual_txt_path(entry)
+        if not args.no_recursive:
             out_txt.parent.mkdir(parents=True, exist_ok=True)
 
+        # --resume: images the journal already has as done come straight from the journal
+        image_key = result.image
+        resumed_text = resumed_text_for(image_key)
+        if resumed_text is not None:
+            with processed_lock:
+                skipped += 1
+                if args.verbose:
+                    print(f"{progress(i)} Skipped (done in journal): {entry.name}")
+            metrics.inc("images_skipped_total", reason="journal")
+            combined_writer.add(i, resumed_text)
+            if resumed_text == BLANK_MARKER:
+                result.status, result.source = BLANK, "journal"
+            else:
+                result.status, result.source, result.text = SKIPPED, "journal", resumed_text
+            return result
+
         # Skip if individual file already exists (only if --individual-files is enabled)
         # But we still need to track it for the combined file
         if args.individual_files and not args.force and out_txt.exists():
             if args.verbose:
                 with processed_lock:
-                    print(f"[{i}/{total}] Skipped (exists): {img_path.name}")
+                    print(f"{progress(i)} Skipped (exists): {entry.name}")
             with processed_lock:
                 skipped += 1
+            metrics.inc("images_skipped_total", reason="existing")
             # Still process for combined file, but read from existing file
             try:
                 existing_content = out_txt.read_text(encoding="utf-8", errors="ignore")
-                temp_content_file = ocr_output_dir / ".temp_contents" / f"{img_path.stem}.txt"
-                temp_content_file.parent.mkdir(parents=True, exist_ok=True)
-                temp_content_file.write_text(existing_content, encoding="utf-8")
             except Exception:
-                pass
-            return (img_path, True, None)  # (path, skipped, error)
+                existing_content = None
+            if existing_content is not None:
+                journal.record(image_key, DONE, text=existing_content)
+            combined_writer.add(i, existing_content)
+            result.status, result.source, result.text = SKIPPED, "existing", existing_content
+            return result
 
+        # --only: an unlisted image keeps its journal failure, or stays "not completed"
+        if only is not None and image_key not in only:
+            rec = journal.state.get(image_key) or {}
+            if rec.get("status") == FAILED:
+                error_msg = rec.get("error") or ""
+                with processed_lock:
+                    failed += 1
+                combined_writer.add(i, f"{FAILED_MARKER} {error_msg}")
+                result.status, result.source = FAILED, "journal"
+                result.error, result.error_class = error_msg, classify(error_msg)
+                return result
+            with processed_lock:
+                skipped += 1
+            metrics.inc("images_skipped_total", reason="not_listed")
+            combined_writer.add(i, None)
+            result.status = SKIPPED
+            return result
+
+        upload_path = None
         try:
+            journal.record(image_key, IN_FLIGHT)
             if args.verbose:
                 with processed_lock:
-                    print(f"[{i}/{total}] Processing: {img_path.name}")
+                    print(f"{progress(i)} Processing: {entry.name}")
 
-            # Convert TIF to PNG if needed
-            upload_path = convert_image_for_upload(img_path, tmp_dir, verbose=args.verbose)
+            # Content-addressed cache: same image bytes + URL -> reuse earlier result, no browser work
+            # 内容寻址缓存：相同图片内容 + 网址直接复用之前的结果，无需浏览器
+            ocr_content = None
+            if cache is not None:
+                with span("cache_lookup"):
+                    if cache_key is None:
+                        digest = result.sha256 = digest or digest_for(entry)
+                        cache_key = cache_key_for(entry, digest)
+                    if not args.force:
+                        ocr_content = cache.get(cache_key)
+                if ocr_content is not None and args.verbose:
+                    with processed_lock:
+                        print(f"  -> Cache hit: {entry.name}")
 
-            # Run OCR (headless mode) with retry logic for rate limiting
-            # Use a temp directory for OCR output, we'll handle file placement ourselves
-            temp_ocr_dir = ocr_output_dir / ".temp_ocr"
-            temp_ocr_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Retry logic for rate limiting
-            import time
-            last_error = None
-            for retry in range(args.retry_rate_limit + 1):
+            if ocr_content is None:
+                # Blank-page check and TIF->PNG conversion (usually already done by the preprocessing pool)
+                blank = None
+                if conversion is not None:
+                    with span("convert", prefetched=True):
+                        upload_path, blank = conversion.result()
+                elif blank_threshold is not None or needs_conversion(entry, upload_options):
+                    with span("convert", prefetched=False):
+                        upload_path, blank = prepare_upload(entry, tmp_dir, args.verbose, upload_options,
+                                                            blank_threshold, args.pdf_dpi)
+                else:
+                    upload_path = img_path
+                if blank is not None and blank.blank:
+                    # Marked as blank in the output without an OCR request; the journal keeps it for --resume
+                    journal.record(image_key, DONE, text=BLANK_MARKER)
+                    combined_writer.add(i, BLANK_MARKER)
+                    with processed_lock:
+                        skipped += 1
+                        blank_pages += 1
+                        if args.verbose:
+                            print(f"  -> Blank page, not sent to OCR ({blank.describe()})")
+                    metrics.inc("images_skipped_total", reason="blank")
+                    result.status = BLANK
+                    return result
+                sent_size = 0
                 try:
-                    result_txt = ocr_single_image(
-                        image_path=upload_path,
-                        output_dir=temp_ocr_dir,
-                        url=args.url,
-                        headless=True,  # No browser window
-                        timeout_ms=args.timeout_ms,
-                    )
-                    # Success - break out of retry loop
-                    break
-                except Exception as e:
-                    error_msg = str(e)
-                    # Check if it's a rate limit error
-                    if "請求過多" in error_msg or "请求过多" in error_msg or "rate limit" in error_msg.lower():
-                        if retry < args.retry_rate_limit:
-                            wait_time = args.retry_delay * (retry + 1)  # Exponential backoff
+                    sent_size = upload_path.stat().st_size
+                    if not isinstance(entry, PageRef):  # a page has no original file of its own
+                        original_size = img_path.stat().st_size
+                        with processed_lock:
+                            upload_bytes_original += original_size
+                            upload_bytes_sent += sent_size
+                except OSError:
+                    pass
+
+                # Run OCR; each error class has its own retry count, backoff and jitter (see ocr_errors)
+                # 按错误类型重试：速率限制、导航失败、上传失败、超时各自有重试次数和退避时间
+                import time
+                retries_used: Dict[str, int] = {}
+                backoff: Optional[Tuple[str, float]] = None  # (error class, seconds) to wait before the next attempt
+                while True:
+                    if backoff is not None:
+                        # Slept here, after the attempt released its governor slot and left the
+                        # in_flight gauge: a worker waiting to retry holds no slot
+                        with span("backoff", error_class=backoff[0]):
+                            time.sleep(backoff[1])
+                        backoff = None
+                    # With --adaptive, every attempt takes a slot from the shared AIMD governor
+                    if governor is not None:
+                        with span("governor_wait"):
+                            governor.acquire()
+                    started = time.monotonic()
+                    outcome = GOV_ERROR
+                    metrics.inc("in_flight")
+                    metrics.inc("upload_bytes_total", sent_size)
+                    result.attempts += 1
+                    try:
+                        ocr_content = backend.ocr(upload_path)
+                        outcome = GOV_OK
+                        # Success - break out of retry loop
+                        break
+                    except Exception as e:
+                        label = classify(e)
+                        if label == "rate_limited":
+                            outcome = GOV_RATE_LIMITED
+                        policy = retry_policy[label]
+                        retry = retries_used.get(label, 0) + 1
+                        if retry > policy.retries:
+                            if retry > 1 and isinstance(e, OcrError):
+                                raise type(e)(f"{e} (gave up after {retry - 1} {label} retries)") from e
+                            raise
+                        retries_used[label] = retry
+                        metrics.inc("ocr_retries_total", error_class=label)
+                        if label == "rate_limited" and governor is not None:
+                            # The governor cuts concurrency and pauses all workers together
                             if args.verbose:
                                 with processed_lock:
-                                    print(f"  ⚠️  Rate limit detected, waiting {wait_time}s before retry {retry + 1}/{args.retry_rate_limit}...")
-                            time.sleep(wait_time)
-                            last_error = e
+                                    print(f"  ⚠️  Rate limit detected, backing off (retry {retry}/{policy.retries})...")
                             continue
-                        else:
-                            # Out of retries
-                            raise ValueError(f"Rate limit error after {args.retry_rate_limit} retries: {error_msg}")
-                    else:
-                        # Not a rate limit error, don't retry
-                        raise
-
-            # Read OCR result
-            ocr_content = result_txt.read_text(encoding="utf-8", errors="ignore")
-            
+                        wait_time = policy.delay(retry)
+                        if args.verbose:
+                            with processed_lock:
+                                print(f"  ⚠️  {label} ({e}), waiting {wait_time:.1f}s before retry {retry}/{policy.retries}...")
+                        backoff = (label, wait_time)
+                    finally:
+                        latency = time.monotonic() - started
+                        if governor is not None:
+                            governor.release(latency, outcome)
+                        metrics.inc("in_flight", -1)
+                        metrics.inc("ocr_attempts_total", outcome=outcome)
+                        if outcome == GOV_OK:
+                            metrics.observe("ocr_latency_seconds", latency)
+                        elif outcome == GOV_RATE_LIMITED:
+                            metrics.inc("rate_limit_events_total")
+
+                if cache is not None:
+                    cache.put(cache_key, ocr_content)
+
             # Save individual file only if requested
             if args.individual_files:
-                if result_txt != out_txt:
-                    out_txt.write_text(ocr_content, encoding="utf-8")
-                    if args.verbose:
-                        with processed_lock:
-                            print(f"  -> Saved: {out_txt.relative_to(image_folder)}")
-                else:
-                    # Already in right place
-                    if args.verbose:
-                        with processed_lock:
-                            print(f"  -> Saved: {out_txt.relative_to(image_folder)}")
-            else:
-                # Just keep in temp for later combined file generation
-                pass
+                out_txt.write_text(ocr_content, encoding="utf-8")
+                if args.verbose:
+                    with processed_lock:
+                        print(f"  -> Saved: {out_txt.relative_to(image_folder)}")
 
-            # Clean up temp OCR file
+            # Clean up the converted upload copy
             try:
-                if result_txt.exists():
-                    result_txt.unlink()
+                if upload_path is not None and upload_path != img_path:
+                    upload_path.unlink()
             except Exception:
                 pass
 
-            # Store OCR content for combined file (we'll collect all at the end)
-            # Actually, let's save to a hidden temp file that we'll read later
-            temp_content_file = ocr_output_dir / ".temp_contents" / f"{img_path.stem}.txt"
-            temp_content_file.parent.mkdir(parents=True, exist_ok=True)
-            temp_content_file.write_text(ocr_content, encoding="utf-8")
+            # Journal first (durable), then stream into the combined file in input order
+            journal.record(image_key, DONE, text=ocr_content)
+            combined_writer.add(i, ocr_content)
 
             with processed_lock:
                 processed += 1
+            metrics.inc("images_done_total", source="ocr" if upload_path is not None else "cache")
             if args.verbose:
                 size = len(ocr_content.encode('utf-8'))
                 with processed_lock:
                     print(f"  -> OK ({size} bytes)")
 
-            return (img_path, False, None)  # (path, skipped, error)
+            result.source = "ocr" if upload_path is not None else "cache"
+            result.text = ocr_content
+            return result
 
         except Exception as e:
             error_msg = str(e)
+            try:
+                if upload_path is not None and upload_path != img_path:
+                    upload_path.unlink()
+            except Exception:
+                pass
+            metrics.inc("images_failed_total", error_class=classify(e))
             with processed_lock:
                 failed += 1
-                print(f"[{i}/{total}] Failed: {img_path.name} - {error_msg}", file=sys.stderr)
+                print(f"{progress(i)} Failed: {entry.name} - {error_msg}", file=sys.stderr)
             if args.verbose:
                 import traceback
                 with processed_lock:
                     traceback.print_exc()
             
-            # Save error marker file so combined file can show the error
+            # Save error marker so combined file can show the error
             try:
-                temp_content_file = ocr_output_dir / ".temp_contents" / f"{img_path.stem}.txt"
-                temp_content_file.parent.mkdir(parents=True, exist_ok=True)
-                # Save error info as a special marker
-                error_content = f"[OCR Failed / OCR 失败] {error_msg}"
-                temp_content_file.write_text(error_content, encoding="utf-8")
+                journal.record(image_key, FAILED, error=error_msg)
+                combined_writer.add(i, f"{FAILED_MARKER} {error_msg}")
             except Exception:
                 pass  # If we can't save error marker, that's okay
             
-            return (img_path, False, error_msg)  # (path, skipped, error)
+            result.status, result.error, result.error_class = FAILED, error_msg, classify(e)
+            return result
+
+    # Durable per-image journal next to the combined file; --resume replays it
+    # 每张图片的状态日志，--resume 时据此跳过已完成的图片
+    journal_path = args.journal or (image_folder / f"{image_folder.name}_ocr_journal.jsonl")
+    # --only also replays the journal: it keeps the results of everything it does not retry
+    journal = BatchJournal(journal_path, resume=args.resume or only is not None)
+    if journal.rotated is not None:
+        print(f"Previous journal has unfinished images; kept as {journal.rotated.name} "
+              f"(rerun with --resume to continue a batch)")
+    if args.resume or only is not None:
+        done_count = sum(1 for rec in journal.state.values() if rec.get("status") == DONE)
+        print(f"Resuming from journal: {done_count} image(s) already done ({journal_path.name})")
+    if only is not None:
+        print(f"Only OCR'ing the {len(only)} image(s)/page(s) listed in {args.only}")
+
+    # Combined TXT file is written incrementally (<name>_all_ocr.txt.partial while running)
+    # 合并文件在处理过程中增量写入（运行时为 <名称>_all_ocr.txt.partial）
+    combined_txt_path = ocr_output_dir.parent / f"{ocr_output_dir.parent.name}_all_ocr.txt"
+    # At most a few results per worker wait for a slow earlier image; then workers block
+    combined_writer = CombinedWriter(combined_txt_path, image_folder, images,
+                                     max_pending=max(16, 4 * args.workers))
+
+    # Producer/consumer pipeline: a producer thread walks the images ahead of the browser
+    # workers and hands CPU-heavy TIF->PNG conversions to a process pool, so browsers never
+    # wait on Pillow. The bounded queue limits how far ahead it gets (and how many converted
+    # files sit on disk). Images that will be resumed, skipped or served from the cache are
+    # not converted.
+    # 生产者/消费者流水线：预处理（TIF 转 PNG）在进程池中提前进行，浏览器工作线程只负责上传
+    work_queue: "queue.Queue" = queue.Queue(maxsize=max(args.prefetch, 1))
+    prep_pool = None
+
+    def will_upload(entry: Entry, cache_key) -> bool:
+        key = entry_key(entry, image_folder)
+        if only is not None and key not in only:
+            return False
+        if resumed(key):
+            return False
+        if args.individual_files and not args.force and individual_txt_path(entry).exists():
+            return False
+        if cache_key is not None and not args.force and cache.contains(cache_key):
+            return False
+        return True
+
+    def producer() -> None:
+        nonlocal prep_pool, documents, only_found
+        try:
+            # Multi-page TIFFs/PDFs become one entry per page; pages are only decoded when they
+            # are prepared, so the bounded queue also bounds the extracted page files on disk
+            entries = (entry for img_path in chain([first_image], image_iter) for entry in expand_input(img_path))
+            for i, entry in enumerate(entries, 1):
+                images.append(entry)
+                if isinstance(entry, PageRef) and entry.page == 1:
+                    documents += 1
+                metrics.set("images_total", i)
+                key = entry_key(entry, image_folder)
+                if only is not None and key in only:
+                    only_found += 1
+                if not journal.is_done(key) and (only is None or key in only):
+                    # Before the work queue, so a worker's in_flight/done record always comes later
+                    journal.record(key, QUEUED)
+                conversion = None
+                cache_key = None
+                digest = None
+                if args.prep_workers > 0 and (blank_threshold is not None or needs_conversion(entry, upload_options)):
+                    try:
+                        if cache is not None:
+                            digest = digest_for(entry)
+                            cache_key = cache_key_for(entry, digest)
+                        if will_upload(entry, cache_key):
+                            if prep_pool is None:
+                                prep_pool = ProcessPoolExecutor(max_workers=args.prep_workers)
+                            conversion = prep_pool.submit(prepare_upload, entry, tmp_dir, args.verbose,
+                                                          upload_options, blank_threshold, args.pdf_dpi)
+                    except Exception as e:
+                        # Fall back to converting inline in the worker
+                        print(f"[OCR] Preprocessing not scheduled for {entry.name}: {e}", file=sys.stderr)
+                work_queue.put((i, entry, (conversion, cache_key, digest)))
+            walk_done.set()
+            with processed_lock:
+                if documents:
+                    print(f"  Found {len(images)} image(s)/page(s), including {documents} multi-page file(s)")
+                else:
+                    print(f"  Found {len(images)} image(s)")
+        finally:
+            for _ in range(max(args.workers, 1)):
+                work_queue.put(None)  # one stop marker per worker
+
+    metrics.gauge_fn("queue_depth", "Images prepared and waiting for a browser worker", work_queue.qsize)
+    metrics_server = MetricsServer(metrics, args.metrics_port).start() if args.metrics_port else None
+    metrics_file = MetricsTextfile(metrics, args.metrics_textfile, args.metrics_interval).start() \
+        if args.metrics_textfile else None
+    if metrics_server is not None:
+        print(f"  Metrics: {metrics_server.url}")
+
+    producer_thread = Thread(target=producer, name="ocr-preprocess", daemon=True)
+    producer_thread.start()
+
+    # Each worker holds its backend resources for its whole life: with the sync playwright
+    # backend that is one warm browser (BrowserPool), launched once per worker, not per image.
+    # 每个同步工作线程持有一个常驻浏览器，而不是每张图片启动一次 Chromium
+    def worker_loop() -> None:
+        with backend.worker():
+            try:
+                while True:
+                    item = work_queue.get()
+                    if item is None:
+                        return
+                    i, entry, prepared = item
+                    try:
+                        with tracer.image(entry_key(entry, image_folder)) if tracer else nullcontext() as trace:
+                            result = process_single_image(
+                                (i, entry, args, image_folder, ocr_output_dir, tmp_dir, prepared))
+                            if trace is not None:
+                                trace.attrs["status"] = "skipped" if result.skipped else (
+                                    "failed" if result.error else "ok")
+                                if result.error:
+                                    trace.attrs["error"] = result.error
+                            if records is not None:
+                                if result.sha256 is None:
+                                    try:
+                                        result.sha256 = digest_for(entry)
+                                    except OSError:
+                                        pass  # file gone or unreadable; the record says why it failed
+                                result.timings_ms = stage_timings(trace.spans)
+                                result.total_ms = round(trace.elapsed_ms(), 1)
+                                records.write(result)
+                    except Exception as e:
+                        with processed_lock:
+                            print(f"Unexpected error for {entry.name}: {e}", file=sys.stderr)
+                        # No-op if the image already has its section; otherwise later images would wait for it
+                        combined_writer.add(i, None)
+            finally:
+                close_documents()  # multi-page file kept open by inline page extraction
 
-    # Prepare arguments for parallel processing
     if args.workers > 1:
-        print(f"Processing {total} images with {args.workers} parallel workers...")
-        print(f"  ⚠️  Warning: Using multiple workers may trigger rate limiting (請求過多). Recommended: --workers 1")
-        print(f"  警告：使用多个工作线程可能触发速率限制（請求過多）。推荐：--workers 1")
-        # Add a small delay between worker starts to avoid overwhelming the website
-        import time
+        print(f"Processing images with {args.workers} parallel workers ({backend.name} backend, {args.engine} engine)...")
+        if governor is not None:
+            print(f"  Adaptive concurrency: starting at {governor.limit}, up to {args.workers} in flight")
+        else:
+            print(f"  ⚠️  Warning: Using multiple workers may trigger rate limiting (請求過多). Recommended: --workers 1")
+            print(f"  警告：使用多个工作线程可能触发速率限制（請求過多）。推荐：--workers 1")
         with ThreadPoolExecutor(max_workers=args.workers) as executor:
-            # Submit all tasks
-            futures = {
-                executor.submit(
-                    process_single_image,
-                    (i, img_path, args, image_folder, ocr_output_dir, tmp_dir)
-                ): (i, img_path)
-                for i, img_path in enumerate(images, 1)
-            }
-            # Wait for completion and handle results
+            futures = [executor.submit(worker_loop) for _ in range(args.workers)]
             for future in as_completed(futures):
                 try:
                     future.result()  # This will raise any exceptions
                 except Exception as e:
-                    i, img_path = futures[future]
                     with processed_lock:
-                        print(f"Unexpected error for {img_path.name}: {e}", file=sys.stderr)
+                        print(f"Unexpected worker error: {e}", file=sys.stderr)
     else:
         # Serial processing (original behavior)
-        print(f"Processing {total} images sequentially...")
-        for i, img_path in enumerate(images, 1):
-            process_single_image((i, img_path, args, image_folder, ocr_output_dir, tmp_dir))
+        print("Processing images sequentially...")
+        worker_loop()
+
+    producer_thread.join()
+    if prep_pool is not None:
+        prep_pool.shutdown(wait=True)
+    backend.close()
+    if metrics_file is not None:
+        metrics_file.close()
+    if metrics_server is not None:
+        metrics_server.close()
 
     # Cleanup temp conversions
     try:
@@ -389,76 +1308,28 @@ Examples:
     except Exception:
         pass
 
-    # Create combined TXT file with all results
-    combined_txt_path = ocr_output_dir.parent / f"{ocr_output_dir.parent.name}_all_ocr.txt"
-    combined_lines = []
-    combined_lines.append("=" * 80)
-    combined_lines.append(f"Combined OCR Results / 合并 OCR 结果")
-    combined_lines.append(f"Source Folder / 源文件夹: {image_folder}")
-    combined_lines.append(f"Total Images / 总图片数: {len(images)}")
-    combined_lines.append(f"Processed / 已处理: {processed}")
-    combined_lines.append(f"Skipped / 已跳过: {skipped}")
-    combined_lines.append(f"Failed / 失败: {failed}")
-    combined_lines.append("=" * 80)
-    combined_lines.append("")
-
-    temp_contents_dir = ocr_output_dir / ".temp_contents"
-    
-    for img_path in images:
-        # Try to read from temp contents first (for newly processed images)
-        temp_content_file = temp_contents_dir / f"{img_path.stem}.txt"
-        
-        # Also check individual files if they exist
-        if args.no_recursive:
-            txt_path = ocr_output_dir / (img_path.stem + ".txt")
-        else:
-            rel_path = img_path.relative_to(image_folder)
-            txt_path = ocr_output_dir / rel_path.with_suffix(".txt")
-
-        txt_content = None
-        source_type = None
-        
-        # Priority: temp content (newly processed) > individual file > not found
-        if temp_content_file.exists():
-            try:
-                txt_content = temp_content_file.read_text(encoding="utf-8", errors="ignore").strip()
-                source_type = "temp"
-            except Exception:
-                pass
-        
-        if not txt_content and txt_path.exists():
-            try:
-                txt_content = txt_path.read_text(encoding="utf-8", errors="ignore").strip()
-                source_type = "individual"
-            except Exception:
-                pass
+    # Finalize combined file (header with final counts + streamed sections)
+    try:
+        combined_writer.finish(processed, skipped, failed)
+        print(f"  Combined file: {combined_txt_path.name}")
+    except Exception as e:
+        print(f"  Warning: Failed to create combined file: {e}", file=sys.stderr)
 
-        # Add to combined file
-        combined_lines.append("=" * 80)
-        combined_lines.append(f"Source / 来源: {img_path.relative_to(image_folder)}")
-        combined_lines.append(f"Full Path / 完整路径: {img_path}")
-        combined_lines.append("-" * 80)
-        
-        if txt_content:
-            # Check if it's an error marker
-            if txt_content.startswith("[OCR Failed / OCR 失败]"):
-                combined_lines.append(txt_content)
-            else:
-                combined_lines.append(txt_content)
-        else:
-            combined_lines.append("[OCR not completed / OCR 未完成]")
-        
-        combined_lines.append("")
+    journal.close()
+
+    records_parquet = None
+    if records is not None:
+        records.close()
+        if args.records_parquet is not None and parquet_available():
+            records_parquet = Path(args.records_parquet) if args.records_parquet else records.path.with_suffix(".parquet")
+            try:
+                write_parquet(records.path, records_parquet)
+            except Exception as e:
+                print(f"  Warning: Failed to write Parquet records: {e}", file=sys.stderr)
+                records_parquet = None
 
     # Cleanup temp directories
     try:
-        temp_ocr_dir = ocr_output_dir / ".temp_ocr"
-        if temp_ocr_dir.exists():
-            import shutil
-            shutil.rmtree(temp_ocr_dir)
-        if temp_contents_dir.exists():
-            import shutil
-            shutil.rmtree(temp_contents_dir)
         # If not using individual files, remove the entire temp folder
         if not args.individual_files and ocr_output_dir.exists():
             import shutil
@@ -468,18 +1339,54 @@ Examples:
     except Exception:
         pass
 
-    # Write combined file
-    try:
-        combined_txt_path.write_text("\n".join(combined_lines), encoding="utf-8")
-        print(f"  Combined file: {combined_txt_path.name}")
-    except Exception as e:
-        print(f"  Warning: Failed to create combined file: {e}", file=sys.stderr)
+    # Last, after every file this run writes into the image folder, so its final mtime is recorded
+    if manifest is not None:
+        manifest.save()
 
     # Summary
     print(f"\nDone!")
     print(f"  Processed: {processed}")
-    print(f"  Skipped (already exist): {skipped}")
+    print(f"  Skipped (already exist): {skipped - blank_pages}")
     print(f"  Failed: {failed}")
+    if blank_threshold is not None:
+        print(f"  Blank pages (not sent to OCR): {blank_pages}")
+    if governor is not None:
+        gstats = governor.stats()
+        print(f"  Adaptive concurrency: final limit {gstats['limit']} (peak {gstats['peak_limit']}), "
+              f"{gstats['rate_limits']} rate-limit event(s)")
+    if upload_options.enabled and upload_bytes_original:
+        saved = upload_bytes_original - upload_bytes_sent
+        # bytes * 8 / (Mbit/s * 1e6) = seconds on the wire at the assumed bandwidth
+        saved_s = saved * 8 / (args.upload_mbps * 1_000_000) if args.upload_mbps > 0 else 0.0
+        print(f"  Upload size: {upload_bytes_original / 1e6:.1f} MB -> {upload_bytes_sent / 1e6:.1f} MB "
+              f"(saved {saved / 1e6:.1f} MB, {100 * saved / upload_bytes_original:.0f}%, "
+              f"~{saved_s:.0f}s upload time at {args.upload_mbps:g} Mbit/s)")
+    if cache is not None:
+        stats = cache.stats()
+        print(f"  Cache: {stats['hits']} hit(s), {stats['misses']} miss(es), {stats['entries']} entries")
+        cache.close()
+    if tracer is not None:
+        tracer.close()
+        if args.trace_summary:
+            print("  Stage timings / 各阶段耗时:")
+            for line in tracer.summary().splitlines():
+                print(f"    {line}")
+        if args.trace:
+            print(f"  Trace file: {args.trace}")
+    if manifest is not None:
+        print(f"  Manifest: {manifest.summary()}")
+    if only is not None and only_found < len(only):
+        print(f"  Not found: {len(only) - only_found} of {len(only)} listed image(s)/page(s) are not in {image_folder}")
+    if records is not None:
+        print(f"  Records: {records.count} -> {records.path}" + (f", {records_parquet}" if records_parquet else ""))
+    if core.NETWORK_POLICY is not None:
+        print(f"  Network: {core.NETWORK_POLICY.summary()}")
+    for line in backend.summary().splitlines():
+        print(f"  {line}")
+    if args.verbose and core.SELECTOR_PROFILE is not None and core.SELECTOR_PROFILE.summary():
+        print("  Selector discovery:")
+        for line in core.SELECTOR_PROFILE.summary().splitlines():
+            print(f"    {line}")
     if args.individual_files:
         print(f"  Individual files folder: {ocr_output_dir}")
     print(f"  Combined file: {combined_txt_path}")
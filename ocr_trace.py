@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing spans for the OCR pipeline.
+
+Every image processed by ocr_simple_batch.py gets an ImageTrace. Code anywhere below it
+(browser launch, navigation, upload, trigger clicks, waiting for text, preprocessing,
+governor waits) wraps its work in `span("stage")`; the span is attached to the image
+currently being processed through a context variable, so nothing has to be passed
+down explicitly and it works the same in worker threads and asyncio tasks. Without an
+active trace, span() costs next to nothing.
+
+When the image finishes, its record is appended to a JSONL trace file:
+    {"image": "vol1/p001.tif", "status": "ok", "total_ms": 5234.1,
+     "spans": [{"stage": "navigate", "ms": 812.4}, {"stage": "upload", "ms": 95.0,
+                "strategy": "file_input"}, {"stage": "wait", "ms": 4190.2}, ...]}
+and per-stage durations are aggregated for the p50/p95 summary table.
+
+逐阶段计时：为每张图片记录浏览器启动、导航、上传（及所用策略）、触发点击、
+等待结果等各阶段耗时，写入 JSONL 跟踪文件，并在结束时输出 p50/p95 汇总表。
+"""
+from __future__ import annotations
+
+import json
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterator, List, Optional, Sequence
+
+_current: ContextVar[Optional["ImageTrace"]] = ContextVar("ocr_image_trace", default=None)
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile (q in 0-100); None for an empty sequence."""
+    if not values:
+        return None
+    data = sorted(values)
+    pos = (len(data) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(data) - 1)
+    return data[lo] + (data[hi] - data[lo]) * (pos - lo)
+
+
+class ImageTrace:
+    """Spans and attributes collected for one image."""
+
+    def __init__(self, image: str) -> None:
+        self.image = image
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.spans: List[Dict[str, object]] = []
+        self.attrs: Dict[str, object] = {}
+
+    def add(self, stage: str, ms: float, **attrs) -> None:
+        self.spans.append({"stage": stage, "ms": round(ms, 1), **attrs})
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000.0
+
+
+def current_trace() -> Optional[ImageTrace]:
+    return _current.get()
+
+
+def use_trace(trace: Optional[ImageTrace]) -> None:
+    """Make `trace` current in this thread / asyncio task (for work handed to another thread or loop)."""
+    _current.set(trace)
+
+
+@contextmanager
+def span(stage: str, **attrs) -> Iterator[Dict[str, object]]:
+    """
+    Time the enclosed block as `stage` of the current image. Yields a dict; keys set on
+    it are stored with the span (e.g. sp["strategy"] = "filechooser").
+    """
+    trace = _current.get()
+    extra: Dict[str, object] = dict(attrs)
+    if trace is None:
+        yield extra
+        return
+    start = time.perf_counter()
+    try:
+        yield extra
+    except BaseException:
+        extra["error"] = True
+        raise
+    finally:
+        trace.add(stage, (time.perf_counter() - start) * 1000.0, **extra)
+
+
+class Tracer:
+    """
+    Thread-safe collector of ImageTraces: writes one JSONL line per image (if a path is
+    given) and keeps per-stage durations and upload-strategy counts for summary().
+
+    Usage:
+        tracer = Tracer(Path("trace.jsonl"))
+        with tracer.image("vol1/p001.tif") as trace:
+            ...                       # span("navigate") etc. attach to this image
+            trace.attrs["status"] = "ok"
+        print(tracer.summary())
+        tracer.close()
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path
+        self._lock = Lock()
+        self._durations: Dict[str, array] = {}
+        self._totals = array("d")
+        self.upload_strategies: Counter = Counter()
+        self.images = 0
+        self._f = None
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._f = path.open("w", encoding="utf-8")
+
+    @contextmanager
+    def image(self, image: str) -> Iterator[ImageTrace]:
+        trace = ImageTrace(image)
+        token = _current.set(trace)
+        try:
+            yield trace
+        except BaseException:
+            trace.attrs.setdefault("status", "failed")
+            raise
+        finally:
+            _current.reset(token)
+            self._finish(trace)
+
+    def _finish(self, trace: ImageTrace) -> None:
+        total_ms = trace.elapsed_ms()
+        rec = {"image": trace.image, "ts": round(trace.started, 3), "total_ms": round(total_ms, 1)}
+        rec.update(trace.attrs)
+        rec["spans"] = trace.spans
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.images += 1
+            self._totals.append(total_ms)
+            for sp in trace.spans:
+                self._durations.setdefault(str(sp["stage"]), array("d")).append(float(sp["ms"]))
+                if sp["stage"] == "upload" and sp.get("strategy"):
+                    self.upload_strategies[str(sp["strategy"])] += 1
+            if self._f is not None:
+                self._f.write(line)
+                self._f.flush()
+
+    def stage_stats(self) -> Dict[str, Dict[str, float]]:
+        """{stage: {count, p50_ms, p95_ms, total_s}}, including "total" per image."""
+        with self._lock:
+            series = {stage: list(values) for stage, values in self._durations.items()}
+            series["total"] = list(self._totals)
+        stats = {}
+        for stage, values in series.items():
+            if not values:
+                continue
+            stats[stage] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50), 1),
+                "p95_ms": round(percentile(values, 95), 1),
+                "total_s": round(sum(values) / 1000.0, 1),
+            }
+        return stats
+
+    def summary(self) -> str:
+        """Per-stage p50/p95 table plus upload-strategy counts."""
+        stats = self.stage_stats()
+        lines = [f"{'Stage':<16}{'Count':>8}{'p50 (ms)':>12}{'p95 (ms)':>12}{'Total (s)':>12}"]
+        # Stages in order of total time spent, per-image total last
+        for stage in sorted((s for s in stats if s != "total"), key=lambda s: -stats[s]["total_s"]) + ["total"]:
+            if stage not in stats:
+                continue
+            s = stats[stage]
+            lines.append(f"{stage:<16}{s['count']:>8}{s['p50_ms']:>12}{s['p95_ms']:>12}{s['total_s']:>12}")
+        if self.upload_strategies:
+            counts = ", ".join(f"{k} {v}" for k, v in self.upload_strategies.most_common())
+            lines.append(f"Upload strategy / 上传方式: {counts}")
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
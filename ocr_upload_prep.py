@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Optional upload-size optimizer for images sent to the OCR page.
+
+Scans are often far larger than the OCR needs: 600 DPI colour TIFs of black-on-white
+text. Smaller uploads go through the browser and the network faster. When enabled,
+every image (not only TIF) is:
+
+1. downscaled so the longest side is at most --max-dim pixels and/or to --target-dpi
+   (only when the file records a higher DPI),
+2. optionally converted to grayscale or bilevel (pure black/white),
+3. encoded as PNG, lossless WebP or JPEG; "auto" keeps whichever is smallest.
+
+If the result is not smaller than the original, the original is uploaded unchanged.
+
+上传体积优化（可选）：缩小分辨率、转灰度或黑白，并选择最小的编码格式
+（PNG / 无损 WebP / JPEG），以减少上传时间。
+"""
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass
+from typing import Tuple
+
+try:
+    from PIL import Image, features
+except Exception:
+    Image = None
+    features = None
+
+COLOR_MODES = ("keep", "gray", "bilevel")
+UPLOAD_FORMATS = ("png", "webp", "jpeg", "auto")
+BILEVEL_THRESHOLD = 160  # gray levels above this become white
+DEFAULT_JPEG_QUALITY = 90
+
+
+@dataclass
+class UploadOptions:
+    """Settings for the optimizer; the defaults change nothing (TIF -> PNG only)."""
+    max_dim: int = 0          # longest side in pixels (0 = no limit)
+    target_dpi: int = 0       # downscale to this DPI if the file records more (0 = off)
+    color: str = "keep"       # keep / gray / bilevel
+    fmt: str = "png"          # png / webp / jpeg / auto
+    jpeg_quality: int = 0     # JPEG quality; in "auto" JPEG is only tried when this is set
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_dim or self.target_dpi or self.color != "keep"
+                    or self.fmt != "png" or self.jpeg_quality)
+
+
+def webp_available() -> bool:
+    return features is not None and bool(features.check("webp"))
+
+
+def prepare_image(im, options: UploadOptions):
+    """Return a downscaled / colour-reduced copy of `im` ready for encoding."""
+    scale = 1.0
+    if options.target_dpi:
+        dpi = im.info.get("dpi")
+        try:
+            src_dpi = float(dpi[0]) if dpi else 0.0
+        except (TypeError, ValueError, IndexError):
+            src_dpi = 0.0
+        if src_dpi > options.target_dpi:
+            scale = options.target_dpi / src_dpi
+    if options.max_dim:
+        longest = max(im.size)
+        if longest * scale > options.max_dim:
+            scale = options.max_dim / longest
+
+    # Normalize palette/CMYK/16-bit/alpha images first; resizing works best in L or RGB
+    im = im.convert("L" if options.color in ("gray", "bilevel") else "RGB")
+    if scale < 1.0:
+        size = (max(1, round(im.width * scale)), max(1, round(im.height * scale)))
+        im = im.resize(size, Image.LANCZOS)
+    if options.color == "bilevel":
+        # Plain threshold (no dithering): dither noise hurts OCR and compresses badly
+        im = im.point(lambda v: 255 if v > BILEVEL_THRESHOLD else 0, mode="1")
+    return im
+
+
+def encode(im, fmt: str, jpeg_quality: int = 0) -> bytes:
+    """Encode `im` as png / webp (lossless) / jpeg and return the bytes."""
+    buf = io.BytesIO()
+    if fmt == "png":
+        im.save(buf, format="PNG", optimize=True)
+    elif fmt == "webp":
+        (im.convert("L") if im.mode == "1" else im).save(buf, format="WEBP", lossless=True, method=6)
+    elif fmt == "jpeg":
+        (im.convert("L") if im.mode == "1" else im).save(
+            buf, format="JPEG", quality=jpeg_quality or DEFAULT_JPEG_QUALITY, optimize=True)
+    else:
+        raise ValueError(f"Unknown upload format: {fmt}")
+    return buf.getvalue()
+
+
+def encode_smallest(im, options: UploadOptions) -> Tuple[bytes, str]:
+    """Encode with the requested format, or try every candidate for "auto". Returns (bytes, ext)."""
+    if options.fmt != "auto":
+        fmt = options.fmt
+        if fmt == "webp" and not webp_available():
+            fmt = "png"
+        return encode(im, fmt, options.jpeg_quality), "." + ("jpg" if fmt == "jpeg" else fmt)
+    candidates = ["png"]
+    if webp_available():
+        candidates.append("webp")
+    if options.jpeg_quality:
+        candidates.append("jpeg")
+    best = None
+    for fmt in candidates:
+        data = encode(im, fmt, options.jpeg_quality)
+        if best is None or len(data) < len(best[0]):
+            best = (data, "." + ("jpg" if fmt == "jpeg" else fmt))
+    return best
@@ -0,0 +1,10 @@
+"""
+Shared pytest setup: the tool's modules live at the repository root, not in a package.
+pytest 公共设置：工具模块位于仓库根目录。
+"""
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+if str(REPO_DIR) not in sys.path:
+    sys.path.insert(0, str(REPO_DIR))
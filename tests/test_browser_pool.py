@@ -0,0 +1,72 @@
+"""Tests for the persistent browser pool (ocr_dharmamitra_playwright.BrowserPool) against the mock OCR page."""
+from pathlib import Path
+
+import pytest
+
+from mock_ocr_server import MockConfig, MockOcrServer, tibetan_text_for
+from ocr_dharmamitra_playwright import BrowserPool, PlaywrightError, ocr_image_text, sync_playwright
+
+
+def chromium_installed() -> bool:
+    try:
+        with sync_playwright() as p:
+            return Path(p.chromium.executable_path).exists()
+    except Exception:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not chromium_installed(),
+                                reason="Chromium not installed (python -m playwright install chromium)")
+
+
+@pytest.fixture
+def server():
+    server = MockOcrServer(MockConfig(latency_ms=50, jitter_ms=0, lines=3, seed=1)).start()
+    yield server
+    server.stop()
+
+
+def test_warm_page_is_returned_and_reused(server):
+    with BrowserPool(max_uses=5) as pool:
+        with pool.page() as first:
+            first.goto(server.url)
+        with pool.page() as second:
+            assert second is first
+            assert second.url == server.url  # still loaded: nothing relaunched or reopened
+        assert pool.launches == 1 and pool.recycled == 0
+
+
+def test_page_is_recycled_after_max_uses(server):
+    with BrowserPool(max_uses=2) as pool:
+        pages = []
+        for _ in range(3):
+            with pool.page() as page:
+                pages.append(page)
+        assert pages[0] is pages[1] and pages[2] is not pages[1]
+        assert pages[1].is_closed()
+        assert pool.launches == 1 and pool.recycled == 1
+
+
+def test_page_is_recycled_after_a_crash(server):
+    with BrowserPool(max_uses=10) as pool:
+        with pytest.raises(PlaywrightError):
+            with pool.page() as crashed:
+                crashed.goto("chrome://crash")
+        with pool.page() as page:
+            assert page is not crashed
+            page.goto(server.url)
+        assert pool.launches == 1 and pool.recycled == 1
+
+
+def test_ocr_through_the_pool(server, tmp_path):
+    images = []
+    for i in range(2):
+        path = tmp_path / f"p{i}.png"
+        path.write_bytes(b"\x89PNG mock page %d" % i)
+        images.append(path)
+    with BrowserPool(max_uses=10) as pool:
+        for path in images:
+            text = ocr_image_text(path, server.url, timeout_ms=15000, pool=pool)
+            assert text.splitlines()[0] == tibetan_text_for(path.read_bytes(), 3).splitlines()[0]
+        assert pool.launches == 1
+    assert server.stats()["ok"] == 2
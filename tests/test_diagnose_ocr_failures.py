@@ -0,0 +1,38 @@
+"""Tests for the streaming failure diagnostics (diagnose_ocr_failures)."""
+from diagnose_ocr_failures import main
+from ocr_journal import read_image_list
+from ocr_output import FAILED_MARKER, CombinedWriter
+
+
+def combined_file(tmp_path):
+    folder = tmp_path / "vol"
+    folder.mkdir()
+    images = [folder / f"p{i}.png" for i in range(1, 6)]
+    writer = CombinedWriter(folder / "vol_all_ocr.txt", folder, images)
+    writer.add(1, "ཀ")
+    writer.add(2, f"{FAILED_MARKER} OCR returned error: 請求過多")
+    writer.add(3, f"{FAILED_MARKER} Timed out waiting for Tibetan OCR text to appear.")
+    writer.add(4, f"{FAILED_MARKER} OCR returned error: 白页")
+    return writer.finish(processed=1, skipped=0, failed=3)  # p5 never reported
+
+
+def test_retry_list_leaves_out_permanent_failures(tmp_path, capsys):
+    combined = combined_file(tmp_path)
+    retry = tmp_path / "retry.txt"
+    assert main([str(combined), "--retry-list", str(retry)]) == 0
+    assert read_image_list(retry) == {"p2.png", "p3.png", "p5.png"}
+    out = capsys.readouterr().out
+    assert "rate_limited: 1" in out and "timeout: 1" in out and "blank_page: 1" in out
+    assert "Not listed / 未列入: 1 x blank_page" in out
+
+
+def test_retry_class_filter(tmp_path):
+    combined = combined_file(tmp_path)
+    retry = tmp_path / "retry.txt"
+    assert main([str(combined), "--retry-list", str(retry), "--retry-class", "timeout",
+                 "--retry-class", "not_completed"]) == 0
+    assert read_image_list(retry) == {"p3.png", "p5.png"}
+
+
+def test_missing_file(tmp_path):
+    assert main([str(tmp_path / "missing_all_ocr.txt")]) == 2
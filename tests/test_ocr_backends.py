@@ -0,0 +1,55 @@
+"""Tests for backend routing (ocr_backends.RoutedBackend)."""
+from contextlib import nullcontext
+
+import pytest
+
+from ocr_backends import BackendUnavailable, RoutedBackend
+from ocr_errors import RateLimited, ResultTimeout
+
+
+class FakeBackend:
+    def __init__(self, name, result=None, error=None, start_error=None):
+        self.name = self.cache_id = name
+        self.result, self.error, self.start_error = result, error, start_error
+        self.started = self.closed = False
+        self.calls = 0
+
+    def start(self):
+        if self.start_error is not None:
+            raise self.start_error
+        self.started = True
+
+    def worker(self):
+        return nullcontext()
+
+    def ocr(self, image_path):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def summary(self):
+        return ""
+
+    def close(self):
+        self.closed = True
+
+
+def test_failed_fallback_start_closes_the_primary():
+    primary = FakeBackend("playwright")
+    fallback = FakeBackend("tesseract", start_error=BackendUnavailable("Tesseract not found"))
+    routed = RoutedBackend(primary, fallback)
+    with pytest.raises(BackendUnavailable):
+        routed.start()
+    assert primary.started and primary.closed
+
+
+def test_failures_escalate_but_rate_limits_do_not(tmp_path):
+    image = tmp_path / "p.png"
+    routed = RoutedBackend(FakeBackend("direct", error=ResultTimeout("Timed out")), FakeBackend("playwright", "ཀ"))
+    assert routed.ocr(image) == "ཀ" and routed.escalated == 1
+
+    limited = RoutedBackend(FakeBackend("direct", error=RateLimited("請求過多")), FakeBackend("playwright", "ཀ"))
+    with pytest.raises(RateLimited):
+        limited.ocr(image)
+    assert limited.fallback.calls == 0
@@ -0,0 +1,101 @@
+"""Tests for the blank-page prefilter (ocr_blank_pages) and --blank-dry-run."""
+import random
+
+import pytest
+
+from ocr_blank_pages import DEFAULT_BLANK_THRESHOLD, MAX_STDDEV, image_stats, page_stats
+
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+
+SIZE = (1200, 1600)
+
+
+def paper(level=245, noise=0, seed=1):
+    """A page of uniform paper, with +/- `noise` gray levels of scanner grain."""
+    im = Image.new("L", SIZE, level)
+    if noise:
+        rng = random.Random(seed)
+        im.putdata([min(255, max(0, level + rng.randint(-noise, noise))) for _ in range(SIZE[0] * SIZE[1])])
+    return im
+
+
+def with_text(im, ink=20, lines=30):
+    """Dark bars standing in for lines of text."""
+    draw = ImageDraw.Draw(im)
+    for row in range(lines):
+        y = 150 + row * 42
+        draw.rectangle((120, y, 1080, y + 18), fill=ink)
+    return im
+
+
+def with_speckles(im, count=40, seed=2):
+    """Dust and small dark specks, far below the ink threshold."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        x, y = rng.randrange(100, SIZE[0] - 100), rng.randrange(100, SIZE[1] - 100)
+        im.putpixel((x, y), 30)
+    return im
+
+
+def test_white_page_is_blank():
+    stats = image_stats(paper())
+    assert stats.blank and stats.ink_ratio == 0 and stats.background == 245
+
+
+def test_speckle_noise_is_still_blank():
+    stats = image_stats(with_speckles(paper(noise=4)))
+    assert stats.blank
+    assert stats.ink_ratio < DEFAULT_BLANK_THRESHOLD and stats.stddev < MAX_STDDEV
+
+
+def test_page_with_text_is_kept():
+    stats = image_stats(with_text(paper()))
+    assert not stats.blank and stats.ink_ratio > 0.05
+
+
+def test_dark_scan_is_judged_against_its_own_paper():
+    blank = image_stats(paper(level=90, noise=4))
+    assert blank.blank and blank.background < 100  # dark paper is not ink
+    text = image_stats(with_text(paper(level=110), ink=10))
+    assert not text.blank
+
+
+def test_faint_but_varied_page_is_kept():
+    # Faded text: not dark enough to count as ink, but the variation keeps the page
+    stats = image_stats(with_text(paper(), ink=205, lines=36))
+    assert stats.ink_ratio < DEFAULT_BLANK_THRESHOLD
+    assert stats.stddev >= MAX_STDDEV and not stats.blank
+
+
+def test_threshold_decides_sparse_pages():
+    # A lone page number: blank at the default threshold, kept with a stricter one
+    im = paper()
+    ImageDraw.Draw(im).rectangle((585, 1450, 615, 1480), fill=20)
+    stats = image_stats(im)
+    assert 0 < stats.ink_ratio < DEFAULT_BLANK_THRESHOLD and stats.blank
+    assert not image_stats(im, threshold=stats.ink_ratio / 2).blank
+
+
+def test_page_stats_reads_jpeg_at_reduced_scale(tmp_path):
+    path = tmp_path / "verso.jpg"
+    paper(noise=3).save(path, quality=90)
+    assert page_stats(path).blank
+    path = tmp_path / "text.jpg"
+    with_text(paper()).save(path, quality=90)
+    assert not page_stats(path).blank
+
+
+def test_blank_dry_run_reports_without_uploading(tmp_path, capsys):
+    import ocr_simple_batch
+
+    folder = tmp_path / "vol"
+    folder.mkdir()
+    paper().save(folder / "p001.png")
+    with_text(paper()).save(folder / "p002.png")
+    rc = ocr_simple_batch.main([str(folder), "--blank-dry-run", "--prep-workers", "0"])
+    out = capsys.readouterr().out
+    assert rc == 0
+    assert "1 of 2 page(s) would be skipped" in out
+    assert "SKIP" in out and "p001.png" in out and "p002.png" not in out
+    assert sorted(p.name for p in folder.iterdir()) == ["p001.png", "p002.png"]  # nothing written
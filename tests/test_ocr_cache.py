@@ -0,0 +1,64 @@
+"""Tests for the SQLite result cache (ocr_cache)."""
+import time
+
+from ocr_cache import TOUCH_BATCH, OcrCache
+
+
+def test_hit_miss_and_key(tmp_path):
+    image = tmp_path / "a.png"
+    image.write_bytes(b"image bytes")
+    cache = OcrCache(tmp_path / "cache.sqlite")
+    key = cache.key_for(image, "https://example.org/ocr")
+    assert key != cache.key_for(image, "https://example.org/other")
+    assert key != cache.key_for(image, "https://example.org/ocr", page=2)
+    assert cache.get(key) is None
+    cache.put(key, "ཀ་ཁ")
+    assert cache.get(key) == "ཀ་ཁ"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    cache.close()
+
+
+def test_lru_eviction_keeps_recent_hits(tmp_path):
+    cache = OcrCache(tmp_path / "cache.sqlite", max_bytes=30)
+    cache.put("a", "x" * 10)
+    time.sleep(0.01)
+    cache.put("b", "x" * 10)
+    time.sleep(0.01)
+    cache.put("c", "x" * 10)
+    time.sleep(0.01)
+    assert cache.get("a") is not None  # touch pending, not yet written
+    cache.put("d", "x" * 10)
+    assert cache.contains("a") and not cache.contains("b")
+    assert cache.contains("c") and cache.contains("d")
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] == 30
+    cache.close()
+
+
+def test_running_total_tracks_replacements_and_reopen(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    cache = OcrCache(path, max_bytes=1000)
+    cache.put("a", "x" * 100)
+    cache.put("a", "x" * 40)
+    cache.put("b", "ཀ")  # 3 bytes in UTF-8
+    assert cache.stats()["bytes"] == 43
+    cache.close()
+    reopened = OcrCache(path, max_bytes=1000)
+    assert reopened.stats()["bytes"] == 43
+    reopened.close()
+
+
+def test_touches_are_written_in_batches_and_on_close(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    cache = OcrCache(path)
+    cache.put("a", "ཀ")
+    stored = cache._conn.execute("SELECT last_access FROM ocr_cache WHERE key = 'a'").fetchone()[0]
+    time.sleep(0.01)
+    for _ in range(TOUCH_BATCH - 1):
+        cache.get("a")
+    assert cache._conn.execute("SELECT last_access FROM ocr_cache WHERE key = 'a'").fetchone()[0] == stored
+    cache.close()
+    reopened = OcrCache(path)
+    assert reopened._conn.execute("SELECT last_access FROM ocr_cache WHERE key = 'a'").fetchone()[0] > stored
+    reopened.close()
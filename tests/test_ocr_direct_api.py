@@ -0,0 +1,101 @@
+"""Tests for replaying a captured API profile (ocr_direct_api) against the mock server."""
+import json
+
+import pytest
+
+from mock_ocr_server import MockConfig, MockOcrServer, tibetan_text_for
+from ocr_direct_api import PROFILE_VERSION, DirectOcrClient, ProfileMismatch, build_profile, save_profile
+from ocr_errors import NavigationFailed, RateLimited
+
+IMAGE_BYTES = b"\x89PNG fake image"
+
+
+def mock_profile(server):
+    base = server.url.split("/zh-hant")[0]
+    return {
+        "version": PROFILE_VERSION, "endpoint": f"{base}/api/ocr", "method": "POST", "body": "multipart",
+        "parts": [{"name": "lang", "value": "bo"},
+                  {"name": "file", "file": True, "filename": "{filename}", "content_type": "image/png"}],
+        "headers": {"origin": base, "referer": server.url},
+        "response": {"format": "json", "text_path": ["text"], "error_keys": ["error"]},
+    }
+
+
+@pytest.fixture
+def server():
+    server = MockOcrServer(MockConfig(latency_ms=0, jitter_ms=0, lines=3, seed=1)).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "p001.png"
+    path.write_bytes(IMAGE_BYTES)
+    return path
+
+
+def client_for(tmp_path, profile):
+    path = tmp_path / "api_profile.json"
+    save_profile(path, profile)
+    return DirectOcrClient(path, timeout_s=5)
+
+
+def test_replay_returns_text_over_one_connection(tmp_path, server, image):
+    client = client_for(tmp_path, mock_profile(server))
+    assert client.usable
+    expected = tibetan_text_for(IMAGE_BYTES, 3)
+    for _ in range(3):
+        assert client.ocr(image) == expected
+    assert server.stats()["ok"] == 3 and client.requests == 3
+    assert len(client._local.pool) == 1  # keep-alive connection reused
+
+
+def test_site_rate_limit_is_typed(tmp_path, image):
+    server = MockOcrServer(MockConfig(latency_ms=0, jitter_ms=0, rate_limit=0.001, burst=1)).start()
+    try:
+        client = client_for(tmp_path, mock_profile(server))
+        client.ocr(image)
+        with pytest.raises(RateLimited):
+            client.ocr(image)
+    finally:
+        server.stop()
+
+
+def test_profile_mismatch_and_fallback(tmp_path, server, image):
+    profile = mock_profile(server)
+    profile["endpoint"] = profile["endpoint"].replace("/api/ocr", "/zh-hant")  # HTML, not JSON
+    client = client_for(tmp_path, profile)
+    with pytest.raises(ProfileMismatch):
+        client.ocr(image)
+    client.disable("test")
+    assert not client.usable
+    with pytest.raises(ProfileMismatch):
+        client.ocr(image)
+
+
+def test_unreachable_endpoint(tmp_path, server, image):
+    profile = mock_profile(server)
+    server.stop()
+    client = client_for(tmp_path, profile)
+    with pytest.raises(NavigationFailed):
+        client.ocr(image)
+
+
+def test_build_profile_from_captured_request():
+    boundary = "----capture"
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"lang\"\r\n\r\nbo\r\n"
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"p001.png\"\r\n"
+            f"Content-Type: image/png\r\n\r\n").encode("utf-8") + IMAGE_BYTES + f"\r\n--{boundary}--\r\n".encode("ascii")
+    text = tibetan_text_for(IMAGE_BYTES, 2)
+    profile = build_profile("http://127.0.0.1:1/zh-hant?view=ocr", "http://127.0.0.1:1/api/ocr", "POST",
+                            {"content-type": f"multipart/form-data; boundary={boundary}",
+                             "origin": "http://127.0.0.1:1"},
+                            body, json.dumps({"text": text}),
+                            IMAGE_BYTES, "p001.png", text.splitlines()[0])
+    assert profile is not None
+    assert profile["body"] == "multipart" and profile["response"]["text_path"] == ["text"]
+    file_part = [p for p in profile["parts"] if p.get("file")][0]
+    assert file_part["filename"] == "{filename}"
+    assert build_profile("u", "u", "POST", {"content-type": "application/json"}, b"{}", "{}",
+                         IMAGE_BYTES, "p001.png", text) is None
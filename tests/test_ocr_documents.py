@@ -0,0 +1,88 @@
+"""Tests for multi-page TIFF/PDF inputs (ocr_documents) and their page keys."""
+import pytest
+
+import ocr_documents
+from ocr_documents import PageRef, close_documents, entry_key, expand, load_page
+from ocr_journal import DONE, BatchJournal
+from ocr_output import CombinedWriter, iter_sections
+
+Image = pytest.importorskip("PIL.Image")
+
+LEVELS = [40, 120, 200]  # gray level of each frame, to tell the pages apart
+
+
+@pytest.fixture
+def volume(tmp_path):
+    """A three-page TIFF volume in tmp_path/vol."""
+    folder = tmp_path / "vol"
+    folder.mkdir()
+    path = folder / "book.tif"
+    frames = [Image.new("L", (40, 60), level) for level in LEVELS]
+    frames[0].save(path, save_all=True, append_images=frames[1:])
+    yield path
+    close_documents()
+
+
+def test_tiff_volume_expands_to_pages(volume):
+    pages = expand(volume)
+    assert pages == [PageRef(volume, n, 3) for n in (1, 2, 3)]
+    assert pages[1].name == "book.tif p2/3" and pages[1].stem == "book_p0002"
+
+
+def test_single_page_files_stay_paths(tmp_path):
+    tif = tmp_path / "one.tif"
+    Image.new("L", (10, 10), 255).save(tif)
+    png = tmp_path / "one.png"
+    png.write_bytes(b"")  # not opened: only multi-page formats are inspected
+    assert expand(tif) == [tif] and expand(png) == [png]
+
+
+def test_load_page_decodes_the_requested_frame(volume):
+    pages = expand(volume)
+    for page in (pages[2], pages[0], pages[1]):  # out of order, same open document
+        im = load_page(page)
+        assert im.size == (40, 60) and im.getpixel((5, 5)) == LEVELS[page.page - 1]
+    close_documents()
+    assert load_page(pages[1]).getpixel((0, 0)) == LEVELS[1]  # reopened after close
+
+
+def test_pdf_without_pypdfium2(tmp_path, monkeypatch, capsys):
+    import ocr_simple_batch
+
+    monkeypatch.setattr(ocr_documents, "pdfium", None)
+    pdf = tmp_path / "scan.pdf"
+    pdf.write_bytes(b"%PDF-1.4\n")
+    assert not ocr_documents.pdf_available()
+    with pytest.raises(RuntimeError, match="pypdfium2"):
+        expand(pdf)
+    # The batch skips PDFs with one warning and goes on with the images
+    monkeypatch.setattr(ocr_simple_batch, "_pdf_warning_shown", False)
+    assert ocr_simple_batch.expand_input(pdf) == []
+    assert ocr_simple_batch.expand_input(pdf) == []
+    assert capsys.readouterr().err.count("pip install pypdfium2") == 1
+    with pytest.raises(RuntimeError, match="pip install pypdfium2"):
+        load_page(PageRef(pdf, 1, 1))
+
+
+def test_page_keys_round_trip_through_journal_and_combined_file(volume, tmp_path):
+    root = volume.parent
+    pages = expand(volume)
+    keys = [entry_key(page, root) for page in pages]
+    assert keys == ["book.tif#page1", "book.tif#page2", "book.tif#page3"]
+
+    journal_path = tmp_path / "journal.jsonl"
+    journal = BatchJournal(journal_path)
+    journal.record(keys[0], DONE, text="ཀ")
+    journal.record(keys[1], DONE, text="ཁ")
+    journal.close()
+    resumed = BatchJournal(journal_path, resume=True)
+    assert [resumed.is_done(key) for key in keys] == [True, True, False]
+    assert resumed.completed_text("book.tif#page2") == "ཁ"
+    resumed.close()
+
+    out = tmp_path / "vol_all_ocr.txt"
+    writer = CombinedWriter(out, root, pages)
+    for i in range(1, 4):
+        writer.add(i, "ཀ")
+    writer.finish(3, 0, 0)
+    assert [section.key for section in iter_sections(out)] == keys
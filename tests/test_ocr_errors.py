@@ -0,0 +1,67 @@
+"""Tests for typed errors, classification and retry policies (ocr_errors)."""
+import argparse
+
+import pytest
+
+from ocr_errors import (BlankPage, OcrError, RateLimited, ResultTimeout, RetryPolicy, classify,
+                        parse_retry_spec, retry_policies, site_error)
+
+
+def test_classify_typed_errors():
+    assert classify(RateLimited("x")) == "rate_limited"
+    assert classify(ResultTimeout("x")) == "timeout"
+    assert classify(OcrError("x")) == "ocr_error"
+    assert isinstance(BlankPage("x"), ValueError)
+
+
+@pytest.mark.parametrize("message, label", [
+    ("OCR returned error: 請求過多，請稍後再試", "rate_limited"),
+    ("HTTP 429 Too Many Requests", "rate_limited"),
+    ("空白頁面，未找到文字", "blank_page"),
+    ("白页", "blank_page"),
+    ("OCR completed but no Tibetan text was extracted", "no_tibetan"),
+    ("Could not upload file", "upload_failed"),
+    ("net::ERR_CONNECTION_RESET", "navigation_failed"),
+    ("Timed out after 30000 ms", "timeout"),
+    ("something else", "other"),
+    (None, "other"),
+])
+def test_classify_messages(message, label):
+    assert classify(message) == label
+
+
+def test_classify_untyped_timeout():
+    assert classify(TimeoutError()) == "timeout"
+
+
+def test_site_error_types():
+    assert isinstance(site_error("請求過多"), RateLimited)
+    assert isinstance(site_error("白页"), BlankPage)
+    error = site_error("Timed out on the server")
+    assert type(error) is OcrError and str(error).startswith("OCR returned error: ")
+
+
+def test_retry_delay_grows_with_jitter():
+    policy = RetryPolicy(retries=3, backoff_s=2.0, jitter=0.25)
+    for retry in (1, 2, 3):
+        assert 2.0 * retry * 0.75 <= policy.delay(retry) <= 2.0 * retry * 1.25
+    assert RetryPolicy(backoff_s=2.0, jitter=0).delay(2) == 4.0
+    assert RetryPolicy().delay(1) == 0.0
+
+
+def test_parse_retry_spec():
+    name, policy = parse_retry_spec("timeout=2:3:0.5")
+    assert (name, policy.retries, policy.backoff_s, policy.jitter) == ("timeout", 2, 3.0, 0.5)
+    name, policy = parse_retry_spec("rate_limited=5")
+    assert policy.retries == 5 and policy.backoff_s == 5.0
+    for spec in ("bogus=1", "timeout", "timeout=x", "timeout=1:2:3:4"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_retry_spec(spec)
+
+
+def test_retry_policies_apply_overrides_without_sharing_defaults():
+    policies = retry_policies(rate_limit_retries=7, rate_limit_delay_s=1.5,
+                              overrides=[("timeout", RetryPolicy(retries=4))])
+    assert (policies["rate_limited"].retries, policies["rate_limited"].backoff_s) == (7, 1.5)
+    assert policies["timeout"].retries == 4
+    assert retry_policies()["rate_limited"].retries == 3
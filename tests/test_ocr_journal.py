@@ -0,0 +1,84 @@
+"""Tests for the batch journal (ocr_journal)."""
+import json
+
+from ocr_journal import DONE, FAILED, IN_FLIGHT, BatchJournal, load_journal, read_image_list, write_image_list
+
+
+def test_resume_keeps_last_status_and_reads_text_lazily(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = BatchJournal(path)
+    journal.record("a.png", IN_FLIGHT)
+    journal.record("a.png", DONE, text="ཀ་ཁ")
+    journal.record("b.png", DONE, text="old")
+    journal.record("b.png", FAILED, error="Timed out")
+    journal.record("c.png", IN_FLIGHT)
+    journal.close()
+
+    resumed = BatchJournal(path, resume=True)
+    assert resumed.state["a.png"]["status"] == DONE
+    assert "text" not in resumed.state["a.png"]  # text stays on disk
+    assert resumed.is_done("a.png") and not resumed.is_done("b.png") and not resumed.is_done("c.png")
+    assert resumed.completed_text("a.png") == "ཀ་ཁ"
+    assert resumed.completed_text("b.png") is None
+    assert resumed.completed_text("missing.png") is None
+    resumed.close()
+
+
+def test_resume_after_torn_last_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = BatchJournal(path)
+    journal.record("a.png", DONE, text="ཀ")
+    journal.close()
+    with path.open("a", encoding="utf-8") as f:
+        f.write('{"image": "b.png", "sta')  # crash mid-write
+
+    resumed = BatchJournal(path, resume=True)
+    assert set(resumed.state) == {"a.png"}
+    resumed.record("b.png", DONE, text="ཁ")
+    resumed.close()
+
+    state = load_journal(path)
+    assert state["b.png"]["status"] == DONE
+    assert BatchJournal(path, resume=True).completed_text("b.png") == "ཁ"
+
+
+def test_unfinished_journal_is_rotated_not_truncated(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = BatchJournal(path)
+    journal.record("a.png", DONE, text="ཀ")
+    journal.record("b.png", IN_FLIGHT)
+    journal.close()
+
+    fresh = BatchJournal(path)  # forgot --resume
+    fresh.close()
+    assert fresh.rotated is not None and fresh.rotated.exists()
+    assert load_journal(fresh.rotated)["b.png"]["status"] == IN_FLIGHT
+    assert path.read_text(encoding="utf-8") == ""
+
+
+def test_finished_journal_is_replaced(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = BatchJournal(path)
+    journal.record("a.png", DONE, text="ཀ")
+    journal.close()
+
+    fresh = BatchJournal(path)
+    fresh.close()
+    assert fresh.rotated is None
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_records_are_json_lines(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = BatchJournal(path)
+    journal.record("a.png", FAILED, error="請求過多", error_class="rate_limited")
+    journal.close()
+    rec = json.loads(path.read_text(encoding="utf-8"))
+    assert rec["error"] == "請求過多" and rec["error_class"] == "rate_limited"
+
+
+def test_image_list_round_trip(tmp_path):
+    path = tmp_path / "retry.txt"
+    assert write_image_list(path, ["vol1/a.png", "b.pdf#page2"], comment="retry") == 2
+    path.write_text(path.read_text(encoding="utf-8") + "\nvol1\\c.png\n", encoding="utf-8")
+    assert read_image_list(path) == {"vol1/a.png", "b.pdf#page2", "vol1/c.png"}
@@ -0,0 +1,134 @@
+"""Tests for the folder snapshot (ocr_manifest)."""
+import os
+import time
+
+import pytest
+
+import ocr_manifest
+from ocr_manifest import RACY_MTIME_S, ImageManifest, default_manifest_path, iter_images
+
+
+def age(*paths):
+    """Move mtimes out of the racy window so a listing may be reused."""
+    past = time.time() - RACY_MTIME_S - 60
+    for path in paths:
+        os.utime(path, (past, past))
+
+
+def make_tree(root):
+    (root / "vol1").mkdir(parents=True)
+    (root / "a.png").write_bytes(b"a")
+    (root / "vol1" / "b.tif").write_bytes(b"b")
+    (root / "vol1" / "notes.txt").write_text("not an image", encoding="utf-8")
+    age(root, root / "vol1")
+
+
+def walk(root, manifest_path, **kwargs):
+    manifest = ImageManifest(manifest_path, root, **kwargs)
+    images = [p.relative_to(root).as_posix() for p in iter_images(root, manifest=manifest)]
+    return manifest, images
+
+
+def test_unchanged_folders_are_reused(tmp_path):
+    root = tmp_path / "images"
+    make_tree(root)
+    manifest_path = tmp_path / "manifest.jsonl"
+
+    first, images = walk(root, manifest_path)
+    assert images == ["a.png", "vol1/b.tif"]
+    assert first.stats["dirs_scanned"] == 2
+    first.save()
+
+    second, images = walk(root, manifest_path)
+    assert images == ["a.png", "vol1/b.tif"]
+    assert (second.stats["dirs_reused"], second.stats["dirs_scanned"], second.stats["new"]) == (2, 0, 0)
+
+    rescan, _ = walk(root, manifest_path, rescan=True)
+    assert rescan.stats["dirs_reused"] == 0
+
+
+def test_new_image_is_found(tmp_path):
+    root = tmp_path / "images"
+    make_tree(root)
+    manifest_path = tmp_path / "manifest.jsonl"
+    walk(root, manifest_path)[0].save()
+
+    (root / "vol1" / "c.png").write_bytes(b"c")
+    age(root / "vol1")
+    manifest, images = walk(root, manifest_path)
+    assert images == ["a.png", "vol1/b.tif", "vol1/c.png"]
+    assert manifest.stats["new"] == 1 and manifest.stats["dirs_reused"] == 1
+
+
+def test_own_output_files_keep_listing_reusable(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_manifest, "RACY_MTIME_S", -1.0)  # the settled mtime is a fresh one
+    root = tmp_path / "images"
+    make_tree(root)
+    manifest_path = tmp_path / "manifest.jsonl"
+    manifest, _ = walk(root, manifest_path)
+    (root / "images_all_ocr.txt").write_text("combined", encoding="utf-8")  # written by the batch
+    manifest.save()
+
+    again, _ = walk(root, manifest_path)
+    assert again.stats["dirs_reused"] == 2
+
+
+def test_image_added_during_run_is_found_next_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_manifest, "RACY_MTIME_S", -1.0)  # the settled mtime is a fresh one
+    root = tmp_path / "images"
+    make_tree(root)
+    manifest_path = tmp_path / "manifest.jsonl"
+    manifest, _ = walk(root, manifest_path)
+    (root / "late.png").write_bytes(b"late")
+    manifest.save()
+
+    _, images = walk(root, manifest_path)
+    assert "late.png" in images
+
+
+def test_digest_is_reused_until_the_file_changes(tmp_path):
+    root = tmp_path / "images"
+    make_tree(root)
+    manifest_path = tmp_path / "manifest.jsonl"
+    manifest, _ = walk(root, manifest_path)
+    digest = manifest.digest(root / "a.png")
+    manifest.save()
+
+    again, _ = walk(root, manifest_path)
+    assert again.digest(root / "a.png") == digest and again.stats["hashed"] == 0
+    (root / "a.png").write_bytes(b"changed")
+    assert again.digest(root / "a.png") != digest
+    assert again.stats["changed"] == 1
+
+
+def test_incomplete_walk_is_not_saved(tmp_path):
+    root = tmp_path / "images"
+    make_tree(root)
+    manifest_path = tmp_path / "manifest.jsonl"
+    manifest = ImageManifest(manifest_path, root)
+    next(iter_images(root, manifest=manifest))
+    manifest.save()
+    assert not manifest_path.exists()
+
+
+def test_default_path_is_outside_the_tree(tmp_path):
+    root = tmp_path / "images"
+    path = default_manifest_path(root)
+    assert root not in path.parents
+    assert path.name.startswith("images_") and path != default_manifest_path(tmp_path / "other" / "images")
+
+
+def test_user_folder_named_like_the_output_folder_is_scanned(tmp_path, capsys):
+    import ocr_simple_batch
+    Image = pytest.importorskip("PIL.Image")
+
+    folder = tmp_path / "vol"
+    (folder / "ocr").mkdir(parents=True)
+    Image.new("L", (64, 64), 245).save(folder / "p001.png")
+    Image.new("L", (64, 64), 245).save(folder / "ocr" / "scan.png")  # the user's own "ocr" folder
+    args = [str(folder), "--blank-dry-run", "--prep-workers", "0"]
+    assert ocr_simple_batch.main(args) == 0
+    assert "of 2 page(s)" in capsys.readouterr().out
+    # With --individual-files the tool writes its .txt files there, so it is not walked
+    assert ocr_simple_batch.main(args + ["--individual-files"]) == 0
+    assert "of 1 page(s)" in capsys.readouterr().out
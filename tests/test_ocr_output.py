@@ -0,0 +1,111 @@
+"""Tests for the streaming combined file writer and reader (ocr_output)."""
+import threading
+import time
+
+from ocr_blank_pages import BLANK_MARKER
+from ocr_documents import PageRef
+from ocr_output import FAILED_MARKER, SECTION_RULE, CombinedHeader, CombinedWriter, Section, iter_sections
+
+
+def make_images(folder, n):
+    images = []
+    for i in range(1, n + 1):
+        path = folder / f"p{i:03d}.png"
+        path.write_bytes(b"")
+        images.append(path)
+    return images
+
+
+def test_writer_keeps_input_order(tmp_path):
+    images = make_images(tmp_path, 3)
+    out = tmp_path / "vol_all_ocr.txt"
+    writer = CombinedWriter(out, tmp_path, images)
+    writer.add(3, "ཐ")
+    writer.add(2, "ཁ")
+    assert writer.buffered == 2
+    writer.add(1, "ཀ")
+    assert writer.buffered == 0
+    writer.finish(processed=3, skipped=0, failed=0)
+
+    sections = list(iter_sections(out))
+    assert [s.source for s in sections] == ["p001.png", "p002.png", "p003.png"]
+    assert all(s.status == "ok" and s.chars == 1 for s in sections)
+
+
+def test_partial_file_until_finish(tmp_path):
+    images = make_images(tmp_path, 2)
+    out = tmp_path / "vol_all_ocr.txt"
+    writer = CombinedWriter(out, tmp_path, images)
+    writer.add(1, "ཀ")
+    assert writer.partial_path.exists() and not out.exists()
+    header = CombinedHeader()
+    assert [s.source for s in iter_sections(writer.partial_path, header)] == ["p001.png"]
+    assert header.counts == {}  # in progress: no counts yet
+
+    writer.finish(processed=1, skipped=0, failed=1)
+    assert out.exists() and not writer.partial_path.exists()
+    header = CombinedHeader()
+    sections = list(iter_sections(out, header))
+    assert header.counts == {"total": 2, "processed": 1, "skipped": 0, "failed": 1}
+    assert header.source_folder == str(tmp_path)
+    # Never reported: marked as not completed
+    assert [s.status for s in sections] == ["ok", "not_completed"]
+
+
+def test_add_is_idempotent(tmp_path):
+    images = make_images(tmp_path, 2)
+    out = tmp_path / "vol_all_ocr.txt"
+    writer = CombinedWriter(out, tmp_path, images)
+    writer.add(2, "first")
+    writer.add(2, "second")
+    writer.add(1, "ཀ")
+    writer.add(1, None)
+    writer.finish(2, 0, 0)
+    text = out.read_text(encoding="utf-8")
+    assert "first" in text and "second" not in text
+    assert [s.status for s in iter_sections(out)] == ["ok", "ok"]
+
+
+def test_reorder_buffer_is_bounded(tmp_path):
+    images = make_images(tmp_path, 4)
+    writer = CombinedWriter(tmp_path / "vol_all_ocr.txt", tmp_path, images, max_pending=1)
+    writer.add(2, "ཁ")
+    blocked = threading.Thread(target=writer.add, args=(3, "ག"))
+    blocked.start()
+    time.sleep(0.2)
+    assert blocked.is_alive() and writer.buffered == 1
+    writer.add(1, "ཀ")  # the image everyone waits for is never blocked
+    blocked.join(timeout=5)
+    assert not blocked.is_alive()
+    writer.add(4, "ང")
+    writer.finish(4, 0, 0)
+    assert [s.chars for s in iter_sections(writer.path)] == [1, 1, 1, 1]
+
+
+def test_iter_sections_statuses_and_rules_in_text(tmp_path):
+    images = make_images(tmp_path, 4)
+    out = tmp_path / "vol_all_ocr.txt"
+    writer = CombinedWriter(out, tmp_path, images)
+    writer.add(1, f"ཀ\n{SECTION_RULE}\nཁ")  # a rule line inside OCR text is not a new section
+    writer.add(2, f"{FAILED_MARKER} Timed out after 30000 ms\nsecond line")
+    writer.add(3, BLANK_MARKER)
+    writer.finish(2, 0, 1)
+
+    sections = list(iter_sections(out))
+    assert [s.status for s in sections] == ["ok", "failed", "blank", "not_completed"]
+    assert sections[0].chars == 2 + len(SECTION_RULE)
+    assert sections[1].error == "Timed out after 30000 ms\nsecond line"
+    assert sections[0].full_path == str(images[0])
+
+
+def test_section_key(tmp_path):
+    assert Section(source="vol1\\p001.tif").key == "vol1/p001.tif"
+    assert Section(source="scan.pdf (page 3/12 / 第 3 页)").key == "scan.pdf#page3"
+
+    pdf = tmp_path / "scan.pdf"
+    pdf.write_bytes(b"")
+    out = tmp_path / "vol_all_ocr.txt"
+    writer = CombinedWriter(out, tmp_path, [PageRef(pdf, 2, 5)])
+    writer.add(1, "ཀ")
+    writer.finish(1, 0, 0)
+    assert [s.key for s in iter_sections(out)] == ["scan.pdf#page2"]
@@ -0,0 +1,90 @@
+"""Tests for the AIMD governor and the hedging policy (ocr_rate_control)."""
+import threading
+import time
+
+from ocr_rate_control import ERROR, OK, RATE_LIMITED, AimdController, HedgePolicy
+
+
+def test_additive_increase_up_to_max():
+    governor = AimdController(max_limit=3, initial=1)
+    for _ in range(20):
+        governor.acquire()
+        governor.release(0.5, OK)
+    assert governor.limit == 3 and governor.peak_limit == 3
+
+
+def test_rate_limit_halves_once_per_cooldown():
+    governor = AimdController(max_limit=8, initial=8, cooldown_s=0.2)
+    for _ in range(3):
+        governor.acquire()
+    for _ in range(3):
+        governor.release(outcome=RATE_LIMITED)  # all in flight when the limit was hit
+    assert governor.limit == 4 and governor.rate_limits == 3
+
+    start = time.monotonic()
+    governor.acquire()  # waits for the shared cooldown
+    assert time.monotonic() - start >= 0.15
+    governor.release(outcome=RATE_LIMITED)
+    assert governor.limit == 2
+
+
+def test_errors_and_slow_latency_stop_growth():
+    governor = AimdController(max_limit=8, initial=2, max_error_rate=0.05)
+    governor.acquire()
+    governor.release(outcome=ERROR)
+    for _ in range(5):
+        governor.acquire()
+        governor.release(0.5, OK)
+    assert governor.limit == 2 and governor.errors == 1
+
+    slow = AimdController(max_limit=8, initial=2, latency_slack=1.5)
+    slow.acquire()
+    slow.release(0.1, OK)
+    grown = slow.limit
+    for _ in range(10):
+        slow.acquire()
+        slow.release(5.0, OK)
+    assert slow.limit <= grown + 1
+
+
+def test_acquire_blocks_at_the_limit():
+    governor = AimdController(max_limit=1)
+    governor.acquire()
+    waiter = threading.Thread(target=governor.acquire)
+    waiter.start()
+    time.sleep(0.1)
+    assert waiter.is_alive() and governor.in_flight == 1
+    governor.release(0.1, OK)
+    waiter.join(timeout=5)
+    assert not waiter.is_alive() and governor.in_flight == 1
+
+
+def test_hedge_delay_needs_history():
+    hedge = HedgePolicy(percentile=90, min_samples=5, min_delay_s=0.5)
+    assert hedge.delay() is None
+    for latency in (1.0, 1.0, 1.0, 1.0, 10.0):
+        hedge.observe(latency)
+    assert hedge.delay() > 1.0
+    for _ in range(5):
+        hedge.observe(0.01)
+    assert hedge.delay() >= 0.5  # never below min_delay_s
+
+
+def test_hedge_budget_and_concurrency():
+    hedge = HedgePolicy(budget=0.5, burst=2.0, max_concurrent=1)
+    assert hedge.try_start()          # starts with one token
+    assert not hedge.try_start()      # max_concurrent
+    hedge.finish(won=True)
+    assert not hedge.try_start()      # budget spent
+    hedge.delay()
+    hedge.delay()                     # two attempts earn one token
+    assert hedge.try_start()
+    hedge.finish(won=False)
+    assert (hedge.hedged, hedge.won, hedge.denied) == (2, 1, 2)
+
+
+def test_no_hedges_after_rate_limit():
+    hedge = HedgePolicy(burst=5.0, cooldown_s=30.0)
+    hedge.note_rate_limit()
+    assert not hedge.try_start()
+    assert "0 of 0 attempt(s) hedged" in hedge.summary()
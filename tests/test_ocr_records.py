@@ -0,0 +1,95 @@
+"""Tests for structured records (ocr_records): JSONL lines and the optional Parquet copy."""
+import json
+
+import pytest
+
+import ocr_records
+from mock_ocr_server import MockConfig, MockOcrServer
+from ocr_direct_api import PROFILE_VERSION, save_profile
+from ocr_records import FAILED, ImageResult, RecordWriter, stage_timings, write_parquet
+
+
+def write_records(path):
+    writer = RecordWriter(path)
+    writer.write(ImageResult(image="vol1/p001.tif", path="vol1/p001.tif", source="ocr", text="ཀ་ཁ",
+                             attempts=2, timings_ms=stage_timings([{"stage": "wait", "ms": 100.04},
+                                                                   {"stage": "wait", "ms": 50.0}])))
+    writer.write(ImageResult(image="b.pdf#page2", path="b.pdf", page=2, status=FAILED,
+                             error="Timed out", error_class="timeout", attempts=3))
+    writer.close()
+    return writer
+
+
+def test_records_are_json_lines(tmp_path):
+    path = tmp_path / "records.jsonl"
+    assert write_records(path).count == 2
+    lines = path.read_text(encoding="utf-8").splitlines()
+    first, second = (json.loads(line) for line in lines)
+    assert list(first)[-1] == "text"  # metadata first, text last
+    assert (first["status"], first["chars"], first["text"], first["timings_ms"]) == ("done", 3, "ཀ་ཁ", {"wait": 150.0})
+    assert (second["page"], second["error_class"], second["chars"], second["text"]) == (2, "timeout", 0, None)
+
+
+def test_parquet_copy(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    jsonl = tmp_path / "records.jsonl"
+    write_records(jsonl)
+    with jsonl.open("a", encoding="utf-8") as f:
+        f.write('{"image": "torn')  # partial last line from a crash is skipped
+    parquet = tmp_path / "records.parquet"
+    assert write_parquet(jsonl, parquet, row_group=1) == 2
+    table = pq.read_table(parquet)
+    assert table.column("image").to_pylist() == ["vol1/p001.tif", "b.pdf#page2"]
+    assert table.column("text").to_pylist() == ["ཀ་ཁ", None]
+    assert pq.ParquetFile(parquet).num_row_groups == 2
+
+
+def test_parquet_needs_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_records, "pa", None)
+    assert not ocr_records.parquet_available()
+    with pytest.raises(RuntimeError, match="pyarrow"):
+        write_parquet(tmp_path / "records.jsonl", tmp_path / "records.parquet")
+
+
+@pytest.fixture
+def direct_batch(tmp_path):
+    """An image folder and the batch arguments to OCR it via --backend direct against the mock server."""
+    server = MockOcrServer(MockConfig(latency_ms=0, jitter_ms=0, lines=2, seed=1)).start()
+    base = server.url.split("/zh-hant")[0]
+    profile = tmp_path / "api_profile.json"
+    save_profile(profile, {
+        "version": PROFILE_VERSION, "endpoint": f"{base}/api/ocr", "method": "POST", "body": "multipart",
+        "parts": [{"name": "file", "file": True, "filename": "{filename}", "content_type": "image/png"}],
+        "headers": {}, "response": {"format": "json", "text_path": ["text"], "error_keys": ["error"]},
+    })
+    folder = tmp_path / "vol"
+    folder.mkdir()
+    for i in range(3):
+        (folder / f"p{i}.png").write_bytes(b"\x89PNG page %d" % i)
+    args = [str(folder), "--backend", "direct", "--api-profile", str(profile), "--url", server.url,
+            "--no-cache", "--no-manifest", "--workers", "1", "--records", "--records-parquet"]
+    yield folder, args
+    server.stop()
+
+
+def test_batch_writes_records_and_parquet_when_pyarrow_is_installed(direct_batch):
+    pytest.importorskip("pyarrow")
+    import ocr_simple_batch
+
+    folder, args = direct_batch
+    assert ocr_simple_batch.main(args) == 0
+    records = [json.loads(line) for line in (folder / "vol_ocr_records.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert sorted(rec["image"] for rec in records) == ["p0.png", "p1.png", "p2.png"]
+    assert all(rec["status"] == "done" and rec["source"] == "ocr" and rec["backend"] == "direct" for rec in records)
+    assert (folder / "vol_ocr_records.parquet").exists()
+
+
+def test_batch_skips_parquet_without_pyarrow(direct_batch, monkeypatch, capsys):
+    import ocr_simple_batch
+
+    monkeypatch.setattr(ocr_simple_batch, "parquet_available", lambda: False)
+    folder, args = direct_batch
+    assert ocr_simple_batch.main(args) == 0
+    assert "--records-parquet needs pyarrow" in capsys.readouterr().err
+    assert len((folder / "vol_ocr_records.jsonl").read_text(encoding="utf-8").splitlines()) == 3
+    assert not (folder / "vol_ocr_records.parquet").exists()
@@ -0,0 +1,44 @@
+"""Tests for single-navigation page sessions (ocr_page(reuse_page=True)) against the mock OCR page."""
+import time
+
+import pytest
+
+from mock_ocr_server import MockConfig, MockOcrServer, tibetan_text_for
+from ocr_dharmamitra_playwright import BrowserPool, ocr_image_text, page_session
+from test_browser_pool import chromium_installed
+
+pytestmark = pytest.mark.skipif(not chromium_installed(),
+                                reason="Chromium not installed (python -m playwright install chromium)")
+
+TIMEOUT_MS = 15000
+
+
+@pytest.fixture
+def server():
+    server = MockOcrServer(MockConfig(latency_ms=50, jitter_ms=0, lines=3, seed=1)).start()
+    yield server
+    server.stop()
+
+
+@pytest.mark.parametrize("wait_mode", ["event", "poll"])
+def test_same_text_twice_on_a_reused_page(server, tmp_path, wait_mode):
+    # Duplicate scans: the second result is identical to the one still shown on the page
+    images = []
+    for name in ("p1.png", "p2.png", "p3.png"):
+        path = tmp_path / name
+        path.write_bytes(b"\x89PNG duplicate scan")
+        images.append(path)
+    expected = tibetan_text_for(images[0].read_bytes(), 3).splitlines()[0]
+    with BrowserPool(max_uses=10) as pool:
+        for path in images:
+            start = time.monotonic()
+            text = ocr_image_text(path, server.url, timeout_ms=TIMEOUT_MS, pool=pool,
+                                  wait_mode=wait_mode, reuse_page=True)
+            assert text.splitlines()[0] == expected
+            assert time.monotonic() - start < TIMEOUT_MS / 2000
+        with pool.page() as page:
+            sess = page_session(page)
+            assert (sess.navigations, sess.resets) == (1, 2)
+            # The last reset marked the previous output as stale instead of comparing its text
+            assert page.evaluate("() => !!(window.__ocrStale && window.__ocrStaleObserver)")
+    assert server.stats()["ok"] == 3